@@ -2,6 +2,7 @@ import { io } from 'socket.io-client'
 import { socketio_port } from '../../../../sites/common_site_config.json'
 import { getCachedListResource } from 'frappe-ui/src/resources/listResource'
 import { getCachedResource } from 'frappe-ui/src/resources/resources'
+import { refreshUnreadCountForProjects } from './data/unreadCount'
 
 let socket = null
 let notificationCallbacks = []
@@ -49,6 +50,13 @@ export function initSocket() {
     }
   })
 
+  // Handle new posts in spaces the user can read
+  socket.on('unread_counts_changed', (data) => {
+    if (data.projects?.length) {
+      refreshUnreadCountForProjects(data.projects)
+    }
+  })
+
   // Handle new notifications
   socket.on('new_notification', (notification) => {
     console.log('New notification received:', notification)
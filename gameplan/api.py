@@ -2,9 +2,11 @@
 # See license.txt
 
 
+import re
+
 import frappe
 from frappe.query_builder.functions import Count
-from frappe.utils import cstr, split_emails, validate_email_address, now
+from frappe.utils import cint, cstr, split_emails, validate_email_address, now
 
 import gameplan
 from gameplan.utils import validate_type
@@ -480,6 +482,37 @@ def search_sqlite(query, filters=None):
 	return result
 
 
+@frappe.whitelist()
+def search_sqlite_cache_stats():
+	from gameplan.search_sqlite import get_result_cache_stats
+
+	frappe.only_for(["System Manager", "Gameplan Admin"])
+	return get_result_cache_stats()
+
+
+@frappe.whitelist()
+def search_queue_stats():
+	from gameplan.search_queue import get_queue_stats
+
+	frappe.only_for(["System Manager", "Gameplan Admin"])
+	return get_queue_stats()
+
+
+@frappe.whitelist(methods=["POST"])
+def record_search_click(query, doc_id, position=0):
+	from gameplan.utils.search_boosts import record_click
+
+	record_click(query, doc_id, position)
+
+
+@frappe.whitelist()
+def search_metrics():
+	from gameplan.utils.search_metrics import get_search_metrics
+
+	frappe.only_for(["System Manager", "Gameplan Admin"])
+	return get_search_metrics()
+
+
 # Artwork Management API Endpoints
 
 @frappe.whitelist(allow_guest=False, methods=['POST', 'GET'])
@@ -661,8 +694,18 @@ def update_artwork(artwork_name, title=None, description=None, priority=None,
 	return artwork
 
 
+def _check_artwork_task_access():
+	user_roles = frappe.get_roles(frappe.session.user)
+	if "System Manager" not in user_roles and "Gameplan Admin" not in user_roles:
+		artwork_roles = ["Sales Role", "Procurement Role", "Quality Role"]
+		has_artwork_role = any(role in user_roles for role in artwork_roles)
+
+		if not has_artwork_role:
+			frappe.throw("You don't have permission to view artwork tasks")
+
+
 @frappe.whitelist()
-def get_artwork_tasks(artwork=None, filters=None, fields=None, order_by="modified desc", limit=20):
+def get_artwork_tasks(artwork=None, filters=None, fields=None, order_by="modified desc", limit=20, start=0):
 	"""Get artwork tasks with filtering and permissions"""
 	# Convert parameters to proper types
 	if artwork is not None:
@@ -676,6 +719,7 @@ def get_artwork_tasks(artwork=None, filters=None, fields=None, order_by="modifie
 		]
 	order_by = str(order_by) if order_by else "modified desc"
 	limit = int(limit) if limit else 20
+	start = cint(start)
 	
 	if artwork:
 		filters["artwork"] = artwork
@@ -687,13 +731,7 @@ def get_artwork_tasks(artwork=None, filters=None, fields=None, order_by="modifie
 		]
 	
 	# Add permission filters based on user role
-	user_roles = frappe.get_roles(frappe.session.user)
-	if "System Manager" not in user_roles and "Gameplan Admin" not in user_roles:
-		artwork_roles = ["Sales Role", "Procurement Role", "Quality Role"]
-		has_artwork_role = any(role in user_roles for role in artwork_roles)
-		
-		if not has_artwork_role:
-			frappe.throw("You don't have permission to view artwork tasks")
+	_check_artwork_task_access()
 	
 	# Get tasks from both doctypes with appropriate fields
 	sales_fields = [f for f in fields if f != "created_by_procurement"]
@@ -709,7 +747,8 @@ def get_artwork_tasks(artwork=None, filters=None, fields=None, order_by="modifie
 		filters=filters,
 		fields=sales_fields,
 		order_by=order_by,
-		limit=limit
+		# Both lists are merged before paging, so each needs every row up to the end of the page
+		limit=start + limit
 	)
 	
 	procurement_tasks = frappe.get_all(
@@ -717,7 +756,7 @@ def get_artwork_tasks(artwork=None, filters=None, fields=None, order_by="modifie
 		filters=filters,
 		fields=procurement_fields,
 		order_by=order_by,
-		limit=limit
+		limit=start + limit
 	)
 	
 	# Add workflow_type and cycle_count to each task, and normalize field names
@@ -740,6 +779,7 @@ def get_artwork_tasks(artwork=None, filters=None, fields=None, order_by="modifie
 	# Combine and sort tasks
 	all_tasks = sales_tasks + procurement_tasks
 	all_tasks.sort(key=lambda x: x.get("modified", ""), reverse=True)
+	all_tasks = all_tasks[start:start + limit]
 	
 	# Add artwork and customer titles for display
 	for task in all_tasks:
@@ -748,7 +788,7 @@ def get_artwork_tasks(artwork=None, filters=None, fields=None, order_by="modifie
 		if task.get("customer"):
 			task["customer_title"] = frappe.db.get_value("GP Project", task["customer"], "title")
 	
-	return all_tasks[:limit]
+	return all_tasks
 
 
 @frappe.whitelist()
@@ -928,32 +968,112 @@ def update_artwork_task_status(task_name, new_status, reason="", comments=""):
 
 
 @frappe.whitelist()
-def get_approved_artwork_tasks(search_term: str = ""):
+def get_approved_artwork_tasks(search_term: str = "", start=0, page_length=500):
 	"""Get approved artwork tasks for the report view - only actual approved tasks, not completed sales tasks"""
+	fields = ["name", "title", "status", "artwork", "customer", "modified", "owner", "creation"]
+	statuses = ["Approved", "Final Approved"]
+
+	if search_term:
+		_check_artwork_task_access()
+		page = _search_workflow_tasks(
+			search_term,
+			{"workflow_type": ["Sales Cycle", "Procurement Cycle"], "status": statuses},
+			start=start,
+			page_length=page_length,
+		)
+		if page is not None:
+			tasks = _get_workflow_tasks(page["results"], fields)
+			_add_artwork_and_customer_titles(tasks)
+			return tasks
+
 	filters = {
-		"status": ["in", ["Approved", "Final Approved"]]
+		"status": ["in", statuses]
 	}
 	
 	if search_term:
-		filters["title"] = ["like", f"%{search_term}%"]
+		filters = _to_filter_list(filters)
+		filters.extend(_get_title_word_filters(search_term))
 	
 	tasks = get_artwork_tasks(
 		filters=filters,
-		fields=[
-			"name", "title", "status", "artwork", "customer",
-			"modified", "owner", "creation"
-		],
-		limit=500
+		fields=fields,
+		limit=page_length,
+		start=start
 	)
 	
 	# Add artwork and customer titles, and workflow type info
+	_add_artwork_and_customer_titles(tasks)
+	
+	return tasks
+
+
+def _search_workflow_tasks(query, filters, start=0, page_length=20):
+	"""
+	One page of workflow documents matching `query` from the search index, best first,
+	or None when the index cannot be used and callers should query the tables instead.
+	"""
+	from gameplan.search_sqlite import GameplanSearch
+
+	search = GameplanSearch()
+	if not search.is_search_enabled() or not search.index_exists():
+		return None
+	return search.search_workflow_tasks(query, filters, start, page_length)
+
+
+def _get_workflow_task_names(query, filters, title_only=False):
+	"""
+	Names of the documents of one workflow doctype matching `query` in the search index,
+	or None when the index cannot be used and callers should query the tables instead.
+	"""
+	from gameplan.search_sqlite import GameplanSearch
+
+	search = GameplanSearch()
+	if not search.is_search_enabled() or not search.index_exists():
+		return None
+	return search.get_workflow_task_names(query, filters, title_only)
+
+
+def _get_title_word_filters(query):
+	"""
+	Filters for titles containing every word of `query`, the closest the tables come to
+	the index's matching of words by prefix when the index cannot be used.
+	"""
+	return [["title", "like", f"%{word}%"] for word in re.findall(r"[\w-]+", cstr(query))]
+
+
+def _to_filter_list(filters):
+	"""`filters` as a list, so more than one condition can be added on the same field."""
+	return [
+		[field, *value] if isinstance(value, list) else [field, "=", value]
+		for field, value in filters.items()
+	]
+
+
+def _get_workflow_tasks(results, fields):
+	"""Rows of the workflow documents in search `results`, in the same order."""
+	names = {}
+	for result in results:
+		names.setdefault(result["doctype"], []).append(cstr(result["name"]))
+
+	rows = {}
+	for doctype, docnames in names.items():
+		for row in frappe.get_all(doctype, filters={"name": ["in", docnames]}, fields=fields):
+			row["workflow_type"] = "Sales Cycle" if doctype == "GP Sales Task" else "Procurement Cycle"
+			rows[(doctype, cstr(row.name))] = row
+
+	return [
+		rows[(result["doctype"], cstr(result["name"]))]
+		for result in results
+		if (result["doctype"], cstr(result["name"])) in rows
+	]
+
+
+def _add_artwork_and_customer_titles(tasks):
 	for task in tasks:
 		if task.get("artwork"):
 			task["artwork_title"] = frappe.db.get_value("GP Artwork", task["artwork"], "title")
 		if task.get("customer"):
 			task["customer_title"] = frappe.db.get_value("GP Project", task["customer"], "title")
-	
-	return tasks
 
 
 @frappe.whitelist()
@@ -1236,6 +1356,7 @@ def get_bucket_tasks(customer_filter=None, sort_by="cycle_count", sort_order="de
 	
 	return all_tasks
 
+
 @frappe.whitelist()
 def get_completed_sales_tasks(customer_filter=None, artwork_title_filter=None, artwork_filter=None, start_date=None, end_date=None, sort_by="modified", sort_order="desc", limit_start=0, limit_page_length=20):
 	"""Get all completed Sales tasks that are ready for Procurement with pagination and filtering"""
@@ -1267,6 +1388,21 @@ def get_completed_sales_tasks(customer_filter=None, artwork_title_filter=None, a
 	elif end_date:
 		filters["modified"] = ["<=", end_date]
 	
+	# Filter by task title, not artwork title, matching its words by prefix like the search does
+	if artwork_title_filter:
+		index_filters = {"doctype": "GP Sales Task", "status": filters["status"][1]}
+		for field in ("customer", "artwork"):
+			if field in filters:
+				index_filters[field] = filters[field]
+		names = _get_workflow_task_names(artwork_title_filter, index_filters, title_only=True)
+		filters = _to_filter_list(filters)
+		if names is None:
+			filters.extend(_get_title_word_filters(artwork_title_filter))
+		else:
+			filters.append(["name", "in", names or [""]])
+
+	total_count = frappe.db.count("GP Sales Task", filters)
+
 	# Get completed sales tasks with pagination
 	tasks = frappe.get_all("GP Sales Task",
 		filters=filters,
@@ -1328,18 +1464,11 @@ def get_completed_sales_tasks(customer_filter=None, artwork_title_filter=None, a
 				task.procurement_task_id = latest_procurement[0].name
 				task.cycle_number = procurement_count  # Use count as cycle number
 	
-	# Apply artwork title filter if provided (filter by task title, not artwork title)
-	if artwork_title_filter:
-		frappe.log_error(f"Filtering by task title: '{artwork_title_filter}'", "Artwork Filter Debug")
-		original_count = len(tasks)
-		tasks = [task for task in tasks if task.title and artwork_title_filter.lower() in task.title.lower()]
-		frappe.log_error(f"Filtered from {original_count} to {len(tasks)} tasks", "Artwork Filter Debug")
-	
 	# Return the expected format for the frontend
 	return {
 		"tasks": tasks,
-		"total_count": len(tasks),
-		"has_more": False
+		"total_count": total_count,
+		"has_more": cint(limit_start) + len(tasks) < total_count
 	}
 
 @frappe.whitelist()
@@ -73,13 +73,17 @@ def search_sqlite(query):
 	search = GameplanSearch()
 
 	try:
-		result = search.search(query, title_only=True)
+		if search.is_typeahead_query(query):
+			# Short prefixes are answered from the title prefix table
+			results = search.typeahead(query)
+		else:
+			results = search.search(query, title_only=True)["results"]
 	except GameplanSearchIndexMissingError:
 		# Return empty result if search index is not available
 		return []
 
 	groups = {}
-	for r in result["results"]:
+	for r in results:
 		doctype = r["doctype"]
 
 		if doctype == "GP Discussion":
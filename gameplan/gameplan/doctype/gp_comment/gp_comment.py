@@ -25,15 +25,15 @@ class GPComment(HasMentions, HasReactions, HasTags, Document):
 			if reference_doc.closed_at:
 				frappe.throw("Cannot add comment to a closed discussion")
 
+		if self.reference_doctype == "GP Discussion":
+			GPUnreadRecord.assign_comment_sequence(self)
+
 	def after_insert(self):
 		self.update_discussion_meta()
 		self.update_task_meta()
 		if self.reference_doctype == "GP Discussion":
-			GPUnreadRecord.create_unread_records_for_comment(self)
-
-	def on_trash(self):
-		if self.reference_doctype == "GP Discussion":
-			GPUnreadRecord.delete_unread_records_for_comment(self.name)
+			project = frappe.db.get_value("GP Discussion", self.reference_name, "project")
+			GPUnreadRecord.queue_unread_counts_update(project, self.reference_name, self.owner)
 
 	def after_delete(self):
 		self.update_discussion_meta()
@@ -70,3 +70,8 @@ class GPComment(HasMentions, HasReactions, HasTags, Document):
 	def on_update(self):
 		self.notify_mentions()
 		self.notify_reactions()
+
+
+def on_doctype_update():
+	# Unread comments of a discussion are the range of it above a reader's watermark
+	frappe.db.add_index("GP Comment", ["reference_name", "seq"])
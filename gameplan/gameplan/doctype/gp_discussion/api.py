@@ -3,11 +3,13 @@
 
 
 import frappe
-from frappe.query_builder.functions import Count
 from frappe.utils import cint
-from pypika.terms import ExistsCriterion
 
-import gameplan
+from gameplan.gameplan.doctype.gp_project_access.gp_project_access import (
+	get_access_condition,
+	get_member_projects_query,
+)
+from gameplan.gameplan.doctype.gp_unread_record.gp_unread_record import GPUnreadRecord
 from gameplan.utils import html_to_text_preview
 
 
@@ -25,16 +27,7 @@ def get_discussions(filters=None, order_by=None, start=None, limit=None):
 
 	Discussion = frappe.qb.DocType("GP Discussion")
 	Project = frappe.qb.DocType("GP Project")
-	Member = frappe.qb.DocType("GP Member")
-	UnreadRecord = frappe.qb.DocType("GP Unread Record")
-
-	member_exists = (
-		frappe.qb.from_(Member)
-		.select(Member.name)
-		.where(Member.parenttype == "GP Project")
-		.where(Member.parent == Project.name)
-		.where(Member.user == frappe.session.user)
-	)
+
 	query = (
 		frappe.qb.get_query(
 			Discussion,
@@ -43,7 +36,7 @@ def get_discussions(filters=None, order_by=None, start=None, limit=None):
 		)
 		.left_join(Project)
 		.on(Discussion.project == Project.name)
-		.where((Project.is_private == 0) | ((Project.is_private == 1) & ExistsCriterion(member_exists)))
+		.where(get_access_condition(Project))
 		.limit(limit + 1)
 		.offset(start or 0)
 	)
@@ -55,19 +48,14 @@ def get_discussions(filters=None, order_by=None, start=None, limit=None):
 		query = query.where(clause_discussions_bookmarked_by_user(frappe.session.user))
 
 	if feed_type == "unread":
-		unread_record_exists = (
-			frappe.qb.from_(UnreadRecord)
-			.select(UnreadRecord.name)
-			.where(
-				(UnreadRecord.user == frappe.session.user)
-				& (UnreadRecord.discussion == Discussion.name)
-				& (UnreadRecord.is_unread == 1)
-			)
+		project = filters.get("project") if filters else None
+		unread = GPUnreadRecord.get_unread_counts(
+			frappe.session.user, projects=[project] if isinstance(project, str | int) else None
 		)
-		query = query.where(ExistsCriterion(unread_record_exists))
+		query = query.where(Discussion.name.isin(list(unread) or [""]))
 
 	if feed_type == "following":
-		query = query.where(ExistsCriterion(member_exists))
+		query = query.where(Discussion.project.isin(get_member_projects_query()))
 
 	if feed_type == "participating":
 		query = query.where(
@@ -78,12 +66,6 @@ def get_discussions(filters=None, order_by=None, start=None, limit=None):
 	# default order by last_post_at desc
 	query = query.orderby(Discussion[order_field], order=frappe._dict(value=order_direction))
 
-	is_guest = gameplan.is_guest()
-	if is_guest:
-		GuestAccess = frappe.qb.DocType("GP Guest Access")
-		project_list = GuestAccess.select(GuestAccess.project).where(GuestAccess.user == frappe.session.user)
-		query = query.where(Discussion.project.isin(project_list))
-
 	discussions = query.run(as_dict=1)
 	has_next_page = len(discussions) > limit
 	discussions = discussions[:limit]
@@ -101,23 +83,8 @@ def include_unread_counts(discussions):
 	if not discussions:
 		return discussions
 
-	discussion_names = [d.name for d in discussions]
-	UnreadRecord = frappe.qb.DocType("GP Unread Record")
-
-	# Get unread counts for all discussions in one query
-	unread_counts = (
-		frappe.qb.from_(UnreadRecord)
-		.select(UnreadRecord.discussion, Count(UnreadRecord.name).as_("unread_count"))
-		.where(
-			(UnreadRecord.user == frappe.session.user)
-			& (UnreadRecord.discussion.isin(discussion_names))
-			& (UnreadRecord.is_unread == 1)
-		)
-		.groupby(UnreadRecord.discussion)
-		.run(as_dict=1)
-	)
-
-	unread_map = {str(row.discussion): row.unread_count for row in unread_counts}
+	unread = GPUnreadRecord.get_unread_counts(frappe.session.user, discussions=[d.name for d in discussions])
+	unread_map = {discussion: row.unread_count for discussion, row in unread.items()}
 
 	# Add unread counts to discussions
 	for discussion in discussions:
@@ -69,7 +69,7 @@ class GPDiscussion(HasActivity, HasMentions, HasReactions, HasTags, Document):
 
 	def after_insert(self):
 		self.update_discussions_count()
-		GPUnreadRecord.create_unread_records_for_discussion(self)
+		GPUnreadRecord.queue_unread_counts_update(self.project, self.name, self.owner)
 
 	def on_trash(self):
 		self.remove_bookmark()
@@ -104,22 +104,8 @@ class GPDiscussion(HasActivity, HasMentions, HasReactions, HasTags, Document):
 		if frappe.flags.read_only:
 			return
 
-		# New system: Mark as read in GP Unread Record
 		GPUnreadRecord.mark_discussion_as_read_for_user(self.name, frappe.session.user)
 
-		# Keep old system for analytics/backward compatibility
-		values = {"user": frappe.session.user, "discussion": self.name}
-		existing = frappe.db.get_value("GP Discussion Visit", values)
-		if existing:
-			visit = frappe.get_doc("GP Discussion Visit", existing)
-			visit.last_visit = frappe.utils.now()
-			visit.save(ignore_permissions=True)
-		else:
-			visit = frappe.get_doc(doctype="GP Discussion Visit")
-			visit.update(values)
-			visit.last_visit = frappe.utils.now()
-			visit.insert(ignore_permissions=True)
-
 		# also mark notifications as read
 		GPNotification.clear_notifications(discussion=self.name)
 
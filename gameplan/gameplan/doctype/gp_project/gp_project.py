@@ -7,14 +7,14 @@ import frappe
 import requests
 from bs4 import BeautifulSoup
 from frappe.model.document import Document
-from pypika.terms import ExistsCriterion
 
-import gameplan
 from gameplan.api import invite_by_email
+from gameplan.gameplan.doctype.gp_project_access.gp_project_access import get_access_condition
 from gameplan.gameplan.doctype.gp_unread_record.gp_unread_record import GPUnreadRecord
 from gameplan.gemoji import get_random_gemoji
 from gameplan.mixins.archivable import Archivable
 from gameplan.mixins.manage_members import ManageMembersMixin
+from gameplan.utils import unread_counts
 
 
 class GPProject(ManageMembersMixin, Archivable, Document):
@@ -31,48 +31,12 @@ class GPProject(ManageMembersMixin, Archivable, Document):
 	@staticmethod
 	def get_list_query(query):
 		Project = frappe.qb.DocType("GP Project")
-		Member = frappe.qb.DocType("GP Member")
-		member_exists = (
-			frappe.qb.from_(Member)
-			.select(Member.name)
-			.where(Member.parenttype == "GP Project")
-			.where(Member.parent == Project.name)
-			.where(Member.user == frappe.session.user)
-		)
-		query = query.where(
-			(Project.is_private == 0) | ((Project.is_private == 1) & ExistsCriterion(member_exists))
-		)
-		if gameplan.is_guest():
-			GuestAccess = frappe.qb.DocType("GP Guest Access")
-			project_list = GuestAccess.select(GuestAccess.project).where(
-				GuestAccess.user == frappe.session.user
-			)
-			query = query.where(Project.name.isin(project_list))
-
-		return query
+		return query.where(get_access_condition(Project))
 
 	@staticmethod
 	def get_list(query):
 		Project = frappe.qb.DocType("GP Project")
-		Member = frappe.qb.DocType("GP Member")
-		member_exists = (
-			frappe.qb.from_(Member)
-			.select(Member.name)
-			.where(Member.parenttype == "GP Project")
-			.where(Member.parent == Project.name)
-			.where(Member.user == frappe.session.user)
-		)
-		query = query.where(
-			(Project.is_private == 0) | ((Project.is_private == 1) & ExistsCriterion(member_exists))
-		)
-		if gameplan.is_guest():
-			GuestAccess = frappe.qb.DocType("GP Guest Access")
-			project_list = GuestAccess.select(GuestAccess.project).where(
-				GuestAccess.user == frappe.session.user
-			)
-			query = query.where(Project.name.isin(project_list))
-
-		return query
+		return query.where(get_access_condition(Project))
 
 	def as_dict(self, *args, **kwargs) -> dict:
 		d = super().as_dict(*args, **kwargs)
@@ -187,9 +151,7 @@ class GPProject(ManageMembersMixin, Archivable, Document):
 		project_name = self.name
 		now = frappe.utils.now()
 
-		# new unread record system
-		GPUnreadRecord.mark_all_as_read_for_project(self.name, frappe.session.user)
-
+		# Posts created before mark_all_read_at are read, see GPUnreadRecord
 		project_visit_name = frappe.db.get_value("GP Project Visit", {"user": user, "project": project_name})
 		if project_visit_name:
 			project_visit_doc = frappe.get_doc("GP Project Visit", project_visit_name)
@@ -204,6 +166,8 @@ class GPProject(ManageMembersMixin, Archivable, Document):
 			project_visit_doc.set("mark_all_read_at", now)
 			project_visit_doc.insert(ignore_permissions=True)
 
+		unread_counts.clear_unread_discussions(user, project_name)
+
 
 def get_meta_tags(url):
 	response = requests.get(url, timeout=2, allow_redirects=True)
@@ -0,0 +1,133 @@
+# Copyright (c) 2026, Frappe Technologies Pvt Ltd and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+import gameplan
+
+ACCESSIBLE_PROJECTS_KEY = "gameplan_accessible_projects"
+ACCESS_FIELDS = ["name", "user", "project", "access_kind", "owner", "modified_by", "creation", "modified"]
+
+
+class GPProjectAccess(Document):
+	"""
+	Members and guests of every project, one row per user and project.
+
+	Kept in sync with the members of GP Project and with GP Guest Access, so that
+	permission queries can look up the projects of a user in one indexed table instead
+	of running a subquery on GP Member for every row.
+	"""
+
+	pass
+
+
+def get_access_condition(Project, user=None):
+	"""Query builder condition on `Project` (a GP Project table) for the projects the user can read."""
+	user = user or frappe.session.user
+	condition = (Project.is_private == 0) | Project.name.isin(_get_projects_query(user, "Member"))
+	if gameplan.is_guest(user):
+		condition &= Project.name.isin(_get_projects_query(user, "Guest"))
+	return condition
+
+
+def get_member_projects_query(user=None):
+	"""Subquery of the projects the user is a member of."""
+	return _get_projects_query(user or frappe.session.user, "Member")
+
+
+def _get_projects_query(user, access_kind):
+	Access = frappe.qb.DocType("GP Project Access")
+	return (
+		frappe.qb.from_(Access)
+		.select(Access.project)
+		.where(Access.user == user)
+		.where(Access.access_kind == access_kind)
+	)
+
+
+def get_accessible_projects(user=None):
+	"""
+	Names of the projects the user can search, cached until projects or access to them change.
+
+	Unlike `get_access_condition`, guests get every project they have guest access to.
+	"""
+	user = user or frappe.session.user
+	return frappe.cache().hget(ACCESSIBLE_PROJECTS_KEY, user, lambda: _get_accessible_projects(user))
+
+
+def _get_accessible_projects(user):
+	if gameplan.is_guest(user):
+		# Guests search every project they were given access to, private or not
+		return {str(project) for project in _get_projects_query(user, "Guest").distinct().run(pluck=True)}
+
+	Project = frappe.qb.DocType("GP Project")
+	projects = frappe.qb.from_(Project).select(Project.name).where(get_access_condition(Project, user))
+	return {str(project) for project in projects.run(pluck=True)}
+
+
+def sync_project_access(doc, method=None):
+	"""Update the access rows of a project after it, or guest access to it, changed."""
+	project = doc.name if doc.doctype == "GP Project" else doc.project
+	if not project:
+		# Guest access to a team, see `gp_invitation.create_guest_access`
+		return
+	frappe.db.delete("GP Project Access", {"project": project})
+	_insert_access_rows(_get_access_rows(project))
+	# Public projects are readable by everyone, so any project change can matter to anyone
+	frappe.cache().delete_value(ACCESSIBLE_PROJECTS_KEY)
+
+
+def remove_project_access(doc, method=None):
+	frappe.db.delete("GP Project Access", {"project": doc.name})
+	frappe.cache().delete_value(ACCESSIBLE_PROJECTS_KEY)
+
+
+def clear_accessible_projects(doc, method=None):
+	"""Whether a user is a guest changes which projects they can read."""
+	frappe.cache().hdel(ACCESSIBLE_PROJECTS_KEY, doc.name)
+
+
+def rebuild_project_access():
+	"""
+	Rebuild the access table from project members and guest access, run it with
+	`bench --site <site> execute` followed by the dotted path of this function.
+	"""
+	frappe.db.delete("GP Project Access")
+	_insert_access_rows(_get_access_rows())
+	frappe.cache().delete_value(ACCESSIBLE_PROJECTS_KEY)
+
+
+def _get_access_rows(project=None):
+	member_filters = {"parenttype": "GP Project", "user": ["is", "set"]}
+	guest_filters = {"project": ["is", "set"]}
+	if project:
+		member_filters["parent"] = project
+		guest_filters["project"] = project
+
+	rows = {
+		(member.user, member.parent, "Member")
+		for member in frappe.get_all("GP Member", filters=member_filters, fields=["user", "parent"])
+	}
+	rows.update(
+		(guest.user, guest.project, "Guest")
+		for guest in frappe.get_all("GP Guest Access", filters=guest_filters, fields=["user", "project"])
+	)
+	return rows
+
+
+def _insert_access_rows(rows):
+	if not rows:
+		return
+	now = frappe.utils.now()
+	user = frappe.session.user
+	values = [
+		(frappe.generate_hash(length=10), row_user, project, access_kind, user, user, now, now)
+		for row_user, project, access_kind in rows
+	]
+	frappe.db.bulk_insert("GP Project Access", ACCESS_FIELDS, values)
+
+
+def on_doctype_update():
+	frappe.db.add_index("GP Project Access", ["user", "access_kind", "project"])
+	frappe.db.add_index("GP Project Access", ["project"])
@@ -0,0 +1,6 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+from gameplan.gameplan.doctype.gp_project_access.gp_project_access import rebuild_project_access
+
+
+def execute():
+	rebuild_project_access()
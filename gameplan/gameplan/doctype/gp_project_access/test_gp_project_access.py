@@ -0,0 +1,166 @@
+# Copyright (c) 2026, Frappe Technologies Pvt Ltd and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from gameplan.gameplan.doctype.gp_project_access.gp_project_access import (
+	ACCESSIBLE_PROJECTS_KEY,
+	get_access_condition,
+	get_accessible_projects,
+	rebuild_project_access,
+)
+
+# On IntegrationTestCase, the doctype test records and all
+# link-field test record dependencies are recursively loaded
+# Use these module variables to add/remove to/from that list
+EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+
+MEMBER = "access-member@example.com"
+OUTSIDER = "access-outsider@example.com"
+GUEST = "access-guest@example.com"
+
+
+class UnitTestGPProjectAccess(UnitTestCase):
+	"""
+	Unit tests for GPProjectAccess.
+	Use this class for testing individual functions and methods.
+	"""
+
+	pass
+
+
+class IntegrationTestGPProjectAccess(IntegrationTestCase):
+	"""
+	Integration tests for GPProjectAccess.
+	Use this class for testing interactions between multiple components.
+	"""
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		make_user(MEMBER)
+		make_user(OUTSIDER)
+		make_user(GUEST, role="Gameplan Guest")
+
+	def setUp(self):
+		frappe.cache().delete_value(ACCESSIBLE_PROJECTS_KEY)
+		self.public = make_project("Access Public")
+		self.private = make_project("Access Private", is_private=1, members=[MEMBER])
+
+	def test_sync_project_access(self):
+		self.assertEqual(get_access_rows(self.private), {("Administrator", "Member"), (MEMBER, "Member")})
+
+		self.private.append("members", {"user": OUTSIDER})
+		self.private.save(ignore_permissions=True)
+		self.assertIn((OUTSIDER, "Member"), get_access_rows(self.private))
+
+		self.private.members = [row for row in self.private.members if row.user != MEMBER]
+		self.private.save(ignore_permissions=True)
+		self.assertNotIn((MEMBER, "Member"), get_access_rows(self.private))
+
+		access = add_guest_access(self.private)
+		self.assertIn((GUEST, "Guest"), get_access_rows(self.private))
+		access.delete(ignore_permissions=True)
+		self.assertNotIn((GUEST, "Guest"), get_access_rows(self.private))
+
+		self.private.delete(ignore_permissions=True)
+		self.assertEqual(get_access_rows(self.private), set())
+
+	def test_rebuild_project_access(self):
+		add_guest_access(self.public)
+		expected = {project.name: get_access_rows(project) for project in (self.public, self.private)}
+
+		frappe.db.delete("GP Project Access", {"project": ["in", list(expected)]})
+		rebuild_project_access()
+		self.assertEqual({project: get_access_rows(project) for project in expected}, expected)
+		self.assertIn((GUEST, "Guest"), expected[self.public.name])
+
+	def test_access_condition(self):
+		projects = [self.public, self.private]
+		self.assertEqual(
+			get_readable_projects(MEMBER, projects), {str(self.public.name), str(self.private.name)}
+		)
+		self.assertEqual(get_readable_projects(OUTSIDER, projects), {str(self.public.name)})
+		self.assertEqual(
+			get_searchable_projects(MEMBER, projects), {str(self.public.name), str(self.private.name)}
+		)
+		self.assertEqual(get_searchable_projects(OUTSIDER, projects), {str(self.public.name)})
+
+	def test_guest_access(self):
+		other_public = make_project("Access Other Public")
+		projects = [self.public, self.private, other_public]
+		add_guest_access(self.public)
+		add_guest_access(self.private)
+
+		# Guests read the public projects they were given access to
+		self.assertEqual(get_readable_projects(GUEST, projects), {str(self.public.name)})
+		# and search every project they were given access to
+		self.assertEqual(
+			get_searchable_projects(GUEST, projects), {str(self.public.name), str(self.private.name)}
+		)
+
+	def test_private_access_follows_project_membership(self):
+		# Searching private projects used to follow membership of the project's team
+		team = frappe.get_doc(doctype="GP Team", title="Access Team", members=[{"user": OUTSIDER}]).insert(
+			ignore_permissions=True
+		)
+		self.private.team = team.name
+		self.private.save(ignore_permissions=True)
+
+		self.assertEqual(get_searchable_projects(OUTSIDER, [self.private]), set())
+		self.assertEqual(get_searchable_projects(MEMBER, [self.private]), {str(self.private.name)})
+
+
+def make_user(email, role="Gameplan Member"):
+	if not frappe.db.exists("User", email):
+		frappe.get_doc(
+			doctype="User",
+			email=email,
+			first_name=email.split("@")[0],
+			send_welcome_email=0,
+			roles=[{"role": role}],
+		).insert(ignore_permissions=True)
+
+
+def make_project(title, is_private=0, members=()):
+	return frappe.get_doc(
+		doctype="GP Project",
+		title=title,
+		is_private=is_private,
+		members=[{"user": user} for user in members],
+	).insert(ignore_permissions=True)
+
+
+def add_guest_access(project):
+	return frappe.get_doc(doctype="GP Guest Access", user=GUEST, project=project.name).insert(
+		ignore_permissions=True
+	)
+
+
+def get_access_rows(project):
+	return {
+		(row.user, row.access_kind)
+		for row in frappe.get_all(
+			"GP Project Access", filters={"project": project.name}, fields=["user", "access_kind"]
+		)
+	}
+
+
+def get_readable_projects(user, projects):
+	"""Which of `projects` the user can read, by `get_access_condition`."""
+	Project = frappe.qb.DocType("GP Project")
+	readable = (
+		frappe.qb.from_(Project)
+		.select(Project.name)
+		.where(Project.name.isin([project.name for project in projects]))
+		.where(get_access_condition(Project, user))
+		.run(pluck=True)
+	)
+	return {str(project) for project in readable}
+
+
+def get_searchable_projects(user, projects):
+	"""Which of `projects` the user can search, by `get_accessible_projects`."""
+	return get_accessible_projects(user) & {str(project.name) for project in projects}
@@ -1,72 +1,63 @@
 # Copyright (c) 2025, Frappe Technologies Pvt Ltd and contributors
 # For license information, please see license.txt
 
+import json
+
 import frappe
 from frappe.model.document import Document, bulk_insert
 
+from gameplan.utils import unread_counts
+from gameplan.utils.project_audience import get_project_audience
 
-class GPUnreadRecord(Document):
-	@staticmethod
-	def create_unread_records_for_discussion(discussion_doc):
-		"""Create unread records for all project members when discussion is created"""
-		if frappe.flags.in_migrate or frappe.flags.in_patch:
-			return
+# Access and read-all timestamps used where a user has none
+NEVER_READ = "1900-01-01 00:00:00"
+NEVER_VISIBLE = "9999-12-31 23:59:59"
 
-		project_members = GPUnreadRecord._get_project_members(discussion_doc.project)
+# New posts whose readers have not been told yet, as [project, discussion, author]
+NEW_POSTS_KEY = "gameplan_unread_new_posts"
+PUBLISH_JOB_ID = "gameplan_publish_unread_counts"
+PUBLISH_BATCH_SIZE = 100
 
-		records = []
-		for user in project_members:
-			if user == discussion_doc.owner:
-				continue
 
-			records.append(
-				frappe.get_doc(
-					{
-						"doctype": "GP Unread Record",
-						"user": user,
-						"discussion": discussion_doc.name,
-						"project": discussion_doc.project,
-						"comment": None,
-						"is_unread": 1,
-					}
-				)
-			)
+class GPUnreadRecord(Document):
+	"""
+	Unread state of discussions, kept as read watermarks.
 
-		GPUnreadRecord._bulk_create_unread_records(records)
+	Every comment on a discussion gets the next number of the discussion's `comment_seq`
+	and reading a discussion moves the reader's watermark, `last_read_seq` on their
+	GP Discussion Visit, up to it. What is unread is the gap between the two: comments
+	numbered above the watermark, written by someone else after the reader got access
+	to the project and after they last marked the project as read, plus the discussion
+	itself while it has never been visited. A comment costs one write however many people
+	can read it.
+
+	GP Unread Record rows, one per reader and comment, were used before this and are
+	no longer written.
+	"""
 
 	@staticmethod
-	def create_unread_records_for_comment(comment_doc):
-		"""Create unread records for all project members when comment is created"""
-		if frappe.flags.in_migrate or frappe.flags.in_patch:
-			return
+	def assign_comment_sequence(comment_doc):
+		"""Number a new comment after the latest one of its discussion."""
+		Discussion = frappe.qb.DocType("GP Discussion")
+		# The row lock taken by the update orders concurrent comments until commit
+		frappe.qb.update(Discussion).set(Discussion.comment_seq, Discussion.comment_seq + 1).where(
+			Discussion.name == comment_doc.reference_name
+		).run()
+		comment_doc.seq = frappe.db.get_value("GP Discussion", comment_doc.reference_name, "comment_seq")
 
-		if comment_doc.reference_doctype != "GP Discussion":
+	@staticmethod
+	def queue_unread_counts_update(project, discussion, author):
+		"""Count the new post as unread for the readers of the project, from a background job"""
+		if frappe.flags.in_migrate or frappe.flags.in_patch or frappe.flags.in_import:
 			return
 
-		discussion_doc = frappe.db.get_value(
-			"GP Discussion", comment_doc.reference_name, ["name", "project", "owner"], as_dict=True
-		)
-		project_members = GPUnreadRecord._get_project_members(discussion_doc.project)
-
-		records = []
-		for user in project_members:
-			if user == comment_doc.owner:
-				continue
-
-			records.append(
-				frappe.get_doc(
-					{
-						"doctype": "GP Unread Record",
-						"user": user,
-						"discussion": comment_doc.reference_name,
-						"project": discussion_doc.project,
-						"comment": comment_doc.name,
-						"is_unread": 1,
-					}
-				)
-			)
-
-		GPUnreadRecord._bulk_create_unread_records(records)
+		def queue():
+			frappe.cache().sadd(NEW_POSTS_KEY, json.dumps([str(project), str(discussion), author]))
+			# Does nothing while the job is queued or running, the running job drains new entries too
+			frappe.enqueue(publish_unread_counts, job_id=PUBLISH_JOB_ID, deduplicate=True)
+
+		# Readers must not refresh before the new post can be read
+		frappe.db.after_commit.add(queue)
 
 	@staticmethod
 	def delete_unread_records_for_discussion(discussion: str):
@@ -77,15 +68,6 @@ class GPUnreadRecord(Document):
 		UnreadRecord = frappe.qb.DocType("GP Unread Record")
 		frappe.qb.from_("GP Unread Record").where(UnreadRecord.discussion == str(discussion)).delete().run()
 
-	@staticmethod
-	def delete_unread_records_for_comment(comment: str):
-		"""Delete unread records for a specific comment"""
-		if frappe.flags.in_migrate or frappe.flags.in_patch:
-			return
-
-		UnreadRecord = frappe.qb.DocType("GP Unread Record")
-		frappe.qb.from_("GP Unread Record").where(UnreadRecord.comment == str(comment)).delete().run()
-
 	@staticmethod
 	def delete_unread_records_for_project(project: str):
 		"""Delete unread records for a specific project"""
@@ -97,106 +79,120 @@ class GPUnreadRecord(Document):
 
 	@staticmethod
 	def mark_discussion_as_read_for_user(discussion, user):
-		"""Mark all unread records for this discussion and user as read"""
-		UnreadRecord = frappe.qb.DocType("GP Unread Record")
-		query = (
-			frappe.qb.update(UnreadRecord)
-			.set(UnreadRecord.is_unread, 0)
-			.where(
-				(UnreadRecord.user == user)
-				& (UnreadRecord.discussion == discussion)
-				& (UnreadRecord.is_unread == 1)
-			)
-		)
-		return query.run(as_dict=1)
-
-	@staticmethod
-	def mark_all_as_read_for_project(project, user):
-		"""Mark all discussions in project as read for user"""
+		"""Move the user's watermark to the latest comment, and record the visit"""
+		comment_seq, project = frappe.db.get_value("GP Discussion", discussion, ["comment_seq", "project"])
+		values = {"last_visit": frappe.utils.now(), "last_read_seq": comment_seq or 0}
+		existing = frappe.db.get_value("GP Discussion Visit", {"user": user, "discussion": discussion})
+		if existing:
+			visit = frappe.get_doc("GP Discussion Visit", existing)
+			visit.update(values)
+			visit.save(ignore_permissions=True)
+		else:
+			visit = frappe.get_doc(doctype="GP Discussion Visit", user=user, discussion=discussion)
+			visit.update(values)
+			visit.insert(ignore_permissions=True)
 
-		UnreadRecord = frappe.qb.DocType("GP Unread Record")
-		query = (
-			frappe.qb.update(UnreadRecord)
-			.set(UnreadRecord.is_unread, 0)
-			.where(
-				(UnreadRecord.user == user)
-				& (UnreadRecord.project == project)
-				& (UnreadRecord.is_unread == 1)
-			)
-		)
-		return query.run(as_dict=1)
+		unread_counts.remove_unread_discussion(user, project, discussion)
 
 	@staticmethod
-	def get_unread_count_for_projects(user, projects: list[str] = None):
-		"""Get unread count for a single project for user"""
-		from frappe.query_builder import functions
-
-		UnreadRecord = frappe.qb.DocType("GP Unread Record")
+	def get_unread_counts(user, discussions=None, projects=None):
+		"""
+		Number of unread posts per discussion, for the given discussions or the discussions
+		of the given projects. Discussions with nothing unread are left out.
+		"""
+		import gameplan
 
-		if projects:
-			condition = (
-				(UnreadRecord.user == user)
-				& (UnreadRecord.project.isin(projects))
-				& (UnreadRecord.is_unread == 1)
-			)
+		if discussions is not None and not discussions:
+			return {}
+		if projects is not None and not projects:
+			return {}
+
+		values = {
+			"user": user,
+			"joined": frappe.db.get_value("GP User Profile", {"user": user}, "creation") or NEVER_READ,
+			"never": NEVER_VISIBLE,
+		}
+		conditions = []
+		if discussions is not None:
+			conditions.append("d.name IN %(discussions)s")
+			values["discussions"] = [str(d) for d in discussions]
+		if projects is not None:
+			conditions.append("d.project IN %(projects)s")
+			values["projects"] = [str(p) for p in projects]
+
+		guest_access_since = """(
+			SELECT MIN(g.creation) FROM `tabGP Guest Access` g
+			WHERE g.project = d.project AND g.user = %(user)s
+		)"""
+		if gameplan.is_guest(user):
+			access_since = f"COALESCE({guest_access_since}, %(never)s)"
 		else:
-			condition = (UnreadRecord.user == user) & (UnreadRecord.is_unread == 1)
-
-		result = (
-			frappe.qb.from_(UnreadRecord)
-			.select(
-				UnreadRecord.project,
-				functions.Count(UnreadRecord.discussion).distinct().as_("unread_discussions_count"),
-			)
-			.where(condition)
-			.groupby(UnreadRecord.project)
-			.run(as_dict=True)
+			access_since = f"""CASE WHEN p.is_private = 1 THEN COALESCE(
+				(
+					SELECT MIN(m.creation) FROM `tabGP Member` m
+					WHERE m.parenttype = 'GP Project' AND m.parent = d.project AND m.user = %(user)s
+				),
+				{guest_access_since},
+				%(never)s
+			) ELSE %(joined)s END"""
+
+		rows = frappe.db.sql(
+			f"""
+			SELECT discussion, project, unread_count FROM (
+				SELECT
+					t.discussion,
+					t.project,
+					CASE WHEN t.visited = 0 AND t.owner != %(user)s AND t.creation > t.read_before
+						THEN 1 ELSE 0 END
+					+ (
+						SELECT COUNT(*) FROM `tabGP Comment` c
+						WHERE c.reference_doctype = 'GP Discussion'
+							AND c.reference_name = t.discussion
+							AND c.seq > t.last_read_seq
+							AND c.owner != %(user)s
+							AND c.creation > t.read_before
+					) AS unread_count
+				FROM (
+					SELECT
+						d.name AS discussion,
+						d.project,
+						d.owner,
+						d.creation,
+						CASE WHEN v.name IS NULL THEN 0 ELSE 1 END AS visited,
+						COALESCE(v.last_read_seq, 0) AS last_read_seq,
+						GREATEST(
+							{access_since},
+							COALESCE(
+								(
+									SELECT MAX(pv.mark_all_read_at) FROM `tabGP Project Visit` pv
+									WHERE pv.project = d.project AND pv.user = %(user)s
+								),
+								%(joined)s
+							)
+						) AS read_before
+					FROM `tabGP Discussion` d
+					LEFT JOIN `tabGP Project` p ON p.name = d.project
+					LEFT JOIN `tabGP Discussion Visit` v ON v.discussion = d.name AND v.user = %(user)s
+					WHERE {" AND ".join(conditions) or "1 = 1"}
+						AND (v.name IS NULL OR d.comment_seq > COALESCE(v.last_read_seq, 0))
+				) t
+			) unread
+			WHERE unread_count > 0
+			""",
+			values,
+			as_dict=True,
 		)
+		return {str(row.discussion): row for row in rows}
 
-		out = {}
-		if projects:
-			for project in projects:
-				out[project] = 0
-
-		for row in result:
-			out[row.project] = row.unread_discussions_count
-
-		return out
+	@staticmethod
+	def get_unread_count_for_projects(user, projects: list[str] = None):
+		"""Get the number of discussions with unread posts per project for user"""
+		return unread_counts.get_unread_counts(user, projects)
 
 	@staticmethod
 	def _get_project_members(project_name):
 		"""Get all users who have access to the project"""
-		import gameplan
-
-		project = frappe.db.get_value("GP Project", project_name, ["name", "is_private"], as_dict=True)
-
-		all_users = set()
-
-		if project.is_private:
-			members = frappe.qb.get_query(
-				"GP Member",
-				fields=["user"],
-				filters={"parent": project.name, "parenttype": "GP Project"},
-			).run(pluck=True)
-			all_users.update(members)
-		else:
-			enabled_users = frappe.qb.get_query(
-				"GP User Profile", filters={"enabled": 1}, fields=["user"]
-			).run(pluck=True)
-
-			for user in enabled_users:
-				if not gameplan.is_guest(user):
-					all_users.add(user)
-
-		# Include guest users with explicit project access
-		guest_users = frappe.qb.get_query(
-			"GP Guest Access",
-			fields=["user"],
-			filters={"project": project.name},
-		).run(pluck=True)
-		all_users.update(guest_users)
-
-		return list(all_users)
+		return list(get_project_audience(project_name))
 
 	@staticmethod
 	def _bulk_create_unread_records(records):
@@ -214,6 +210,44 @@ class GPUnreadRecord(Document):
 			frappe.log_error(title="Unread Record Creation Error")
 
 
+def publish_unread_counts():
+	"""
+	Count new posts as unread in the cached counts of their readers, and send each reader
+	one event per batch of posts listing the projects to refresh.
+
+	Posts leave the set only once their readers were told, so a job that fails leaves them
+	for the next one, which counts them again harmlessly. The set is read again after every
+	batch, so posts made while events were being sent are not left behind.
+	"""
+	cache = frappe.cache()
+	# Keys are prefixed here, the cache wrapper's set methods would prefix them again
+	new_posts_key = cache.make_key(NEW_POSTS_KEY)
+	audiences = {}
+	while posts := cache.execute_command("SRANDMEMBER", new_posts_key, PUBLISH_BATCH_SIZE):
+		changed = {}
+		for post in posts:
+			project, discussion, author = json.loads(post)
+			if project not in audiences:
+				audiences[project] = get_project_audience(project)
+			readers = [user for user in audiences[project] if user != author]
+			unread_counts.add_unread_discussion(readers, project, discussion)
+			for user in readers:
+				changed.setdefault(user, set()).add(project)
+
+		for user, projects in changed.items():
+			frappe.publish_realtime("unread_counts_changed", {"projects": sorted(projects)}, user=user)
+		cache.execute_command("SREM", new_posts_key, *posts)
+
+
+def enqueue_publish_unread_counts():
+	"""
+	Scheduled, picks up posts queued while the job was finishing, which deduplication
+	kept from starting a new one, and posts left by a job that failed.
+	"""
+	if frappe.cache().execute_command("SCARD", frappe.cache().make_key(NEW_POSTS_KEY)):
+		frappe.enqueue(publish_unread_counts, job_id=PUBLISH_JOB_ID, deduplicate=True)
+
+
 def on_doctype_update():
 	add_indexes()
 
@@ -0,0 +1,46 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+import frappe
+
+
+def execute():
+	"""Replace unread records with per discussion comment numbers and per visit read watermarks."""
+	frappe.db.sql("""
+		UPDATE `tabGP Comment` c
+		INNER JOIN (
+			SELECT name,
+				ROW_NUMBER() OVER (PARTITION BY reference_name ORDER BY creation, name) as seq
+			FROM `tabGP Comment`
+			WHERE reference_doctype = 'GP Discussion'
+		) numbered ON c.name = numbered.name
+		SET c.seq = numbered.seq
+	""")
+
+	frappe.db.sql("""
+		UPDATE `tabGP Discussion` d
+		INNER JOIN (
+			SELECT reference_name as discussion, MAX(seq) as comment_seq
+			FROM `tabGP Comment`
+			WHERE reference_doctype = 'GP Discussion'
+			GROUP BY reference_name
+		) c ON d.name = c.discussion
+		SET d.comment_seq = c.comment_seq
+	""")
+
+	# Read up to the first comment still unread, or everything if nothing is. A watermark
+	# cannot leave gaps, so comments read after the first unread one become unread again:
+	# with comments 1 to 4 and only 2 and 4 unread, 2, 3 and 4 are unread after this.
+	frappe.db.sql("""
+		UPDATE `tabGP Discussion Visit` v
+		INNER JOIN `tabGP Discussion` d ON d.name = v.discussion
+		LEFT JOIN (
+			SELECT r.user, r.discussion, MIN(c.seq) as first_unread
+			FROM `tabGP Unread Record` r
+			INNER JOIN `tabGP Comment` c ON c.name = r.comment
+			WHERE r.is_unread = 1
+			GROUP BY r.user, r.discussion
+		) u ON u.user = v.user AND u.discussion = v.discussion
+		SET v.last_read_seq = COALESCE(u.first_unread - 1, d.comment_seq)
+	""")
+
+	# Unread records link to comments and would stop them from being deleted
+	frappe.db.delete("GP Unread Record")
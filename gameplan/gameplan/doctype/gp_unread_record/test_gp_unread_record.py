@@ -1,8 +1,12 @@
 # Copyright (c) 2025, Frappe Technologies Pvt Ltd and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests import IntegrationTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from gameplan.gameplan.doctype.gp_unread_record.gp_unread_record import GPUnreadRecord
+from gameplan.gameplan.doctype.gp_unread_record.patches import migrate_to_read_watermarks
 
 # On IntegrationTestCase, the doctype test records and all
 # link-field test record dependencies are recursively loaded
@@ -10,6 +14,10 @@ from frappe.tests import IntegrationTestCase
 EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
 IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
 
+AUTHOR = "unread-author@example.com"
+READER = "unread-reader@example.com"
+GUEST = "unread-guest@example.com"
+
 
 class IntegrationTestGPUnreadRecord(IntegrationTestCase):
 	"""
@@ -17,4 +25,175 @@ class IntegrationTestGPUnreadRecord(IntegrationTestCase):
 	Use this class for testing interactions between multiple components.
 	"""
 
-	pass
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		make_user(AUTHOR)
+		make_user(READER)
+		make_user(GUEST, role="Gameplan Guest")
+
+	def setUp(self):
+		# Posts are dated in minutes from here, after the users joined
+		self.start = add_to_date(now_datetime(), minutes=1)
+		self.project = frappe.get_doc(doctype="GP Project", title="Unread Test").insert(
+			ignore_permissions=True
+		)
+
+	def tearDown(self):
+		frappe.set_user("Administrator")
+
+	def test_new_discussion_is_unread_until_visited(self):
+		discussion = self.make_discussion(0)
+		self.assertEqual(self.get_unread_count(READER, discussion), 1)
+		self.assertEqual(self.get_unread_count(AUTHOR, discussion), 0)
+
+		self.visit(READER, discussion)
+		self.assertEqual(self.get_unread_count(READER, discussion), 0)
+
+	def test_comments_by_others_are_unread(self):
+		discussion = self.make_discussion(0)
+		self.visit(READER, discussion)
+		self.make_comment(discussion, 1)
+		self.make_comment(discussion, 2)
+		self.assertEqual(self.get_unread_count(READER, discussion), 2)
+		self.assertEqual(self.get_unread_count(AUTHOR, discussion), 0)
+
+	def test_own_comments_are_not_unread(self):
+		discussion = self.make_discussion(0)
+		self.visit(READER, discussion)
+		self.make_comment(discussion, 1, user=READER)
+		self.assertEqual(self.get_unread_count(READER, discussion), 0)
+		self.assertEqual(self.get_unread_count(AUTHOR, discussion), 1)
+
+	def test_visit_moves_watermark(self):
+		discussion = self.make_discussion(0)
+		for minutes in (1, 2, 3):
+			self.make_comment(discussion, minutes)
+		self.assertEqual(self.get_unread_count(READER, discussion), 4)
+
+		self.visit(READER, discussion)
+		self.assertEqual(self.get_unread_count(READER, discussion), 0)
+		self.assertEqual(self.get_last_read_seq(READER, discussion), 3)
+
+		self.make_comment(discussion, 4)
+		self.assertEqual(self.get_unread_count(READER, discussion), 1)
+
+	def test_mark_all_read(self):
+		discussion = self.make_discussion(0)
+		self.make_comment(discussion, 1)
+
+		frappe.set_user(READER)
+		self.project.mark_all_as_read()
+		frappe.set_user("Administrator")
+		visit = frappe.db.get_value("GP Project Visit", {"user": READER, "project": self.project.name})
+		frappe.db.set_value("GP Project Visit", visit, "mark_all_read_at", self.at(5))
+		self.assertEqual(self.get_unread_count(READER, discussion), 0)
+
+		self.make_comment(discussion, 6)
+		self.assertEqual(self.get_unread_count(READER, discussion), 1)
+
+	def test_late_joining_private_member(self):
+		self.project.is_private = 1
+		self.project.save(ignore_permissions=True)
+		discussion = self.make_discussion(0)
+		self.make_comment(discussion, 5)
+		self.assertEqual(self.get_unread_count(READER, discussion), 0)
+
+		self.project.append("members", {"user": READER})
+		self.project.save(ignore_permissions=True)
+		member = next(row for row in self.project.members if row.user == READER)
+		self.set_creation("GP Member", member.name, 10)
+		# Only posts made after joining are unread
+		self.assertEqual(self.get_unread_count(READER, discussion), 0)
+
+		self.make_comment(discussion, 15)
+		self.assertEqual(self.get_unread_count(READER, discussion), 1)
+
+	def test_guest_sees_posts_after_access(self):
+		other_project = frappe.get_doc(doctype="GP Project", title="Unread Test Other").insert(
+			ignore_permissions=True
+		)
+		other_discussion = self.make_discussion(0, project=other_project.name)
+		discussion = self.make_discussion(0)
+		access = frappe.get_doc(doctype="GP Guest Access", user=GUEST, project=self.project.name).insert(
+			ignore_permissions=True
+		)
+		self.set_creation("GP Guest Access", access.name, 10)
+		self.make_comment(discussion, 15)
+
+		self.assertEqual(self.get_unread_count(GUEST, discussion), 1)
+		self.assertEqual(self.get_unread_count(GUEST, other_discussion), 0)
+
+	def test_migration_keeps_one_unread_range(self):
+		discussion = self.make_discussion(0)
+		comments = [self.make_comment(discussion, minutes) for minutes in (1, 2, 3, 4)]
+		self.visit(READER, discussion)
+		for comment, is_unread in zip(comments, (0, 1, 0, 1), strict=True):
+			frappe.get_doc(
+				doctype="GP Unread Record",
+				user=READER,
+				discussion=discussion,
+				project=self.project.name,
+				comment=comment,
+				is_unread=is_unread,
+			).insert(ignore_permissions=True)
+
+		migrate_to_read_watermarks.execute()
+
+		self.assertEqual(self.get_last_read_seq(READER, discussion), 1)
+		# The third comment was read, but a watermark cannot skip it
+		self.assertEqual(self.get_unread_count(READER, discussion), 3)
+		self.assertFalse(frappe.db.exists("GP Unread Record", {"discussion": discussion}))
+
+	def at(self, minutes):
+		return add_to_date(self.start, minutes=minutes)
+
+	def set_creation(self, doctype, name, minutes):
+		frappe.db.set_value(doctype, name, "creation", self.at(minutes), update_modified=False)
+
+	def make_discussion(self, minutes, user=AUTHOR, project=None):
+		frappe.set_user(user)
+		discussion = frappe.get_doc(
+			doctype="GP Discussion",
+			project=project or self.project.name,
+			title="Unread Test",
+			content="<p>Hello</p>",
+		).insert(ignore_permissions=True)
+		frappe.set_user("Administrator")
+		self.set_creation("GP Discussion", discussion.name, minutes)
+		return discussion.name
+
+	def make_comment(self, discussion, minutes, user=AUTHOR):
+		frappe.set_user(user)
+		comment = frappe.get_doc(
+			doctype="GP Comment",
+			reference_doctype="GP Discussion",
+			reference_name=discussion,
+			content="<p>Reply</p>",
+		).insert(ignore_permissions=True)
+		frappe.set_user("Administrator")
+		self.set_creation("GP Comment", comment.name, minutes)
+		return comment.name
+
+	def visit(self, user, discussion):
+		GPUnreadRecord.mark_discussion_as_read_for_user(discussion, user)
+
+	def get_last_read_seq(self, user, discussion):
+		return frappe.db.get_value(
+			"GP Discussion Visit", {"user": user, "discussion": discussion}, "last_read_seq"
+		)
+
+	def get_unread_count(self, user, discussion):
+		row = GPUnreadRecord.get_unread_counts(user, discussions=[discussion]).get(str(discussion))
+		return row.unread_count if row else 0
+
+
+def make_user(email, role="Gameplan Member"):
+	if not frappe.db.exists("User", email):
+		frappe.get_doc(
+			doctype="User",
+			email=email,
+			first_name=email.split("@")[0],
+			send_welcome_email=0,
+			roles=[{"role": role}],
+		).insert(ignore_permissions=True)
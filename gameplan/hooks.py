@@ -138,13 +138,50 @@ doc_events = {
 	"*": {
 		"on_trash": "gameplan.mixins.on_delete.on_trash",
 	},
+	"GP Discussion": {
+		"on_update": "gameplan.search_queue.mark_dirty",
+		"on_trash": "gameplan.search_queue.mark_dirty",
+	},
+	"GP Task": {
+		"on_update": "gameplan.search_queue.mark_dirty",
+		"on_trash": "gameplan.search_queue.mark_dirty",
+	},
+	"GP Page": {
+		"on_update": "gameplan.search_queue.mark_dirty",
+		"on_trash": "gameplan.search_queue.mark_dirty",
+	},
+	"GP Comment": {
+		"on_update": "gameplan.search_queue.mark_dirty",
+		"on_trash": "gameplan.search_queue.mark_dirty",
+	},
+	"GP Artwork": {
+		"on_update": "gameplan.search_queue.mark_dirty",
+		"on_trash": "gameplan.search_queue.mark_dirty",
+	},
 	"User": {
 		"after_insert": "gameplan.gameplan.doctype.gp_user_profile.gp_user_profile.create_user_profile",
 		"on_trash": [
 			"gameplan.gameplan.doctype.gp_user_profile.gp_user_profile.delete_user_profile",
 			"gameplan.gameplan.doctype.gp_guest_access.gp_guest_access.on_user_delete",
+			"gameplan.utils.project_audience.clear_public_users",
+		],
+		"on_update": [
+			"gameplan.gameplan.doctype.gp_user_profile.gp_user_profile.on_user_update",
+			"gameplan.utils.project_audience.clear_public_users",
+			"gameplan.gameplan.doctype.gp_project_access.gp_project_access.clear_accessible_projects",
 		],
-		"on_update": "gameplan.gameplan.doctype.gp_user_profile.gp_user_profile.on_user_update",
+	},
+	"GP User Profile": {
+		"on_update": "gameplan.utils.project_audience.clear_public_users",
+		"on_trash": "gameplan.utils.project_audience.clear_public_users",
+	},
+	"GP Guest Access": {
+		"on_update": [
+			"gameplan.utils.project_audience.clear_project_audience",
+			"gameplan.gameplan.doctype.gp_project_access.gp_project_access.sync_project_access",
+		],
+		"on_trash": "gameplan.utils.project_audience.clear_project_audience",
+		"after_delete": "gameplan.gameplan.doctype.gp_project_access.gp_project_access.sync_project_access",
 	},
 		# Notification hooks for real-time push notifications
 		"GP Artwork Task": {
@@ -153,15 +190,31 @@ doc_events = {
 		},
 		"GP Sales Task": {
 			"after_insert": "gameplan.gameplan.utils.notification_hooks.send_artwork_task_notifications",
-			"on_update": "gameplan.gameplan.utils.notification_hooks.send_artwork_task_notifications",
+			"on_update": [
+				"gameplan.gameplan.utils.notification_hooks.send_artwork_task_notifications",
+				"gameplan.search_queue.mark_dirty",
+			],
+			"on_trash": "gameplan.search_queue.mark_dirty",
 		},
 		"GP Procurement Task": {
 			"after_insert": "gameplan.gameplan.utils.notification_hooks.send_artwork_task_notifications",
-			"on_update": "gameplan.gameplan.utils.notification_hooks.send_artwork_task_notifications",
+			"on_update": [
+				"gameplan.gameplan.utils.notification_hooks.send_artwork_task_notifications",
+				"gameplan.search_queue.mark_dirty",
+			],
+			"on_trash": "gameplan.search_queue.mark_dirty",
 		},
 		"GP Project": {
 			"after_insert": "gameplan.gameplan.utils.notification_hooks.send_project_notifications",
-			"on_update": "gameplan.gameplan.utils.notification_hooks.send_project_notifications",
+			"on_update": [
+				"gameplan.gameplan.utils.notification_hooks.send_project_notifications",
+				"gameplan.utils.project_audience.clear_project_audience",
+				"gameplan.gameplan.doctype.gp_project_access.gp_project_access.sync_project_access",
+			],
+			"on_trash": [
+				"gameplan.utils.project_audience.clear_project_audience",
+				"gameplan.gameplan.doctype.gp_project_access.gp_project_access.remove_project_access",
+			],
 		},
 }
 
@@ -171,8 +224,15 @@ on_login = "gameplan.www.g.on_login"
 # ---------------
 
 scheduler_events = {
-	"hourly": ["gameplan.gameplan.doctype.gp_invitation.gp_invitation.expire_invitations"],
-	"daily": ["gameplan.demo.demo.generate_data_daily"],
+	"all": [
+		"gameplan.search_queue.enqueue_processing",
+		"gameplan.gameplan.doctype.gp_unread_record.gp_unread_record.enqueue_publish_unread_counts",
+	],
+	"hourly": [
+		"gameplan.gameplan.doctype.gp_invitation.gp_invitation.expire_invitations",
+		"gameplan.utils.unread_counts.reconcile_unread_counts",
+	],
+	"daily": ["gameplan.demo.demo.generate_data_daily", "gameplan.utils.search_boosts.build_click_boosts"],
 }
 
 # scheduler_events = {
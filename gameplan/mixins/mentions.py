@@ -6,6 +6,7 @@ import frappe
 from frappe.utils import get_fullname
 
 from gameplan.utils import extract_mentions
+from gameplan.utils.project_audience import get_project_audience
 
 
 class HasMentions:
@@ -25,7 +26,11 @@ class HasMentions:
 
 	def _notify_everyone_mention(self):
 		"""Handle @everyone mentions by notifying all relevant users"""
-		users_to_notify = self._get_all_active_gameplan_users()
+		project = self._get_project()
+		if project:
+			users_to_notify = get_project_audience(project)
+		else:
+			users_to_notify = self._get_all_active_gameplan_users()
 
 		for user_email in users_to_notify:
 			# Skip notifying the author
@@ -74,6 +79,12 @@ class HasMentions:
 		notification.update(values)
 		notification.insert(ignore_permissions=True)
 
+	def _get_project(self):
+		if self.doctype in ("GP Discussion", "GP Task"):
+			return self.get("project")
+		if self.doctype == "GP Comment" and self.reference_doctype in ("GP Discussion", "GP Task"):
+			return frappe.db.get_value(self.reference_doctype, self.reference_name, "project")
+
 	def _get_all_active_gameplan_users(self):
 		"""Get all active Gameplan users except guests"""
 		return frappe.qb.get_query(
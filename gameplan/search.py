@@ -3,18 +3,17 @@
 
 
 import re
+import time
 
 import frappe
 from frappe.core.utils import html2text
 from frappe.utils import cstr, update_progress_bar
 
-import gameplan
-from gameplan.utils.search import Search
+from gameplan.utils.search import BATCH_SIZE, Search
+from gameplan.utils.search_metrics import SearchTimer
 
 UNSAFE_CHARS = re.compile(r"[\[\]{}<>+]")
 
-INDEX_BUILD_FLAG = "discussions_index_in_progress"
-
 
 class GameplanSearch(Search):
 	def __init__(self) -> None:
@@ -28,11 +27,16 @@ class GameplanSearch(Search):
 		super().__init__("gameplan_idx", "search_doc", schema)
 
 	def search(self, query, **kwargs):
+		timer = SearchTimer("redisearch", query)
 		if query:
-			accessible_projects = "|".join(self.get_accessible_projects())
+			with timer.stage("permission_filter"):
+				accessible_projects = "|".join(self.get_accessible_projects())
 			projects_query = f"@project:{{{accessible_projects}}}"
 			query = f"{query} {projects_query}"
-		return super().search(query, **kwargs)
+		with timer.stage("score"):
+			result = super().search(query, **kwargs)
+		timer.finish(total_matches=result.total)
+		return result
 
 	def clean_query(self, query):
 		query = query.strip().replace("-*", "*")
@@ -40,19 +44,44 @@ class GameplanSearch(Search):
 		query = query.strip()
 		return query
 
-	def build_index(self):
-		self.drop_index()
-		self.create_index()
-		records = self.get_records()
-		total = len(records)
-		for i, doc in enumerate(records):
-			self.index_doc(doc)
+	def build_index(self, batch_size=BATCH_SIZE):
+		"""Build a new generation of the index while the current one keeps serving queries."""
+		generation = self.start_rebuild()
+		if generation is None:
+			return
+
+		try:
+			records = self.get_records()
+			self.add_documents(self._get_documents(records), generation=generation, batch_size=batch_size)
 			if not hasattr(frappe.local, "request"):
-				update_progress_bar("Indexing", i, total)
-		if not hasattr(frappe.local, "request"):
-			print()
+				print()
+		except Exception:
+			self.abort_rebuild(generation)
+			raise
 
-	def index_doc(self, doc):
+		self.finish_rebuild(generation)
+
+	def _get_documents(self, records):
+		"""Documents to add for `records`, reporting progress when run from the console."""
+		show_progress = not hasattr(frappe.local, "request")
+		total = len(records)
+		start = time.monotonic()
+		for i, doc in enumerate(records):
+			document = self.get_document(doc)
+			if document:
+				yield document
+			if show_progress:
+				rate = (i + 1) / max(time.monotonic() - start, 1e-6)
+				update_progress_bar(f"Indexing ({rate:.0f} docs/s)", i, total)
+
+	def index_doc(self, doc, generation=None):
+		document = self.get_document(doc)
+		if document:
+			id, fields, payload = document
+			self.add_document(id, fields, payload=payload, generation=generation)
+
+	def get_document(self, doc):
+		"""The id, fields and payload to index for a record, None if it is not indexed."""
 		id, fields, payload = None, None, None
 		if doc.doctype == "GP Discussion":
 			id = f"GP Discussion:{doc.name}"
@@ -95,8 +124,13 @@ class GameplanSearch(Search):
 			}
 		elif doc.doctype == "GP Comment":
 			id = f"GP Comment:{doc.name}"
-			team = frappe.db.get_value(doc.reference_doctype, doc.reference_name, "team", cache=True)
-			project = frappe.db.get_value(doc.reference_doctype, doc.reference_name, "project", cache=True)
+			if "project" in doc:
+				# Resolved in bulk by get_records
+				team, project = doc.team, doc.project
+			else:
+				reference = (doc.reference_doctype, doc.reference_name)
+				team = frappe.db.get_value(*reference, "team", cache=True)
+				project = frappe.db.get_value(*reference, "project", cache=True)
 
 			fields = {
 				"content": html2text(doc.content),
@@ -109,7 +143,7 @@ class GameplanSearch(Search):
 				"reference_name": doc.reference_name,
 			}
 		if id and fields and payload:
-			self.add_document(id, fields, payload=payload)
+			return id, fields, payload
 
 	def remove_doc(self, doc):
 		id = None
@@ -124,83 +158,78 @@ class GameplanSearch(Search):
 		if id:
 			self.remove_document(id)
 
-	def get_records(self):
+	def get_records(self, names=None):
+		"""Records to index, all of them or only those in `names`, a dict of doctype to names."""
 		records = []
-		for d in frappe.db.get_all(
-			"GP Discussion",
-			fields=["name", "title", "content", "last_post_at", "modified", "project", "team"],
-		):
-			d.doctype = "GP Discussion"
-			d.modified = d.last_post_at or d.modified
-			records.append(d)
-
-		for d in frappe.db.get_all(
-			"GP Task", fields=["name", "title", "description", "modified", "project", "team"]
-		):
-			d.doctype = "GP Task"
-			records.append(d)
-
-		for d in frappe.db.get_all(
-			"GP Page", fields=["name", "title", "content", "modified", "project", "team"]
-		):
-			d.doctype = "GP Page"
-			records.append(d)
-
-		for d in frappe.db.get_all(
-			"GP Comment",
-			fields=["name", "content", "modified", "reference_doctype", "reference_name"],
-			filters={"deleted_at": ("is", "not set")},
+		for doctype, fields, filters in (
+			(
+				"GP Discussion",
+				["name", "title", "content", "last_post_at", "modified", "project", "team"],
+				{},
+			),
+			("GP Task", ["name", "title", "description", "modified", "project", "team"], {}),
+			("GP Page", ["name", "title", "content", "modified", "project", "team"], {}),
+			(
+				"GP Comment",
+				["name", "content", "modified", "reference_doctype", "reference_name"],
+				{"deleted_at": ("is", "not set")},
+			),
 		):
-			d.doctype = "GP Comment"
-			records.append(d)
-
+			if names is not None:
+				if not names.get(doctype):
+					continue
+				filters = {**filters, "name": ("in", names[doctype])}
+			for d in frappe.db.get_all(doctype, fields=fields, filters=filters):
+				d.doctype = doctype
+				if doctype == "GP Discussion":
+					d.modified = d.last_post_at or d.modified
+				records.append(d)
+
+		self._resolve_comment_references(records)
 		return records
 
+	def _resolve_comment_references(self, records):
+		"""Set the team and project of comments from the documents they are on, in bulk."""
+		references = {(doc.doctype, cstr(doc.name)): doc for doc in records if doc.doctype != "GP Comment"}
+		comments = [doc for doc in records if doc.doctype == "GP Comment"]
+
+		missing = {}
+		for doc in comments:
+			if (doc.reference_doctype, cstr(doc.reference_name)) not in references:
+				missing.setdefault(doc.reference_doctype, set()).add(doc.reference_name)
+		for reference_doctype, reference_names in missing.items():
+			meta = frappe.get_meta(reference_doctype)
+			if not (meta.has_field("project") and meta.has_field("team")):
+				continue
+			for d in frappe.db.get_all(
+				reference_doctype,
+				fields=["name", "project", "team"],
+				filters={"name": ("in", list(reference_names))},
+			):
+				references[(reference_doctype, cstr(d.name))] = d
+
+		for doc in comments:
+			reference = references.get((doc.reference_doctype, cstr(doc.reference_name))) or {}
+			doc.team = reference.get("team")
+			doc.project = reference.get("project")
+
 	def get_accessible_projects(self):
-		from pypika.terms import ExistsCriterion
-
-		if gameplan.is_guest():
-			GuestAccess = frappe.qb.DocType("GP Guest Access")
-			return (
-				frappe.qb.from_(GuestAccess)
-				.select(GuestAccess.project)
-				.distinct()
-				.where(GuestAccess.user == frappe.session.user)
-				.run(pluck=True)
-			)
-
-		Project = frappe.qb.DocType("GP Project")
-		Member = frappe.qb.DocType("GP Member")
-		member_exists = (
-			frappe.qb.from_(Member)
-			.select(Member.name)
-			.where(Member.parenttype == "GP Team")
-			.where(Member.parent == Project.team)
-			.where(Member.user == frappe.session.user)
-		)
-		projects = (
-			frappe.qb.from_(Project)
-			.select(Project.name)
-			.distinct()
-			.where((Project.is_private == 0) | ((Project.is_private == 1) & ExistsCriterion(member_exists)))
-			.run(pluck=True)
-		)
-		return [cstr(p) for p in projects]
+		from gameplan.gameplan.doctype.gp_project_access.gp_project_access import get_accessible_projects
+
+		return sorted(get_accessible_projects())
 
 
 def build_index():
-	frappe.cache().set_value(INDEX_BUILD_FLAG, True)
 	search = GameplanSearch()
 	search.build_index()
-	frappe.cache().set_value(INDEX_BUILD_FLAG, False)
 
 
 def build_index_in_background():
-	if not frappe.cache().get_value("discussions_index_in_progress"):
+	if not GameplanSearch().rebuild_in_progress():
 		frappe.enqueue(build_index, queue="long")
 
 
 def build_index_if_not_exists():
 	search = GameplanSearch()
-	if not search.index_exists() or not frappe.cache.exists(INDEX_BUILD_FLAG):
+	if not search.index_exists() and not search.rebuild_in_progress():
 		build_index()
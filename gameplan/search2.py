@@ -7,7 +7,6 @@ import datetime
 import frappe
 from frappe.utils import cint, cstr
 
-import gameplan
 from gameplan.utils.fts import FullTextSearch
 
 INDEX_BUILD_FLAG = "discussions_index_in_progress"
@@ -19,7 +18,7 @@ class GameplanSearchIndexMissingError(Exception):
 
 class GameplanSearch:
 	def __init__(self) -> None:
-		self.fts = FullTextSearch()
+		self.fts = FullTextSearch(scoring=frappe.conf.get("gameplan_search_scoring", "python"))
 		self.doc_configs = {
 			"GP Discussion": {
 				"fields": [
@@ -77,7 +76,9 @@ class GameplanSearch:
 		if not query:
 			return []
 
-		search_response = self.fts.search(query, title_only=title_only)
+		# Only documents of projects the user can access are ranked
+		accessible_projects = self.get_accessible_projects()
+		search_response = self.fts.search(query, title_only=title_only, projects=accessible_projects)
 		results = search_response["results"]
 		summary = search_response["summary"]
 
@@ -101,21 +102,17 @@ class GameplanSearch:
 				)
 				doc_owners.update({f"{doctype}:{o.name}": o.owner for o in owners})
 
-		# Filter results based on project access
-		accessible_projects = self.get_accessible_projects()
 		filtered_results = []
-
 		for result in results:
 			doctype, name = result["id"].split(":", 1)
+			project = result["project"]
 
 			if doctype == "GP Comment":
 				ref = comment_refs.get(cint(name), {})
 				ref_doctype = ref.get("reference_doctype")
 				ref_name = ref.get("reference_name")
-				project = frappe.db.get_value(ref_doctype, ref_name, "project") if ref_doctype else None
 				author = ref.get("owner")
 			else:
-				project = frappe.db.get_value(doctype, name, "project")
 				author = doc_owners.get(result["id"], "")
 
 			if project in accessible_projects:
@@ -169,6 +166,7 @@ class GameplanSearch:
 		document = self._prepare_document(doc)
 		if document:
 			self.fts.index_document(document)
+			self.compact_if_needed()
 
 	def remove_doc(self, doc):
 		"""Remove a single document from the index"""
@@ -181,6 +179,23 @@ class GameplanSearch:
 		self.raise_if_not_indexed()
 		doc_id = f"{doctype}:{docname}"
 		self.fts.remove_document(doc_id)
+		self.compact_if_needed()
+
+	def update_documents(self, records, removed=()):
+		"""Apply changed records and removed doc ids to the index as a single delta segment"""
+		documents = [document for document in map(self._prepare_document, records) if document]
+		self.fts.update_documents(documents=documents, removed=removed)
+		self.compact_if_needed()
+
+	def compact_if_needed(self):
+		"""Merge delta segments in the background once enough of them have piled up"""
+		if self.fts.needs_compaction():
+			frappe.enqueue(
+				"gameplan.search2.compact_index",
+				queue="long",
+				job_id="gameplan_search2_compaction",
+				deduplicate=True,
+			)
 
 	def index_exists(self):
 		return self.fts.index_exists()
@@ -196,56 +211,49 @@ class GameplanSearch:
 		if not isinstance(doc.modified, datetime.datetime):
 			doc.modified = frappe.utils.get_datetime(doc.modified)
 
+		project = doc.get("project")
+		if doc.doctype == "GP Comment" and project is None and doc.reference_doctype:
+			project = frappe.db.get_value(doc.reference_doctype, doc.reference_name, "project")
+
 		return {
 			"id": f"{doc.doctype}:{doc.name}",
 			"title": getattr(doc, title_field, "") if title_field else "",
 			"content": getattr(doc, content_field, "") or "",
 			"timestamp": doc.modified.timestamp(),
+			"project": cstr(project) if project else None,
 		}
 
-	def get_records(self):
+	def get_records(self, names=None):
+		"""Records to index, all of them or only those in `names`, a dict of doctype to names"""
 		records = []
+		projects = {}
 		for doctype, config in self.doc_configs.items():
-			docs = frappe.db.get_all(doctype, fields=config["fields"], filters=config.get("filters", {}))
+			filters = config.get("filters", {})
+			if names is not None:
+				if not names.get(doctype):
+					continue
+				filters = {**filters, "name": ("in", names[doctype])}
+			docs = frappe.db.get_all(doctype, fields=config["fields"], filters=filters)
 
 			for doc in docs:
 				doc.doctype = doctype
 				if config["modified_field"] != "modified":
 					doc.modified = getattr(doc, config["modified_field"], None) or doc.modified
+				if "project" in doc:
+					projects[(doctype, cstr(doc.name))] = doc.project
 				records.append(doc)
 
+		# Comments are searched under the project of the document they are on
+		for doc in records:
+			if doc.doctype == "GP Comment":
+				doc.project = projects.get((doc.reference_doctype, cstr(doc.reference_name)))
+
 		return records
 
 	def get_accessible_projects(self):
-		from pypika.terms import ExistsCriterion
-
-		if gameplan.is_guest():
-			GuestAccess = frappe.qb.DocType("GP Guest Access")
-			return (
-				frappe.qb.from_(GuestAccess)
-				.select(GuestAccess.project)
-				.distinct()
-				.where(GuestAccess.user == frappe.session.user)
-				.run(pluck=True)
-			)
+		from gameplan.gameplan.doctype.gp_project_access.gp_project_access import get_accessible_projects
 
-		Project = frappe.qb.DocType("GP Project")
-		Member = frappe.qb.DocType("GP Member")
-		member_exists = (
-			frappe.qb.from_(Member)
-			.select(Member.name)
-			.where(Member.parenttype == "GP Team")
-			.where(Member.parent == Project.team)
-			.where(Member.user == frappe.session.user)
-		)
-		projects = (
-			frappe.qb.from_(Project)
-			.select(Project.name)
-			.distinct()
-			.where((Project.is_private == 0) | ((Project.is_private == 1) & ExistsCriterion(member_exists)))
-			.run(pluck=True)
-		)
-		return [cstr(p) for p in projects]
+		return sorted(get_accessible_projects())
 
 
 def build_index():
@@ -285,3 +293,10 @@ def remove_document(doctype, docname):
 	if not search.is_search_enabled():
 		return
 	search._remove_doc(doctype, docname)
+
+
+def compact_index():
+	search = GameplanSearch()
+	if not search.is_search_enabled() or not search.index_exists():
+		return
+	search.fts.compact()
@@ -0,0 +1,445 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+"""
+Benchmark and relevance regression harness for the three search engines.
+
+A seeded synthetic corpus of projects, discussions and comments is generated from the
+demo templates and inserted in a transaction that is rolled back at the end. Every
+engine indexes it into its own scratch location, then answers multi-term, prefix and
+typo workloads. Every generated query is labeled with the discussion it was taken
+from, which gives recall@k. Run it on a throwaway site: documents already on the
+site are indexed and searched along with the corpus.
+
+bench --site <site> execute gameplan.search_benchmark.run --kwargs "{'projects': 20, 'output': 'report.json'}"
+"""
+
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import statistics
+import time
+
+import frappe
+from faker import Faker
+from frappe.query_builder.functions import Max
+from frappe.utils import add_to_date, now_datetime
+
+from gameplan.demo.discussions_comments import get_comment_templates, get_discussion_templates
+from gameplan.search import GameplanSearch as RedisSearch
+from gameplan.search2 import GameplanSearch as FullTextSearch
+from gameplan.search_sqlite import GameplanSearch as SQLiteSearch
+
+ENGINES = ("fts", "sqlite", "redisearch")
+WORKLOADS = ("multi_term", "prefix", "typo")
+BENCHMARK_TEAM = "gameplan-search-benchmark"
+WORD = re.compile(r"[a-z]+")
+
+
+def run(
+	projects=10,
+	discussions_per_project=100,
+	comments_per_discussion=4,
+	queries_per_workload=50,
+	k=10,
+	repeat=3,
+	seed=42,
+	engines=ENGINES,
+	labeled_queries=None,
+	output=None,
+):
+	"""
+	Benchmark the engines on a synthetic corpus and return the report.
+
+	`labeled_queries` is an optional JSON file of {"query": ..., "relevant": [doc ids]}
+	entries, run as an extra "labeled" workload. With `output`, the report is also
+	written there as JSON.
+	"""
+	frappe.set_user("Administrator")
+	frappe.flags.skip_search_metrics = True
+	try:
+		corpus = generate_corpus(projects, discussions_per_project, comments_per_discussion, seed)
+		insert_corpus(corpus)
+		workloads = generate_workloads(corpus, queries_per_workload, random.Random(seed))
+		if labeled_queries:
+			with open(labeled_queries) as f:
+				workloads["labeled"] = json.load(f)
+
+		report = {
+			"config": {
+				"projects": projects,
+				"discussions": len(corpus["GP Discussion"]),
+				"comments": len(corpus["GP Comment"]),
+				"queries_per_workload": queries_per_workload,
+				"k": k,
+				"repeat": repeat,
+				"seed": seed,
+			},
+			"engines": {},
+		}
+		for name in engines:
+			engine = BENCHMARK_ENGINES[name]()
+			try:
+				report["engines"][name] = benchmark_engine(engine, workloads, k, repeat)
+			except Exception as e:
+				report["engines"][name] = {"error": repr(e)}
+			finally:
+				engine.cleanup()
+	finally:
+		frappe.db.rollback()
+		frappe.flags.skip_search_metrics = False
+
+	print_report(report)
+	if output:
+		with open(output, "w") as f:
+			json.dump(report, f, indent=2)
+	return report
+
+
+def generate_corpus(projects, discussions_per_project, comments_per_discussion, seed):
+	"""Rows to insert per doctype, generated from the demo templates."""
+	fake = Faker()
+	fake.seed_instance(seed)
+	rng = random.Random(seed)
+	discussion_templates = get_discussion_templates()
+	comment_templates = get_comment_templates()
+	now = now_datetime()
+
+	def next_name(doctype):
+		Table = frappe.qb.DocType(doctype)
+		return (frappe.qb.from_(Table).select(Max(Table.name)).run()[0][0] or 0) + 1
+
+	corpus = {"GP Project": [], "GP Discussion": [], "GP Comment": []}
+	project_name, discussion_name, comment_name = (
+		next_name(doctype) for doctype in ("GP Project", "GP Discussion", "GP Comment")
+	)
+	for _ in range(projects):
+		project_title = fake.catch_phrase()
+		corpus["GP Project"].append({"name": project_name, "title": project_title})
+
+		for _ in range(discussions_per_project):
+			params = _TemplateParams(fake, project=project_title)
+			template = rng.choice(discussion_templates)
+			modified = add_to_date(now, minutes=-rng.randint(0, 30 * 24 * 60))
+			corpus["GP Discussion"].append(
+				{
+					"name": discussion_name,
+					"title": template["title"].format_map(params),
+					"content": template["content"].format_map(params),
+					"project": project_name,
+					"modified": modified,
+				}
+			)
+
+			for _ in range(comments_per_discussion):
+				params = _TemplateParams(fake, project=project_title)
+				corpus["GP Comment"].append(
+					{
+						"name": comment_name,
+						"content": rng.choice(comment_templates).format_map(params),
+						"reference_name": discussion_name,
+						"modified": add_to_date(modified, minutes=rng.randint(1, 24 * 60)),
+					}
+				)
+				comment_name += 1
+			discussion_name += 1
+		project_name += 1
+
+	return corpus
+
+
+class _TemplateParams(dict):
+	"""Template placeholders, each filled with fake data the first time it is used."""
+
+	def __init__(self, fake, **params):
+		super().__init__(**params)
+		self.fake = fake
+
+	def __missing__(self, key):
+		if key.startswith("image"):
+			value = "https://picsum.photos/400"
+		elif key.startswith(("bs", "catch_phrase", "initiative", "effort", "idea")):
+			value = self.fake.catch_phrase()
+		elif key.startswith(("user", "mention")):
+			value = self.fake.name()
+		elif key == "sentence":
+			value = self.fake.sentence()
+		elif key == "company":
+			value = self.fake.company()
+		else:
+			value = self.fake.word()
+		self[key] = value
+		return value
+
+
+def insert_corpus(corpus):
+	"""Insert the corpus with bulk inserts, the caller rolls it back."""
+	owner = "Administrator"
+	if not frappe.db.exists("GP Team", BENCHMARK_TEAM):
+		now = now_datetime()
+		frappe.db.bulk_insert(
+			"GP Team",
+			["name", "title", "owner", "modified_by", "creation", "modified"],
+			[(BENCHMARK_TEAM, "Search Benchmark", owner, owner, now, now)],
+		)
+
+	frappe.db.bulk_insert(
+		"GP Project",
+		["name", "title", "team", "is_private", "owner", "modified_by", "creation", "modified"],
+		[
+			(p["name"], p["title"], BENCHMARK_TEAM, 0, owner, owner, now_datetime(), now_datetime())
+			for p in corpus["GP Project"]
+		],
+	)
+	frappe.db.bulk_insert(
+		"GP Discussion",
+		[
+			"name",
+			"title",
+			"content",
+			"project",
+			"team",
+			"last_post_at",
+			"owner",
+			"modified_by",
+			"creation",
+			"modified",
+		],
+		[
+			(
+				d["name"],
+				d["title"],
+				d["content"],
+				d["project"],
+				BENCHMARK_TEAM,
+				d["modified"],
+				owner,
+				owner,
+				d["modified"],
+				d["modified"],
+			)
+			for d in corpus["GP Discussion"]
+		],
+	)
+	frappe.db.bulk_insert(
+		"GP Comment",
+		[
+			"name",
+			"content",
+			"reference_doctype",
+			"reference_name",
+			"owner",
+			"modified_by",
+			"creation",
+			"modified",
+		],
+		[
+			(
+				c["name"],
+				c["content"],
+				"GP Discussion",
+				c["reference_name"],
+				owner,
+				owner,
+				c["modified"],
+				c["modified"],
+			)
+			for c in corpus["GP Comment"]
+		],
+	)
+
+
+def generate_workloads(corpus, queries_per_workload, rng):
+	"""
+	Known-item queries built from the rarest title words of randomly picked discussions,
+	each labeled with the discussion it was taken from.
+	"""
+	discussions = corpus["GP Discussion"]
+	document_frequency = {}
+	title_words = {}
+	for d in discussions:
+		words = {word for word in WORD.findall(d["title"].lower()) if len(word) >= 4}
+		title_words[d["name"]] = sorted(words)
+		for word in words:
+			document_frequency[word] = document_frequency.get(word, 0) + 1
+
+	workloads = {workload: [] for workload in WORKLOADS}
+	for d in rng.sample(discussions, min(queries_per_workload, len(discussions))):
+		rare = sorted(title_words[d["name"]], key=lambda word: (document_frequency[word], word))
+		if len(rare) < 2:
+			continue
+		relevant = [f"GP Discussion:{d['name']}"]
+		long_words = [word for word in rare if len(word) >= 6]
+		workloads["multi_term"].append({"query": f"{rare[0]} {rare[1]}", "relevant": relevant})
+		if long_words:
+			word = long_words[0]
+			workloads["prefix"].append({"query": word[:4], "relevant": relevant})
+			# Transpose two letters in the middle of the word, one edit away
+			i = rng.randint(1, len(word) - 3)
+			typo = word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+			other = next(w for w in rare if w != word)
+			workloads["typo"].append({"query": f"{typo} {other}", "relevant": relevant})
+	return workloads
+
+
+def benchmark_engine(engine, workloads, k, repeat):
+	rss_before = _get_peak_rss_mb()
+	start = time.perf_counter()
+	engine.build()
+	result = {
+		"build_seconds": round(time.perf_counter() - start, 3),
+		"peak_rss_growth_mb": round(_get_peak_rss_mb() - rss_before, 1),
+		"index_size_mb": round(engine.get_index_size() / (1024 * 1024), 2),
+		"workloads": {},
+	}
+
+	for workload, queries in workloads.items():
+		durations = []
+		recalls = []
+		for labeled in queries:
+			for _ in range(repeat):
+				start = time.perf_counter()
+				ids = engine.search(labeled["query"], k)
+				durations.append((time.perf_counter() - start) * 1000)
+			relevant = set(labeled["relevant"])
+			if relevant:
+				recalls.append(len(relevant.intersection(ids[:k])) / len(relevant))
+
+		if not durations:
+			continue
+		percentiles = statistics.quantiles(durations, n=100) if len(durations) > 1 else durations * 99
+		result["workloads"][workload] = {
+			"queries": len(queries),
+			"p50_ms": round(percentiles[49], 2),
+			"p95_ms": round(percentiles[94], 2),
+			"p99_ms": round(percentiles[98], 2),
+			f"recall_at_{k}": round(statistics.mean(recalls), 3) if recalls else None,
+		}
+	return result
+
+
+def print_report(report):
+	for name, result in report["engines"].items():
+		if "error" in result:
+			print(f"{name:12} failed: {result['error']}")
+			continue
+		print(
+			f"{name:12} build {result['build_seconds']:>8.2f} s  "
+			f"rss +{result['peak_rss_growth_mb']:>7.1f} MB  index {result['index_size_mb']:>8.2f} MB"
+		)
+		for workload, stats in result["workloads"].items():
+			recall = next(value for key, value in stats.items() if key.startswith("recall_at_"))
+			print(
+				f"  {workload:12} p50 {stats['p50_ms']:>8.2f} ms  p95 {stats['p95_ms']:>8.2f} ms  "
+				f"p99 {stats['p99_ms']:>8.2f} ms  recall {recall}"
+			)
+
+
+def _get_peak_rss_mb():
+	# ru_maxrss is the peak of the process in kilobytes on Linux, an engine that stays below
+	# the peak of an earlier one shows no growth
+
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _get_scratch_dir(*path):
+	return frappe.get_site_path("indexes", "benchmark", *path)
+
+
+class FullTextSearchEngine:
+	def __init__(self):
+		self.search_engine = FullTextSearch()
+		fts = self.search_engine.fts
+		fts.index_dir = _get_scratch_dir("fts")
+		fts.redis_prefix = "fts_benchmark:"
+
+	def build(self):
+		self.search_engine.build_index()
+
+	def search(self, query, k):
+		self.search_engine.fts.max_results = k
+		return [r["id"] for r in self.search_engine.fts.search(query)["results"]]
+
+	def get_index_size(self):
+		return _get_directory_size(self.search_engine.fts.index_dir)
+
+	def cleanup(self):
+		fts = self.search_engine.fts
+		fts.redis.delete(*(fts._get_raw_redis_key(key) for key in ("manifest", "manifest_version")))
+		shutil.rmtree(fts.index_dir, ignore_errors=True)
+
+
+class _ScratchSQLiteSearch(SQLiteSearch):
+	@property
+	def db_path(self):
+		return _get_scratch_dir("sqlite", "gameplan_search.db")
+
+	@db_path.setter
+	def db_path(self, value):
+		pass
+
+
+class SQLiteSearchEngine:
+	def __init__(self):
+		self.search_engine = _ScratchSQLiteSearch()
+
+	def build(self):
+		os.makedirs(os.path.dirname(self.search_engine.db_path), exist_ok=True)
+		self.search_engine._build()
+
+	def search(self, query, k):
+		# Skips the result cache, which would turn repeated queries into dictionary lookups
+		results = self.search_engine._search(query)["results"]
+		return [f"{r['doctype']}:{r['name']}" for r in results[:k]]
+
+	def get_index_size(self):
+		return os.path.getsize(self.search_engine.db_path)
+
+	def cleanup(self):
+		shutil.rmtree(os.path.dirname(self.search_engine.db_path), ignore_errors=True)
+
+
+class _ScratchRedisSearch(RedisSearch):
+	def __init__(self):
+		super().__init__()
+		self.index_name = "gameplan_benchmark_idx"
+		self.prefix = "search_benchmark_doc"
+
+
+class RedisSearchEngine:
+	def __init__(self):
+		self.search_engine = _ScratchRedisSearch()
+
+	def build(self):
+		self.search_engine.build_index()
+
+	def search(self, query, k):
+		# The same query syntax as api.search, ranked by relevance instead of recency
+		query = self.search_engine.clean_query(query)
+		words = query.split()
+		query = f"{words[0]}*" if len(words) == 1 else " ".join(f"%{word}%" for word in words)
+		result = self.search_engine.search(f"@title|content:({query})", page_length=k)
+		return [doc.id for doc in result.docs]
+
+	def get_index_size(self):
+		info = self.search_engine.redis.ft(self.search_engine.index_name).info()
+		sizes = ("inverted_sz_mb", "offset_vectors_sz_mb", "doc_table_size_mb", "key_table_size_mb")
+		return sum(float(info.get(size, 0)) for size in sizes) * 1024 * 1024
+
+	def cleanup(self):
+		self.search_engine.drop_index()
+
+
+BENCHMARK_ENGINES = {
+	"fts": FullTextSearchEngine,
+	"sqlite": SQLiteSearchEngine,
+	"redisearch": RedisSearchEngine,
+}
+
+
+def _get_directory_size(path):
+	if not os.path.isdir(path):
+		return 0
+	return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
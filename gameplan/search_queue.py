@@ -0,0 +1,248 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+"""
+Debounced queue of documents waiting to be reindexed.
+
+Saving a document only marks it dirty in a Redis sorted set, scored with the time of
+its first unindexed change. A background job takes documents out of the set once they
+have been left alone for `gameplan_search_index_delay` seconds, reads them in bulk
+and applies them to every search index the site has, so a comment edited five times
+in a minute is reindexed once.
+
+Site config:
+- gameplan_search_index_delay: seconds to wait for more changes (default 5)
+- gameplan_search_max_staleness: seconds a change may wait at most, caps the delay (default 60)
+- gameplan_search_queue_max_depth: queued documents beyond which the queue is dropped
+  and the indexes rebuilt instead (default 20000)
+
+A batch that fails is retried one document at a time. A document that fails
+`MAX_ATTEMPTS` times is moved to a dead letter set and logged, see `retry_dead_letters`.
+"""
+
+import time
+
+import frappe
+from frappe.utils import cint, cstr
+
+QUEUE_KEY = "gameplan_search_queue"
+QUEUE_JOB_ID = "gameplan_search_queue"
+PROCESSED_KEY = "gameplan_search_queue_processed"
+OVERFLOWS_KEY = "gameplan_search_queue_overflows"
+# Failed reindexing attempts per document, and documents that failed too often
+ATTEMPTS_KEY = "gameplan_search_queue_attempts"
+DEAD_LETTER_KEY = "gameplan_search_queue_dead_letters"
+MAX_ATTEMPTS = 3
+
+INDEXED_DOCTYPES = ("GP Discussion", "GP Task", "GP Page", "GP Comment")
+# Only indexed by the SQLite search, see `gameplan.search_sqlite.WORKFLOW_DOCTYPES`
+WORKFLOW_DOCTYPES = ("GP Artwork", "GP Sales Task", "GP Procurement Task")
+# Documents whose comments are indexed with the document's project
+COMMENTED_DOCTYPES = ("GP Discussion", "GP Task")
+BATCH_SIZE = 500
+DEFAULT_DELAY = 5  # seconds
+DEFAULT_MAX_STALENESS = 60  # seconds
+DEFAULT_MAX_DEPTH = 20000
+# Stay well within the timeout of the default queue, the scheduler picks up the rest
+JOB_RUNTIME = 240  # seconds
+
+
+def mark_dirty(doc, method=None):
+	"""Queue a changed or deleted document for reindexing."""
+	if frappe.conf.get("disable_gameplan_search"):
+		return
+	if doc.doctype not in INDEXED_DOCTYPES and doc.doctype not in WORKFLOW_DOCTYPES:
+		return
+
+	now = time.time()
+	members = {f"{doc.doctype}:{doc.name}": now}
+	if method == "on_update" and doc.doctype in COMMENTED_DOCTYPES and doc.has_value_changed("project"):
+		# Comments are indexed under the project of the document they are on
+		for comment in frappe.get_all(
+			"GP Comment", filters={"reference_doctype": doc.doctype, "reference_name": doc.name}, pluck="name"
+		):
+			members[f"GP Comment:{comment}"] = now
+
+	cache = frappe.cache()
+	queue_key = cache.make_key(QUEUE_KEY)
+	pipeline = cache.pipeline()
+	# NX keeps the time of the first change, repeated changes do not push the document back
+	pipeline.zadd(queue_key, members, nx=True)
+	pipeline.zcard(queue_key)
+	_added, depth = pipeline.execute()
+
+	if depth > get_max_depth():
+		# Indexing cannot keep up, reindexing everything at once is cheaper from here
+		cache.delete(queue_key)
+		cache.incr(cache.make_key(OVERFLOWS_KEY))
+		frappe.enqueue(rebuild_indexes, queue="long", job_id="gameplan_search_rebuild", deduplicate=True)
+		return
+
+	_enqueue_processing()
+
+
+def enqueue_processing():
+	"""Scheduled, picks up documents left behind by a job that ran out of time or failed."""
+	if frappe.cache().zcard(frappe.cache().make_key(QUEUE_KEY)):
+		_enqueue_processing()
+
+
+def _enqueue_processing():
+	# Does nothing while the job is queued or running, the running job drains new entries too
+	frappe.enqueue(process_queue, job_id=QUEUE_JOB_ID, deduplicate=True, enqueue_after_commit=True)
+
+
+def process_queue():
+	"""Reindex queued documents as their changes settle, until the queue is empty."""
+	cache = frappe.cache()
+	queue_key = cache.make_key(QUEUE_KEY)
+	deadline = time.monotonic() + JOB_RUNTIME
+
+	while time.monotonic() < deadline:
+		# Start a new transaction so that rows changed since the last batch are seen
+		frappe.db.commit()
+		due_before = time.time() - get_delay()
+		# ZPOPMIN hands every entry to exactly one worker, entries not yet due are put back
+		entries = cache.zpopmin(queue_key, BATCH_SIZE)
+		if not entries:
+			return
+		due = [member.decode() for member, queued_at in entries if queued_at <= due_before]
+		waiting = {member: queued_at for member, queued_at in entries if queued_at > due_before}
+		if waiting:
+			cache.zadd(queue_key, waiting, nx=True)
+
+		if due:
+			try:
+				reindex(due)
+				processed = len(due)
+				cache.execute_command("HDEL", cache.make_key(ATTEMPTS_KEY), *due)
+			except Exception:
+				frappe.db.rollback()
+				processed = _reindex_separately(due)
+			cache.incr(cache.make_key(PROCESSED_KEY), processed)
+		else:
+			time.sleep(min(min(waiting.values()) - due_before, get_delay()))
+
+
+def _reindex_separately(members):
+	"""
+	Reindex the documents of a failed batch one at a time, so that a document that cannot
+	be indexed does not hold up the others. It goes to the back of the queue, and after
+	`MAX_ATTEMPTS` failures to the dead letter set. Returns the number of documents reindexed.
+	"""
+	cache = frappe.cache()
+	processed = 0
+	for member in members:
+		try:
+			reindex([member])
+			processed += 1
+			cache.execute_command("HDEL", cache.make_key(ATTEMPTS_KEY), member)
+		except Exception:
+			frappe.db.rollback()
+			attempts = cache.execute_command("HINCRBY", cache.make_key(ATTEMPTS_KEY), member, 1)
+			if attempts < MAX_ATTEMPTS:
+				cache.zadd(cache.make_key(QUEUE_KEY), {member: time.time()}, nx=True)
+				continue
+			cache.zadd(cache.make_key(DEAD_LETTER_KEY), {member: time.time()})
+			cache.execute_command("HDEL", cache.make_key(ATTEMPTS_KEY), member)
+			frappe.log_error(title=f"Could not reindex {member} for search")
+	return processed
+
+
+def retry_dead_letters():
+	"""Queue the documents that failed to reindex again, once whatever broke them is fixed."""
+	cache = frappe.cache()
+	dead_letter_key = cache.make_key(DEAD_LETTER_KEY)
+	members = [member.decode() for member in cache.zrange(dead_letter_key, 0, -1)]
+	if not members:
+		return
+	now = time.time()
+	cache.zadd(cache.make_key(QUEUE_KEY), dict.fromkeys(members, now), nx=True)
+	cache.zrem(dead_letter_key, *members)
+	_enqueue_processing()
+
+
+def reindex(members):
+	"""Apply the current state of the queued documents to every search index that exists."""
+	from gameplan.search import GameplanSearch as RedisSearch
+	from gameplan.search2 import GameplanSearch as FullTextSearch
+	from gameplan.search_sqlite import GameplanSearch as SQLiteSearch
+
+	names = {}
+	for member in members:
+		doctype, name = member.split(":", 1)
+		names.setdefault(doctype, []).append(name)
+
+	search = SQLiteSearch()
+	if search.is_search_enabled() and search.index_exists():
+		search.update_documents(names)
+
+	names = {doctype: docnames for doctype, docnames in names.items() if doctype in INDEXED_DOCTYPES}
+	if not names:
+		return
+
+	search = FullTextSearch()
+	if search.is_search_enabled() and search.index_exists():
+		records = search.get_records(names)
+		search.update_documents(records, removed=_get_removed(names, records))
+
+	search = RedisSearch()
+	if search.index_exists() or search.rebuild_in_progress():
+		records = search.get_records(names)
+		search.add_documents(document for document in map(search.get_document, records) if document)
+		for doc_id in _get_removed(names, records):
+			doctype, name = doc_id.split(":", 1)
+			search.remove_doc(frappe._dict(doctype=doctype, name=name))
+
+
+def _get_removed(names, records):
+	"""Ids of the queued documents that no longer exist or are no longer indexed."""
+	found = {f"{doc.doctype}:{cstr(doc.name)}" for doc in records}
+	return [
+		f"{doctype}:{name}"
+		for doctype, docnames in names.items()
+		for name in docnames
+		if f"{doctype}:{name}" not in found
+	]
+
+
+def rebuild_indexes():
+	"""Rebuild every search index that exists, after the queue overflowed."""
+	from gameplan import search, search2, search_sqlite
+
+	if search_sqlite.GameplanSearch().index_exists():
+		search_sqlite.build_index()
+	if search2.GameplanSearch().index_exists():
+		search2.build_index()
+	if search.GameplanSearch().index_exists():
+		search.build_index()
+
+
+def get_delay():
+	return min(cint(frappe.conf.get("gameplan_search_index_delay", DEFAULT_DELAY)), get_max_staleness())
+
+
+def get_max_staleness():
+	return cint(frappe.conf.get("gameplan_search_max_staleness", DEFAULT_MAX_STALENESS))
+
+
+def get_max_depth():
+	return cint(frappe.conf.get("gameplan_search_queue_max_depth", DEFAULT_MAX_DEPTH))
+
+
+def get_queue_stats():
+	cache = frappe.cache()
+	queue_key = cache.make_key(QUEUE_KEY)
+	depth = cache.zcard(queue_key)
+	dead_letters = cache.zcard(cache.make_key(DEAD_LETTER_KEY))
+	oldest = cache.zrange(queue_key, 0, 0, withscores=True)
+	oldest_age = time.time() - oldest[0][1] if oldest else 0
+	processed, overflows = cache.mget([cache.make_key(PROCESSED_KEY), cache.make_key(OVERFLOWS_KEY)])
+	return {
+		"depth": depth,
+		"oldest_age": oldest_age,
+		"max_staleness": get_max_staleness(),
+		"sla_breached": oldest_age > get_max_staleness(),
+		"processed": cint(processed),
+		"overflows": cint(overflows),
+		"dead_letters": dead_letters,
+	}
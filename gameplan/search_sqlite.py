@@ -1,12 +1,90 @@
 # Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and Contributors
 # MIT License. See license.txt
+import copy
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
 import frappe
+from bs4 import BeautifulSoup
 from frappe.search.sqlite_search import SQLiteSearch, SQLiteSearchIndexMissingError
-from frappe.utils import cstr
+from frappe.utils import cint, cstr, get_datetime
+
+from gameplan.search_queue import mark_dirty
+from gameplan.utils.search_boosts import get_click_boosts
+from gameplan.utils.search_metrics import SearchTimer
+
+# Bumped on every change to the index, invalidates cached search results everywhere
+INDEX_VERSION_KEY = "gameplan_search_index_version"
+
+# Rebuilds write a new generation of the index file and switch the live pointer to it when done
+INDEX_GENERATION_KEY = "gameplan_search_index_generation"
+INDEX_GENERATION_COUNTER_KEY = "gameplan_search_index_generations"
+INDEX_REBUILD_KEY = "gameplan_search_index_rebuild"
+INDEX_JOURNAL_KEY = "gameplan_search_index_journal"
+REBUILD_TIMEOUT = 60 * 60  # seconds
+INDEX_BUILD_CHUNK_SIZE = 1000
+INDEX_BUILD_COMMIT_ROWS = 50_000
+RESULT_CACHE_HITS_KEY = "gameplan_search_result_cache_hits"
+RESULT_CACHE_MISSES_KEY = "gameplan_search_result_cache_misses"
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL = 300  # seconds
+# Hits and misses are counted in the process and added to the shared counters this often
+RESULT_CACHE_STATS_FLUSH_INTERVAL = 60  # seconds
+
+# Per site: [hits, misses, time of the last flush]
+_result_cache_lookups = {}
+
+
+class ResultCache:
+	"""Per-process LRU cache of search results with a time to live."""
+
+	def __init__(self, maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.entries = OrderedDict()
+
+	def get(self, key):
+		entry = self.entries.get(key)
+		if entry is None:
+			return None
+		expires_at, value = entry
+		if expires_at < time.monotonic():
+			del self.entries[key]
+			return None
+		self.entries.move_to_end(key)
+		return value
+
+	def set(self, key, value):
+		self.entries[key] = (time.monotonic() + self.ttl, value)
+		self.entries.move_to_end(key)
+		while len(self.entries) > self.maxsize:
+			self.entries.popitem(last=False)
+
+	def clear(self):
+		self.entries.clear()
 
-import gameplan
 
-INDEX_BUILD_FLAG = "discussions_index_in_progress"
+result_cache = ResultCache()
+
+# Artwork workflow documents, which belong to a customer rather than a project. They are left
+# out of the project filtered site search and only searched through `search_workflow_tasks`.
+WORKFLOW_DOCTYPES = {
+	"GP Artwork": "Artwork",
+	"GP Sales Task": "Sales Cycle",
+	"GP Procurement Task": "Procurement Cycle",
+}
+# Metadata `search_workflow_tasks` can filter on, callers check access by role
+WORKFLOW_FILTER_FIELDS = ("doctype", "status", "workflow_type", "customer", "artwork", "cycle_count")
+
+# Command palette typeahead: titles are indexed by the first 1-3 characters of each word
+TYPEAHEAD_DOCTYPES = {"GP Discussion": "last_post_at", "GP Task": "modified", "GP Page": "modified"}
+TYPEAHEAD_MAX_PREFIX_LENGTH = 3
+TYPEAHEAD_LIMIT = 10
 
 
 class GameplanSearch(SQLiteSearch):
@@ -22,8 +100,25 @@ class GameplanSearch(SQLiteSearch):
 
 	INDEX_NAME = "gameplan_search.db"
 
+	# Loaded on first use by every instance, so that a new table is picked up by the next request
+	_click_boosts = None
+	# Set while the search queue writes a document, see `index_doc`
+	_writing = False
+
 	INDEX_SCHEMA = {
-		"metadata_fields": ["team", "project", "tags", "owner", "reference_doctype", "reference_name"],
+		"metadata_fields": [
+			"team",
+			"project",
+			"tags",
+			"owner",
+			"reference_doctype",
+			"reference_name",
+			"status",
+			"workflow_type",
+			"customer",
+			"artwork",
+			"cycle_count",
+		],
 		"tokenizer": "unicode61 remove_diacritics 2 tokenchars '-_'",
 	}
 
@@ -41,6 +136,43 @@ class GameplanSearch(SQLiteSearch):
 			"fields": ["name", "content", "modified", "reference_doctype", "reference_name", "owner"],
 			"filters": {"deleted_at": ("is", "not set")},
 		},
+		"GP Artwork": {
+			"fields": [
+				"name",
+				"title",
+				{"content": "description"},
+				"modified",
+				"status",
+				"customer",
+				"owner",
+			],
+		},
+		"GP Sales Task": {
+			"fields": [
+				"name",
+				"title",
+				{"content": "description"},
+				"modified",
+				"status",
+				"customer",
+				"artwork",
+				"cycle_count",
+				"owner",
+			],
+		},
+		"GP Procurement Task": {
+			"fields": [
+				"name",
+				"title",
+				{"content": "description"},
+				"modified",
+				"status",
+				"customer",
+				"artwork",
+				"cycle_count",
+				"owner",
+			],
+		},
 	}
 
 	def is_search_enabled(self):
@@ -48,6 +180,69 @@ class GameplanSearch(SQLiteSearch):
 		disabled = frappe.conf.get("disable_gameplan_search", False)
 		return not disabled
 
+	@property
+	def db_path(self):
+		"""Index file of the live generation, or of the generation being built during a rebuild."""
+		generation = getattr(self, "_rebuild_generation", None) or get_index_generation()
+		if not generation:
+			return self._db_path
+		root, ext = os.path.splitext(self._db_path)
+		return f"{root}.{generation}{ext}"
+
+	@db_path.setter
+	def db_path(self, value):
+		self._db_path = value
+
+	def index_doc(self, doctype, docname):
+		"""
+		Called by frappe after every save of an indexed document. Only the search queue
+		writes to the index, see `gameplan.search_queue`, so the document is queued instead.
+		"""
+		if self._writing:
+			return super().index_doc(doctype, docname)
+		mark_dirty(frappe._dict(doctype=doctype, name=docname))
+
+	def remove_doc(self, doctype, docname):
+		"""Called by frappe after an indexed document is deleted, queued like in `index_doc`."""
+		if self._writing:
+			return super().remove_doc(doctype, docname)
+		mark_dirty(frappe._dict(doctype=doctype, name=docname))
+
+	def _index_doc(self, doctype, docname):
+		self._journal("index", doctype, docname)
+		self._write(super().index_doc, doctype, docname)
+		self._update_title_prefixes(doctype, docname)
+		self._update_facets(doctype, docname)
+
+	def _remove_doc(self, doctype, docname):
+		self._journal("remove", doctype, docname)
+		self._write(super().remove_doc, doctype, docname)
+		self._update_title_prefixes(doctype, docname, removed=True)
+		self._update_facets(doctype, docname, removed=True)
+
+	def _write(self, method, doctype, docname):
+		# The parent's own calls to index_doc and remove_doc must write too
+		self._writing = True
+		try:
+			method(doctype, docname)
+		finally:
+			self._writing = False
+
+	def update_documents(self, names):
+		"""Reindex the documents in `names`, a dict of doctype to names, removing the ones that are gone."""
+		for doctype, docnames in names.items():
+			config = self.INDEXABLE_DOCTYPES.get(doctype)
+			if not config:
+				continue
+			filters = {**config.get("filters", {}), "name": ("in", docnames)}
+			existing = {cstr(name) for name in frappe.get_all(doctype, filters=filters, pluck="name")}
+			for docname in docnames:
+				if docname in existing:
+					self._index_doc(doctype, docname)
+				else:
+					self._remove_doc(doctype, docname)
+		bump_index_version()
+
 	def prepare_document(self, doc):
 		"""Prepare a document for indexing with Gameplan-specific handling."""
 		# Get base document from parent class
@@ -66,6 +261,9 @@ class GameplanSearch(SQLiteSearch):
 			tags = self._get_tags_for_document(doc.doctype, doc.name)
 			document["tags"] = " ".join(tags) if tags else None
 
+		if doc.doctype in WORKFLOW_DOCTYPES:
+			document["workflow_type"] = WORKFLOW_DOCTYPES[doc.doctype]
+
 		return document
 
 	def _get_tags_for_document(self, doctype, docname):
@@ -83,42 +281,357 @@ class GameplanSearch(SQLiteSearch):
 		).run(pluck=True)
 		return tags or []
 
-	def _load_all_tags(self):
-		"""Load all tags for GP Discussion and GP Comment documents into memory."""
-		self._tags_cache = {}
-
-		# Fetch all tag links for discussions and comments in one query
+	def _load_tags(self, doctype, names):
+		"""Tags of the documents in `names`, keyed by "doctype:name", with one query."""
+		tags = {}
 		tag_links = frappe.qb.get_query(
 			"GP Tag Link",
-			fields=["parenttype", "parent", "label"],
-			filters={"parenttype": ("in", ["GP Discussion", "GP Comment"]), "parentfield": "tags"},
+			fields=["parent", "label"],
+			filters={"parenttype": doctype, "parent": ("in", names), "parentfield": "tags"},
 		).run(as_dict=True)
-
-		# Group tags by document
 		for tag_link in tag_links:
-			cache_key = f"{tag_link['parenttype']}:{tag_link['parent']}"
-			if cache_key not in self._tags_cache:
-				self._tags_cache[cache_key] = []
-			self._tags_cache[cache_key].append(tag_link["label"])
+			tags.setdefault(f"{doctype}:{tag_link['parent']}", []).append(tag_link["label"])
+		return tags
+
+	def _load_comment_projects(self, names):
+		"""
+		(project, team) of the documents the comments in `names` were made on, keyed by
+		"reference_doctype:reference_name", with one join per referenced doctype.
+		"""
+		projects = {}
+		Comment = frappe.qb.DocType("GP Comment")
+		reference_doctypes = (
+			frappe.qb.from_(Comment)
+			.select(Comment.reference_doctype)
+			.distinct()
+			.where(Comment.name.isin(names))
+			.run(pluck=True)
+		)
+		for reference_doctype in reference_doctypes:
+			meta = frappe.get_meta(reference_doctype)
+			if not (meta.has_field("project") and meta.has_field("team")):
+				continue
+
+			Reference = frappe.qb.DocType(reference_doctype)
+			rows = (
+				frappe.qb.from_(Comment)
+				.join(Reference)
+				.on(Reference.name == Comment.reference_name)
+				.select(Comment.reference_name, Reference.project, Reference.team)
+				.distinct()
+				.where(Comment.reference_doctype == reference_doctype)
+				.where(Comment.name.isin(names))
+				.run()
+			)
+			for reference_name, project, team in rows:
+				projects[f"{reference_doctype}:{reference_name}"] = (project, team)
+		return projects
 
 	def build_index(self):
-		"""Build search index with optimized tag loading."""
-		# Pre-load all tags for bulk indexing performance
-		self._load_all_tags()
+		"""
+		Build a new generation of the index next to the live one and switch to it once complete.
+
+		Searches keep using the live generation meanwhile. Documents changed during the
+		build are journaled and indexed again into the new generation before the switch.
+		"""
+		cache = frappe.cache()
+		generation = cache.incr(cache.make_key(INDEX_GENERATION_COUNTER_KEY))
+		if not cache.set(cache.make_key(INDEX_REBUILD_KEY), generation, nx=True, ex=REBUILD_TIMEOUT):
+			# Another rebuild is running
+			return
+		cache.delete_value(INDEX_JOURNAL_KEY)
+
+		live_path = self.db_path
+		self._rebuild_generation = generation
+		rebuild_path = self.db_path
 
 		try:
-			# Call parent build_index method
+			self._build()
+			self._replay_journal()
+		except Exception:
+			self._remove_index_files(rebuild_path)
+			cache.delete_value([INDEX_REBUILD_KEY, INDEX_JOURNAL_KEY])
+			raise
+		finally:
+			self._rebuild_generation = None
+
+		pipeline = cache.pipeline()
+		pipeline.set(cache.make_key(INDEX_GENERATION_KEY), generation)
+		pipeline.delete(cache.make_key(INDEX_REBUILD_KEY))
+		pipeline.execute()
+		bump_index_version()
+
+		# Changes journaled by writers that had not seen the switch yet
+		self._replay_journal()
+		cache.delete_value(INDEX_JOURNAL_KEY)
+		if live_path != rebuild_path:
+			self._remove_index_files(live_path)
+
+	def _build(self):
+		"""
+		Build the index and its side tables into the file at db_path.
+
+		Rows are read `INDEX_BUILD_CHUNK_SIZE` at a time in name order. While the next chunk
+		is read, worker processes turn the HTML of the previous one into text, and its
+		documents, title prefixes and facets are written with `executemany` in transactions
+		of `INDEX_BUILD_COMMIT_ROWS` rows. Memory use does not grow with the site.
+		"""
+		self._create_index_tables()
+		conn = self._get_connection()
+		try:
+			# The file only goes live once complete, a crash means building it again anyway
+			conn.execute("PRAGMA synchronous = OFF")
+			self._create_title_prefix_table(conn)
+			self._create_facet_tables(conn)
+			for table in ("search_fts", "title_prefixes", "document_facets", "facet_counts"):
+				conn.execute(f"DELETE FROM {table}")
+			columns = [row["name"] for row in conn.execute("PRAGMA table_info(search_fts)")]
+
+			workers = cint(frappe.conf.get("gameplan_search_index_workers")) or os.cpu_count()
+			with ProcessPoolExecutor(max_workers=workers) as executor:
+				pending, uncommitted = None, 0
+				for doctype, rows in self._iter_index_chunks():
+					content_field = _get_source_field(self.INDEXABLE_DOCTYPES[doctype], "content")
+					texts = [None] * len(rows)
+					if content_field:
+						texts = executor.map(
+							_html_to_text,
+							[row.get(content_field) for row in rows],
+							chunksize=max(1, len(rows) // (workers * 4)),
+						)
+					if pending:
+						uncommitted += self._write_index_chunk(conn, columns, *pending)
+					if uncommitted >= INDEX_BUILD_COMMIT_ROWS:
+						conn.commit()
+						uncommitted = 0
+					pending = (doctype, rows, texts)
+				if pending:
+					self._write_index_chunk(conn, columns, *pending)
+
+			conn.execute(
+				"""
+				INSERT INTO facet_counts
+				SELECT project, facet, value, COUNT(*) FROM document_facets GROUP BY project, facet, value
+				"""
+			)
+			conn.commit()
+		finally:
+			conn.close()
+			for attr in ("_tags_cache", "_comment_project_cache"):
+				if hasattr(self, attr):
+					delattr(self, attr)
+
+	def _create_index_tables(self):
+		"""Have the parent build an index with nothing in it, which creates its tables as it expects them."""
+		self.INDEXABLE_DOCTYPES = {
+			doctype: {**config, "filters": {"name": ("is", "not set")}}
+			for doctype, config in type(self).INDEXABLE_DOCTYPES.items()
+		}
+		try:
 			super().build_index()
 		finally:
-			# Clear tags cache after indexing to free memory
-			if hasattr(self, "_tags_cache"):
-				delattr(self, "_tags_cache")
+			del self.INDEXABLE_DOCTYPES
+
+	def _iter_index_chunks(self):
+		"""Yield (doctype, rows) for every indexed doctype, in chunks read by name order."""
+		for doctype, config in self.INDEXABLE_DOCTYPES.items():
+			fields = ["name", *(field for field in _get_source_fields(config) if field != "name")]
+			filters = [
+				[field, *(condition if isinstance(condition, list | tuple) else ("=", condition))]
+				for field, condition in config.get("filters", {}).items()
+			]
+			last_name = None
+			while True:
+				# Paging on the primary key keeps every query an index range scan, however far in
+				rows = frappe.get_all(
+					doctype,
+					fields=fields,
+					filters=filters if last_name is None else [*filters, ["name", ">", last_name]],
+					order_by="name asc",
+					limit=INDEX_BUILD_CHUNK_SIZE,
+				)
+				if rows:
+					yield doctype, rows
+				if len(rows) < INDEX_BUILD_CHUNK_SIZE:
+					break
+				last_name = rows[-1].name
+
+	def _write_index_chunk(self, conn, columns, doctype, rows, texts):
+		"""Write a chunk of rows and their text to the index tables, returns the number of documents."""
+		names = [row.name for row in rows]
+		if doctype in ("GP Discussion", "GP Comment"):
+			self._tags_cache = self._load_tags(doctype, names)
+		if doctype == "GP Comment":
+			self._comment_project_cache = self._load_comment_projects(names)
+
+		content_field = _get_source_field(self.INDEXABLE_DOCTYPES[doctype], "content")
+		modified_field = TYPEAHEAD_DOCTYPES.get(doctype)
+		documents, prefixes, facets = [], [], []
+		for row, text in zip(rows, texts, strict=True):
+			row.doctype = doctype
+			if content_field:
+				row[content_field] = text
+			document = self.prepare_document(row)
+			if not document:
+				continue
+			documents.append([document.get(column) for column in columns])
+			if modified_field:
+				prefixes += self._get_title_prefix_rows(doctype, row, modified_field)
+			if document.get("project"):
+				facets += self._get_facet_rows(
+					doctype, row.name, document["project"], document.get("owner"), document.get("team")
+				)
+
+		conn.executemany(
+			f"INSERT INTO search_fts ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})",
+			documents,
+		)
+		conn.executemany("INSERT INTO title_prefixes VALUES (?, ?, ?, ?, ?, ?)", prefixes)
+		conn.executemany("INSERT INTO document_facets VALUES (?, ?, ?, ?, ?)", facets)
+		return len(documents)
+
+	def rebuild_in_progress(self):
+		return frappe.cache().get(frappe.cache().make_key(INDEX_REBUILD_KEY)) is not None
+
+	def _journal(self, operation, doctype, docname):
+		"""Record a document change made to the live index while a new generation is being built."""
+		if getattr(self, "_rebuild_generation", None) or not self.rebuild_in_progress():
+			return
+		frappe.cache().rpush(INDEX_JOURNAL_KEY, json.dumps([operation, doctype, cstr(docname)]))
+
+	def _replay_journal(self):
+		replayed = False
+		while entry := frappe.cache().lpop(INDEX_JOURNAL_KEY):
+			operation, doctype, docname = json.loads(entry)
+			if operation == "index" and frappe.db.exists(doctype, docname):
+				self._index_doc(doctype, docname)
+			else:
+				self._remove_doc(doctype, docname)
+			replayed = True
+		if replayed:
+			bump_index_version()
+
+	def _remove_index_files(self, path):
+		# Connections still open on a removed file keep reading it until they are closed
+		for suffix in ("", "-wal", "-shm"):
+			try:
+				os.remove(path + suffix)
+			except FileNotFoundError:
+				pass
+
+	def is_typeahead_query(self, query):
+		"""Whether `query` is a single 1-3 character word, answered from the title prefix table."""
+		words = (query or "").split()
+		return len(words) == 1 and len(words[0]) <= TYPEAHEAD_MAX_PREFIX_LENGTH
+
+	def typeahead(self, query, limit=TYPEAHEAD_LIMIT):
+		"""
+		Return the most recently active documents per doctype with a title word starting
+		with `query`, limited to the projects the user can access.
+		"""
+		accessible_projects = self._get_accessible_projects()
+		if not accessible_projects or not self.index_exists():
+			return []
+
+		prefix = query.strip().lower()
+		placeholders = ",".join(["?"] * len(accessible_projects))
+		conn = self._get_connection(read_only=True)
+		try:
+			results = []
+			for doctype in TYPEAHEAD_DOCTYPES:
+				rows = conn.execute(
+					f"""
+					SELECT doctype, name, title, project, modified
+					FROM title_prefixes
+					WHERE prefix = ? AND doctype = ? AND project IN ({placeholders})
+					ORDER BY modified DESC
+					LIMIT ?
+					""",
+					[prefix, doctype, *accessible_projects, limit],
+				).fetchall()
+				results.extend(
+					{
+						"id": f"{row['doctype']}:{row['name']}",
+						"doctype": row["doctype"],
+						"name": row["name"],
+						"title": row["title"],
+						"project": row["project"],
+						"modified": row["modified"],
+					}
+					for row in rows
+				)
+			return results
+		finally:
+			conn.close()
+
+	def _update_title_prefixes(self, doctype, docname, removed=False):
+		"""Keep the title prefix table in step with the main index for a single document."""
+		modified_field = TYPEAHEAD_DOCTYPES.get(doctype)
+		if not modified_field or not self.index_exists():
+			return
+
+		doc = None
+		if not removed:
+			doc = frappe.db.get_value(
+				doctype, docname, ["name", "title", "project", modified_field], as_dict=True
+			)
+
+		conn = self._get_connection()
+		try:
+			self._create_title_prefix_table(conn)
+			conn.execute(
+				"DELETE FROM title_prefixes WHERE doctype = ? AND name = ?", [doctype, cstr(docname)]
+			)
+			if doc:
+				conn.executemany(
+					"INSERT INTO title_prefixes VALUES (?, ?, ?, ?, ?, ?)",
+					self._get_title_prefix_rows(doctype, doc, modified_field),
+				)
+			conn.commit()
+		finally:
+			conn.close()
+
+	def _create_title_prefix_table(self, conn):
+		conn.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS title_prefixes (
+				prefix TEXT NOT NULL,
+				doctype TEXT NOT NULL,
+				name TEXT NOT NULL,
+				title TEXT,
+				project TEXT,
+				modified REAL
+			)
+			"""
+		)
+		conn.execute(
+			"CREATE INDEX IF NOT EXISTS title_prefixes_lookup "
+			"ON title_prefixes (prefix, doctype, modified DESC)"
+		)
+		conn.execute("CREATE INDEX IF NOT EXISTS title_prefixes_document ON title_prefixes (doctype, name)")
+
+	def _get_title_prefix_rows(self, doctype, doc, modified_field):
+		"""Rows of the title prefix table for a document, one per distinct word prefix."""
+		title = doc.title or ""
+		modified = doc.get(modified_field)
+		modified = get_datetime(modified).timestamp() if modified else None
+		prefixes = {
+			word[:length]
+			for word in re.findall(r"\w+", title.lower())
+			for length in range(1, min(len(word), TYPEAHEAD_MAX_PREFIX_LENGTH) + 1)
+		}
+		return [
+			(prefix, doctype, cstr(doc.name), title, cstr(doc.project) if doc.project else None, modified)
+			for prefix in prefixes
+		]
 
 	def get_search_filters(self):
 		"""
 		Return permission filters based on accessible projects.
 		"""
-		accessible_projects = self._get_accessible_projects()
+		accessible_projects = getattr(self, "_accessible_projects", None)
+		if accessible_projects is None:
+			accessible_projects = self._get_accessible_projects()
 
 		if not accessible_projects:
 			# No accessible projects - return impossible condition
@@ -135,44 +648,40 @@ class GameplanSearch(SQLiteSearch):
 
 		return {"project": list(set(project_filters))}  # Remove duplicates
 
-	def _get_accessible_projects(self):
-		"""Get list of projects accessible to current user."""
-		from pypika.terms import ExistsCriterion
+	def is_search_result(self, doc_id):
+		"""Whether `doc_id` is the id of an indexed document the user can find in search."""
+		doctype, _, name = cstr(doc_id).partition(":")
+		if doctype not in self.INDEXABLE_DOCTYPES or doctype in WORKFLOW_DOCTYPES or not name:
+			return False
+		if not self.is_search_enabled() or not self.index_exists():
+			return False
 
-		if gameplan.is_guest():
-			GuestAccess = frappe.qb.DocType("GP Guest Access")
-			projects = (
-				frappe.qb.from_(GuestAccess)
-				.select(GuestAccess.project)
-				.distinct()
-				.where(GuestAccess.user == frappe.session.user)
-				.run(pluck=True)
-			)
-			return [cstr(p) for p in projects] if projects else []
+		projects = self.get_search_filters()["project"]
+		if not projects:
+			return False
+		conn = self._get_connection(read_only=True)
+		try:
+			row = conn.execute(
+				"SELECT 1 FROM search_fts WHERE doctype = ? AND name = ? AND project IN ({}) LIMIT 1".format(
+					",".join(["?"] * len(projects))
+				),
+				[doctype, name, *projects],
+			).fetchone()
+		finally:
+			conn.close()
+		return row is not None
 
-		Project = frappe.qb.DocType("GP Project")
+	def _get_accessible_projects(self):
+		"""Get list of projects accessible to current user."""
+		from gameplan.gameplan.doctype.gp_project_access.gp_project_access import get_accessible_projects
 
 		# Administrator has access to all projects
 		if frappe.session.user == "Administrator":
+			Project = frappe.qb.DocType("GP Project")
 			projects = frappe.qb.from_(Project).select(Project.name).distinct().run(pluck=True)
 			return [cstr(p) for p in projects]
 
-		Member = frappe.qb.DocType("GP Member")
-		member_exists = (
-			frappe.qb.from_(Member)
-			.select(Member.name)
-			.where(Member.parenttype == "GP Team")
-			.where(Member.parent == Project.team)
-			.where(Member.user == frappe.session.user)
-		)
-		projects = (
-			frappe.qb.from_(Project)
-			.select(Project.name)
-			.distinct()
-			.where((Project.is_private == 0) | ((Project.is_private == 1) & ExistsCriterion(member_exists)))
-			.run(pluck=True)
-		)
-		return [cstr(p) for p in projects]
+		return sorted(get_accessible_projects())
 
 	def _get_project_team_for_comment(self, doc):
 		"""Resolve project for a comment document with caching."""
@@ -206,10 +715,144 @@ class GameplanSearch(SQLiteSearch):
 			return 1.2
 		return 1.0
 
+	@SQLiteSearch.scoring_function
+	def _get_click_boost(self, row, query, query_words):
+		"""
+		Boost documents that people clicked in earlier searches, see `gameplan.utils.search_boosts`.
+		"""
+		if self._click_boosts is None:
+			self._click_boosts = get_click_boosts()
+		return self._click_boosts.get(f"{row['doctype']}:{row['name']}", query_words)
+
 	def search(self, query, title_only=False, filters=None):
 		"""
 		Enhanced search method that handles tag filtering using LIKE operations.
+
+		Results are cached per process for the same normalized query, filters and set of
+		accessible projects until the index changes. Callers must not modify them.
+		"""
+		timer = SearchTimer("sqlite", query)
+		with timer.stage("permission_filter"):
+			self._accessible_projects = self._get_accessible_projects()
+		cache_key = self._get_result_cache_key(query, title_only, filters)
+		if cache_key:
+			result = result_cache.get(cache_key)
+			record_result_cache_lookup(hit=result is not None)
+			if result is not None:
+				timer.finish(title_only=title_only, cached=True)
+				return result
+
+		with timer.stage("score"):
+			result = self._search(query, title_only, copy.deepcopy(filters))
+		if cache_key:
+			result_cache.set(cache_key, result)
+		timer.finish(title_only=title_only, cached=False)
+		return result
+
+	def search_workflow_tasks(self, query, filters=None, start=0, page_length=20, title_only=False):
+		"""
+		Search artworks and sales and procurement tasks, one page of results at a time.
+
+		`filters` can narrow down on the workflow metadata: doctype, status, workflow_type,
+		customer, artwork and cycle_count, a list of values matching any of them. Returns
+		the page of results, best first, with the total number of matches.
+		"""
+		start, page_length = cint(start), cint(page_length)
+		condition = self._get_workflow_condition(query, filters, title_only)
+		if not condition:
+			return {"results": [], "total_count": 0, "has_more": False}
+		where, values = condition
+
+		conn = self._get_connection(read_only=True)
+		try:
+			total_count = conn.execute(f"SELECT COUNT(*) FROM search_fts WHERE {where}", values).fetchone()[0]
+			rows = conn.execute(
+				f"""
+				SELECT doctype, name, title, modified
+				FROM search_fts
+				WHERE {where}
+				ORDER BY rank
+				LIMIT ? OFFSET ?
+				""",
+				[*values, page_length, start],
+			).fetchall()
+		finally:
+			conn.close()
+
+		return {
+			"results": [
+				{
+					"id": f"{row['doctype']}:{row['name']}",
+					"doctype": row["doctype"],
+					"name": row["name"],
+					"title": row["title"],
+					"modified": row["modified"],
+				}
+				for row in rows
+			],
+			"total_count": total_count,
+			"has_more": start + len(rows) < total_count,
+		}
+
+	def get_workflow_task_names(self, query, filters=None, title_only=False):
+		"""
+		Names of every document of a workflow doctype matching `query`, for callers that
+		filter, sort and page the matches in the database themselves.
 		"""
+		doctype = (filters or {}).get("doctype")
+		if not isinstance(doctype, str):
+			frappe.throw("Workflow task names can only be fetched for one doctype")
+		condition = self._get_workflow_condition(query, filters, title_only)
+		if not condition:
+			return []
+		where, values = condition
+
+		conn = self._get_connection(read_only=True)
+		try:
+			rows = conn.execute(f"SELECT name FROM search_fts WHERE {where}", values).fetchall()
+		finally:
+			conn.close()
+		return [row["name"] for row in rows]
+
+	def _get_workflow_condition(self, query, filters, title_only):
+		"""WHERE clause and values for the workflow documents matching `query` and `filters`, or None."""
+		match = self._get_workflow_match_query(query, title_only)
+		if not match or not self.index_exists():
+			return None
+
+		conditions, values = ["search_fts MATCH ?"], [match]
+		for field, value in {"doctype": list(WORKFLOW_DOCTYPES), **(filters or {})}.items():
+			if field not in WORKFLOW_FILTER_FIELDS:
+				frappe.throw(f"Workflow search cannot filter by {field}")
+			value = value if isinstance(value, list | tuple) else [value]
+			if not value:
+				return None
+			conditions.append(f"{field} IN ({','.join(['?'] * len(value))})")
+			values.extend(value)
+		return " AND ".join(conditions), values
+
+	def _get_workflow_match_query(self, query, title_only=False):
+		"""FTS5 query matching every word of `query` as a prefix, in the title only if asked."""
+		words = re.findall(r"[\w-]+", cstr(query).lower())
+		if not words:
+			return None
+		match = " ".join(f'"{word}"*' for word in words)
+		return f"title : ({match})" if title_only else match
+
+	def _get_result_cache_key(self, query, title_only, filters):
+		if not isinstance(query, str):
+			return None
+		projects = hashlib.sha1(",".join(sorted(self._accessible_projects)).encode()).hexdigest()
+		return (
+			frappe.local.site,
+			get_index_version(),
+			" ".join(query.lower().split()),
+			bool(title_only),
+			json.dumps(filters, sort_keys=True, default=str),
+			projects,
+		)
+
+	def _search(self, query, title_only=False, filters=None):
 		# Convert tag filters to LIKE filters for the parent search
 		if filters and "tags" in filters:
 			tag_filters = filters.pop("tags")
@@ -224,6 +867,9 @@ class GameplanSearch(SQLiteSearch):
 		"""
 		Return filter options for the search interface.
 
+		Counts are summed from the per-project facet table, so the cost depends on the
+		number of distinct facet values of the caller's projects, not on the index size.
+
 		Returns:
 			dict: Available filter options with counts
 				- authors: dict mapping user names to counts
@@ -232,103 +878,208 @@ class GameplanSearch(SQLiteSearch):
 				- doctypes: dict mapping doctype names to counts
 				- tags: dict mapping tag names to counts
 		"""
+		empty = {"authors": {}, "projects": {}, "teams": {}, "doctypes": {}, "tags": {}}
 		if not self.is_search_enabled() or not self.index_exists():
-			return {"authors": {}, "projects": {}, "teams": {}, "doctypes": {}, "tags": {}}
+			return empty
 
-		accessible_projects = self._get_accessible_projects()
+		accessible_projects = getattr(self, "_accessible_projects", None)
+		if accessible_projects is None:
+			accessible_projects = self._get_accessible_projects()
 
 		# If no accessible projects, return empty results
 		if not accessible_projects:
-			return {"authors": {}, "projects": {}, "teams": {}, "doctypes": {}, "tags": {}}
+			return empty
+
+		if not self._facet_tables_exist():
+			# Index built before facets were materialized
+			self._build_facets()
 
 		conn = self._get_connection(read_only=True)
 		try:
-			# Get authors
-			authors_query = """
-                SELECT owner, COUNT(*) as count
-                FROM search_fts
-                WHERE project IN ({})
-                GROUP BY owner
-                ORDER BY count DESC
-                LIMIT 20
-            """.format(",".join(["?"] * len(accessible_projects)))
-			authors = conn.execute(authors_query, accessible_projects).fetchall()
-
-			# Get projects
-			projects_query = """
-                SELECT project, COUNT(*) as count
-                FROM search_fts
-                WHERE project IN ({})
-                GROUP BY project
-                ORDER BY count DESC
-            """.format(",".join(["?"] * len(accessible_projects)))
-
-			projects_with_count = conn.execute(projects_query, accessible_projects).fetchall()
-
-			# Get teams
-			teams_query = """
-                SELECT team, COUNT(*) as count
-                FROM search_fts
-                WHERE team IS NOT NULL AND project IN ({})
-                GROUP BY team
-                ORDER BY count DESC
-            """.format(",".join(["?"] * len(accessible_projects)))
-			teams = conn.execute(teams_query, accessible_projects).fetchall()
-
-			# Get doctypes
-			doctypes_query = """
-                SELECT doctype, COUNT(*) as count
-                FROM search_fts
-                WHERE project IN ({})
-                GROUP BY doctype
-                ORDER BY count DESC
-            """.format(",".join(["?"] * len(accessible_projects)))
-			doctypes = conn.execute(doctypes_query, accessible_projects).fetchall()
-
-			# Get tags - split the tags field and count individual tags
-			tags_query = """
-                SELECT tags
-                FROM search_fts
-                WHERE tags IS NOT NULL AND tags != '' AND project IN ({})
-            """.format(",".join(["?"] * len(accessible_projects)))
-			tags_result = conn.execute(tags_query, accessible_projects).fetchall()
-
+			rows = conn.execute(
+				"""
+				SELECT project, facet, value, count
+				FROM facet_counts
+				WHERE project IN ({})
+				""".format(",".join(["?"] * len(accessible_projects))),
+				accessible_projects,
+			).fetchall()
 		finally:
 			conn.close()
 
-		# Process tags - count individual tags from space-separated strings
-		tag_counts = {}
-		for row in tags_result:
-			if row["tags"]:
-				individual_tags = row["tags"].split()
-				for tag in individual_tags:
-					tag_counts[tag] = tag_counts.get(tag, 0) + 1
-
-		# Get project names for accessible projects with counts
-		projects = []
-		if accessible_projects:
-			project_counts = {p["project"]: p["count"] for p in projects_with_count}
-			project_details = frappe.get_all(
-				"GP Project", filters={"name": ("in", accessible_projects)}, fields=["name", "title"]
-			)
-			for p in project_details:
-				if p.name in project_counts:
-					projects.append({"value": p.name, "label": p.title, "count": project_counts[p.name]})
+		counts = {"owner": {}, "team": {}, "doctype": {}, "tag": {}}
+		project_counts = {}
+		for row in rows:
+			facet_counts = counts[row["facet"]]
+			facet_counts[row["value"]] = facet_counts.get(row["value"], 0) + row["count"]
+			if row["facet"] == "doctype":
+				# Every document has exactly one doctype row
+				project_counts[row["project"]] = project_counts.get(row["project"], 0) + row["count"]
 
-		# Create count dictionaries for authors, teams, projects, and doctypes (frontend has the full data)
-		author_counts = {a["owner"]: a["count"] for a in authors}
-		team_counts = {t["team"]: t["count"] for t in teams}
-		project_counts = {p["project"]: p["count"] for p in projects_with_count}
-		doctype_counts = {dt["doctype"]: dt["count"] for dt in doctypes}
+		def by_count(facet_counts, limit=None):
+			return dict(sorted(facet_counts.items(), key=lambda item: item[1], reverse=True)[:limit])
 
 		return {
-			"authors": author_counts,
-			"projects": project_counts,
-			"teams": team_counts,
-			"doctypes": doctype_counts,
-			"tags": tag_counts,
+			"authors": by_count(counts["owner"], limit=20),
+			"projects": by_count(project_counts),
+			"teams": by_count(counts["team"]),
+			"doctypes": by_count(counts["doctype"]),
+			"tags": counts["tag"],
 		}
 
+	def _build_facets(self):
+		"""Fill the facet tables from scratch."""
+		conn = self._get_connection()
+		try:
+			self._create_facet_tables(conn)
+			conn.execute("DELETE FROM document_facets")
+			conn.execute("DELETE FROM facet_counts")
+			documents = conn.execute(
+				"SELECT doctype, name, project, owner, team FROM search_fts WHERE project IS NOT NULL"
+			).fetchall()
+			for doc in documents:
+				rows = self._get_facet_rows(
+					doc["doctype"], doc["name"], doc["project"], doc["owner"], doc["team"]
+				)
+				conn.executemany("INSERT INTO document_facets VALUES (?, ?, ?, ?, ?)", rows)
+			conn.execute(
+				"""
+				INSERT INTO facet_counts
+				SELECT project, facet, value, COUNT(*) FROM document_facets GROUP BY project, facet, value
+				"""
+			)
+			conn.commit()
+		finally:
+			conn.close()
+
+	def _update_facets(self, doctype, docname, removed=False):
+		"""Move the facet counts of a single document from its previous values to its current ones."""
+		if doctype not in self.INDEXABLE_DOCTYPES or doctype in WORKFLOW_DOCTYPES or not self.index_exists():
+			return
+
+		rows = [] if removed else self._get_document_facet_rows(doctype, docname)
+		conn = self._get_connection()
+		try:
+			self._create_facet_tables(conn)
+			previous = [
+				tuple(row)
+				for row in conn.execute(
+					"SELECT project, facet, value FROM document_facets WHERE doctype = ? AND name = ?",
+					[doctype, cstr(docname)],
+				)
+			]
+			conn.executemany(
+				"UPDATE facet_counts SET count = count - 1 WHERE project = ? AND facet = ? AND value = ?",
+				previous,
+			)
+			conn.executemany(
+				"DELETE FROM facet_counts WHERE project = ? AND facet = ? AND value = ? AND count <= 0",
+				previous,
+			)
+			conn.execute(
+				"DELETE FROM document_facets WHERE doctype = ? AND name = ?", [doctype, cstr(docname)]
+			)
+			conn.executemany("INSERT INTO document_facets VALUES (?, ?, ?, ?, ?)", rows)
+			conn.executemany(
+				"""
+				INSERT INTO facet_counts VALUES (?, ?, ?, 1)
+				ON CONFLICT (project, facet, value) DO UPDATE SET count = count + 1
+				""",
+				[row[2:] for row in rows],
+			)
+			conn.commit()
+		finally:
+			conn.close()
+
+	def _get_document_facet_rows(self, doctype, docname):
+		"""Facet rows of a document as it is now, none if it is not indexed."""
+		is_comment = doctype == "GP Comment"
+		fields = ["name", "owner"]
+		fields += ["reference_doctype", "reference_name"] if is_comment else ["project", "team"]
+		filters = {**self.INDEXABLE_DOCTYPES[doctype].get("filters", {}), "name": docname}
+		docs = frappe.get_all(doctype, filters=filters, fields=fields)
+		if not docs:
+			return []
+
+		doc = docs[0]
+		if is_comment:
+			doc.project, doc.team = self._get_project_team_for_comment(doc)
+		if not doc.project:
+			return []
+		return self._get_facet_rows(doctype, doc.name, doc.project, doc.owner, doc.team)
+
+	def _get_facet_rows(self, doctype, docname, project, owner, team):
+		"""Rows of the document facet table for a document, one per facet value."""
+		tags = []
+		if doctype in ["GP Discussion", "GP Comment"]:
+			tags = self._get_tags_for_document(doctype, docname)
+		facets = [("owner", owner), ("team", team), ("doctype", doctype), *(("tag", tag) for tag in tags)]
+		return [
+			(doctype, cstr(docname), cstr(project), facet, cstr(value)) for facet, value in facets if value
+		]
+
+	def _create_facet_tables(self, conn):
+		conn.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS document_facets (
+				doctype TEXT NOT NULL,
+				name TEXT NOT NULL,
+				project TEXT NOT NULL,
+				facet TEXT NOT NULL,
+				value TEXT NOT NULL
+			)
+			"""
+		)
+		conn.execute("CREATE INDEX IF NOT EXISTS document_facets_document ON document_facets (doctype, name)")
+		conn.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS facet_counts (
+				project TEXT NOT NULL,
+				facet TEXT NOT NULL,
+				value TEXT NOT NULL,
+				count INTEGER NOT NULL,
+				PRIMARY KEY (project, facet, value)
+			) WITHOUT ROWID
+			"""
+		)
+
+	def _facet_tables_exist(self):
+		conn = self._get_connection(read_only=True)
+		try:
+			return bool(
+				conn.execute(
+					"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'facet_counts'"
+				).fetchone()
+			)
+		finally:
+			conn.close()
+
+
+def _get_source_fields(config):
+	"""Fields read from the database for an `INDEXABLE_DOCTYPES` entry."""
+	fields = []
+	for field in config["fields"]:
+		fields.extend(field.values() if isinstance(field, dict) else [field])
+	return fields
+
+
+def _get_source_field(config, index_field):
+	"""Database field an index field of an `INDEXABLE_DOCTYPES` entry is read from."""
+	for field in config["fields"]:
+		if isinstance(field, dict) and index_field in field:
+			return field[index_field]
+		if field == index_field:
+			return field
+	return None
+
+
+def _html_to_text(html):
+	"""Text of the HTML content of a document, run in the worker processes of a rebuild."""
+	if not html:
+		return html
+	text = BeautifulSoup(html, "html.parser").get_text(separator=" ")
+	return re.sub(r"\s+", " ", text).strip()
+
 
 class GameplanSearchIndexMissingError(SQLiteSearchIndexMissingError):
 	pass
@@ -338,3 +1089,54 @@ def build_index():
 	"""Build search index in the current process."""
 	search = GameplanSearch()
 	search.build_index()
+
+
+def get_index_generation():
+	return cint(frappe.cache().get(frappe.cache().make_key(INDEX_GENERATION_KEY)))
+
+
+def get_index_version():
+	return cint(frappe.cache().get(frappe.cache().make_key(INDEX_VERSION_KEY)))
+
+
+def bump_index_version():
+	frappe.cache().incr(frappe.cache().make_key(INDEX_VERSION_KEY))
+
+
+def record_result_cache_lookup(hit):
+	"""Count a result cache lookup, without a Redis round trip unless the counts are due to be flushed."""
+	lookups = _result_cache_lookups.setdefault(frappe.local.site, [0, 0, time.monotonic()])
+	lookups[0 if hit else 1] += 1
+	if time.monotonic() - lookups[2] >= RESULT_CACHE_STATS_FLUSH_INTERVAL:
+		flush_result_cache_lookups()
+
+
+def flush_result_cache_lookups():
+	"""Add the lookups counted by this process to the site's counters."""
+	lookups = _result_cache_lookups.get(frappe.local.site)
+	if not lookups:
+		return
+	hits, misses, _ = lookups
+	lookups[:] = [0, 0, time.monotonic()]
+	if not hits and not misses:
+		return
+	cache = frappe.cache()
+	pipeline = cache.pipeline(transaction=False)
+	pipeline.incrby(cache.make_key(RESULT_CACHE_HITS_KEY), hits)
+	pipeline.incrby(cache.make_key(RESULT_CACHE_MISSES_KEY), misses)
+	pipeline.execute()
+
+
+def get_result_cache_stats():
+	"""Counts of every process, up to a flush interval behind for the others."""
+	flush_result_cache_lookups()
+	cache = frappe.cache()
+	keys = [cache.make_key(RESULT_CACHE_HITS_KEY), cache.make_key(RESULT_CACHE_MISSES_KEY)]
+	hits, misses = (cint(value) for value in cache.mget(keys))
+	return {
+		"hits": hits,
+		"misses": misses,
+		"hit_rate": hits / (hits + misses) if hits + misses else 0,
+		"index_version": get_index_version(),
+		"entries_in_this_worker": len(result_cache.entries),
+	}
@@ -0,0 +1,52 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+import ast
+import os
+import runpy
+import unittest
+
+HOOKS_PATH = os.path.join(os.path.dirname(__file__), "hooks.py")
+
+
+def get_handlers(doc_events, doctype, event):
+	handlers = doc_events.get(doctype, {}).get(event, [])
+	return [handlers] if isinstance(handlers, str) else handlers
+
+
+class TestHooks(unittest.TestCase):
+	def setUp(self):
+		self.doc_events = runpy.run_path(HOOKS_PATH)["doc_events"]
+
+	def test_doc_events_have_no_duplicate_doctypes(self):
+		# A repeated key silently replaces the handlers registered before it
+		with open(HOOKS_PATH) as f:
+			tree = ast.parse(f.read())
+		for node in tree.body:
+			if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", None) == "doc_events":
+				doctypes = [key.value for key in node.value.keys]
+				self.assertEqual(len(doctypes), len(set(doctypes)))
+
+	def test_project_audience_is_cleared(self):
+		handler = "gameplan.utils.project_audience.clear_project_audience"
+		for doctype, events in {
+			"GP Project": ("on_update", "on_trash"),
+			"GP Guest Access": ("on_update", "on_trash"),
+		}.items():
+			for event in events:
+				self.assertIn(handler, get_handlers(self.doc_events, doctype, event))
+
+		self.assertIn(
+			"gameplan.gameplan.utils.notification_hooks.send_project_notifications",
+			get_handlers(self.doc_events, "GP Project", "on_update"),
+		)
+
+	def test_project_access_is_synced(self):
+		module = "gameplan.gameplan.doctype.gp_project_access.gp_project_access"
+		for doctype, event, handler in (
+			("GP Project", "on_update", "sync_project_access"),
+			("GP Project", "on_trash", "remove_project_access"),
+			("GP Guest Access", "on_update", "sync_project_access"),
+			("GP Guest Access", "after_delete", "sync_project_access"),
+		):
+			self.assertIn(f"{module}.{handler}", get_handlers(self.doc_events, doctype, event))
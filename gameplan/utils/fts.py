@@ -1,30 +1,101 @@
+import heapq
+import importlib.util
 import json
 import math
 import os
 import re
+import struct
 import time
-from collections import defaultdict
-from datetime import datetime
+import zlib
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
 
 import frappe
 from bs4 import BeautifulSoup
-from frappe.utils import update_progress_bar
+from frappe.utils import flt, update_progress_bar
+
+from gameplan.utils.fts_segment import (
+	CONTENT_FIELD,
+	MAX_EDIT_DISTANCE,
+	TITLE_FIELD,
+	Segment,
+	SegmentFormatError,
+	SegmentSet,
+	SegmentWriter,
+	generate_deletes,
+	position_field,
+)
+from gameplan.utils.search_boosts import MAX_CLICK_BOOST, get_click_boosts
+from gameplan.utils.search_metrics import SearchTimer
+
+# Number of segments (base + deltas) after which a compaction should be scheduled
+MAX_SEGMENTS = 16
+
+# BM25 parameters
+K1, B = 1.2, 0.75
+RECENCY_ALPHA = 0.005
+
+# Largest factors the proximity and title boosts can apply, used to bound final scores
+MAX_PROXIMITY_BOOST = 1.0 + 0.25 * math.log(1.0 + 10.0)
+MAX_TITLE_BOOST = 3.0
+
+# "exact phrase" and `a NEAR/5 b` (at most 5 other words between a and b)
+QUERY_OPERATORS = re.compile(r'"([^"]*)"|(\w+)\s+NEAR/(\d+)\s+(\w+)')
+
+# The manifest is stored as one zlib compressed JSON blob behind a header carrying a
+# version stamp. The stamp is also kept in its own tiny key, so that a process can tell
+# whether the index it already has open is current without fetching the manifest.
+MANIFEST_MAGIC = b"GPFM"
+MANIFEST_HEADER = struct.Struct("<4sQ")  # magic, manifest version
+
+# Segment sets opened by this process, keyed by index directory:
+# (manifest version, SegmentSet, seq, segment file names, monotonic time the version was last checked)
+_open_indexes = {}
+
+# Seconds an open index is used without checking the manifest version, overridden by
+# `gameplan_search_index_poll_interval` in site config
+DEFAULT_POLL_INTERVAL = 2
+
+# Recent spelling corrections, keyed by index directory, index sequence and query word
+MAX_CACHED_CORRECTIONS = 2048
+_corrections = OrderedDict()
+
+# Keys written by the JSON based index format, removed on the next full build
+LEGACY_REDIS_KEYS = (
+	"inverted_index",
+	"trigram_index",
+	"doc_lengths",
+	"avg_doc_length",
+	"document_count",
+	"doc_timestamps",
+	"title_words",
+	"doc_contents",
+	"word_positions",
+)
 
 
 class FullTextSearch:
-	def __init__(self, verbose=False, max_results=200):
+	def __init__(self, verbose=False, max_results=200, scoring="python"):
 		self.current_time = int(time.time())
 		self.redis = frappe.cache()
 		self._index_loaded = False
-		self.doc_timestamps = {}
-		self.doc_contents = {}
+		self.segments = None
+		self.index_seq = None
+		self.index_dir = frappe.get_site_path("indexes", "fts")
 		self.verbose = verbose
-		self.log_file = os.path.join(frappe.utils.get_site_path(), "logs", "search.log")
-		os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+		self.timer = None  # Stage timings of the current search
 		self.max_results = max_results
+		if scoring == "numpy" and importlib.util.find_spec("numpy") is None:
+			self._debug("NumPy is not installed, falling back to python scoring")
+			scoring = "python"
+		self.scoring = scoring
 		self.matched_words = defaultdict(set)
 		self.matched_word_variations = defaultdict(set)  # Track variations per document
-		self.matched_positions = defaultdict(dict)  # Track positions of matched words
+		self.matched_positions = defaultdict(dict)  # Track postings of matched words
+		self.matched_title_words = defaultdict(set)  # Track matched words that appear in the title
+		self.constraints = []  # Phrase and NEAR operators of the current query
+		self.click_boosts = None  # Boosts learned from clicks on search results
+		self.click_words = []  # Query words the click boosts are looked up with
 		self.stop_words = {
 			"a",
 			"an",
@@ -100,116 +171,233 @@ class FullTextSearch:
 		self.redis_prefix = "fts:"
 
 	def _debug(self, *args):
-		"""Log debug messages to file if verbose mode is enabled"""
+		"""Log debug messages to the search log if verbose mode is enabled"""
 		if self.verbose:
-			timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-			message = " ".join(str(arg) for arg in args)
-			with open(self.log_file, "a") as f:
-				f.write(f"[{timestamp}] {message}\n")
+			frappe.logger("search").debug(" ".join(str(arg) for arg in args))
+
+	def _add_stage_time(self, stage, start):
+		if self.timer:
+			self.timer.add(stage, time.perf_counter() - start)
 
 	def index_documents(self, documents):
-		"""Build the index from documents and save it to Redis."""
-		self._build_indexes(documents)
-		self._save_index_to_redis()
-		self._index_loaded = True
+		"""Build the index from documents and replace all existing segments with it."""
+		writer = self._build_segment(documents)
+		segment_name = self._write_segment_file(writer)
+
+		with self._lock():
+			manifest = self._read_manifest() or self._empty_manifest()
+			stale_segments = manifest["segments"]
+			seq = manifest["seq"] + 1
+			self._write_manifest({"seq": seq, "segments": [[seq, segment_name]], "tombstones": {}})
+
+		self._remove_segment_files(stale_segments)
+		self.redis.delete_value([self._get_redis_key(key) for key in LEGACY_REDIS_KEYS])
+		self._expire_open_index()
+
+	def update_documents(self, documents=(), removed=()):
+		"""
+		Add, replace or remove documents without rewriting the index.
+
+		New and changed documents are written to a small delta segment. Every
+		touched doc id gets a tombstone so that older copies of it are ignored,
+		which makes the cost of a write independent of the size of the index.
+		"""
+		writer = SegmentWriter()
+		for doc in documents:
+			content = self._process_content(doc["content"])
+			self._add_to_segment(writer, doc, content)
+		segment_name = self._write_segment_file(writer) if len(writer) else None
+
+		with self._lock():
+			manifest = self._read_manifest()
+			if manifest:
+				seq = manifest["seq"] = manifest["seq"] + 1
+				for doc_id in [*removed, *(doc["id"] for doc in documents)]:
+					manifest["tombstones"][doc_id] = seq
+				if segment_name:
+					manifest["segments"].append([seq, segment_name])
+				self._write_manifest(manifest)
+
+		if not manifest and segment_name:
+			self._remove_segment_files([[None, segment_name]])
+		self._expire_open_index()
+
+	def needs_compaction(self):
+		manifest = self._read_manifest()
+		return bool(manifest) and len(manifest["segments"]) > MAX_SEGMENTS
+
+	def compact(self):
+		"""Merge all segments into a new base segment, dropping dead documents and tombstones."""
+		manifest = self._read_manifest()
+		if not manifest or (len(manifest["segments"]) < 2 and not manifest["tombstones"]):
+			return
 
-	def index_exists(self):
-		required_keys = ["inverted_index", "doc_lengths", "document_count"]
+		writer = SegmentWriter()
+		for segment, _base, dead, _df_adjust in self._open_segment_set(manifest):
+			writer.add_segment(segment, dead)
+		segment_name = self._write_segment_file(writer)
+
+		merged = manifest["segments"]
+		with self._lock():
+			current = self._read_manifest()
+			# Give up if the index was rebuilt or compacted in the meantime
+			if not current or current["segments"][: len(merged)] != merged:
+				current = None
+			else:
+				current["segments"] = [[manifest["seq"], segment_name], *current["segments"][len(merged) :]]
+				current["tombstones"] = {
+					doc_id: seq for doc_id, seq in current["tombstones"].items() if seq > manifest["seq"]
+				}
+				self._write_manifest(current)
 
-		for key in required_keys:
-			if not self.redis.get_value(self._get_redis_key(key)):
-				return False
+		self._remove_segment_files(merged if current else [[None, segment_name]])
+		self._expire_open_index()
 
-		return True
+	def index_exists(self):
+		# Loading reuses the index this process has open, so checking before a search is cheap
+		self._load_index()
+		return self.segments is not None
 
 	def _get_redis_key(self, key):
 		return f"{self.redis_prefix}{key}"
 
-	def _process_document_content(self, doc_id, title, content, timestamp):
-		"""Process a document's content and prepare word frequencies for indexing."""
-		processed_content = self._process_content(content)
-
-		# Store document contents and timestamp
-		self.doc_timestamps[doc_id] = timestamp
-		self.doc_contents[doc_id] = {
-			"title": title,
-			"content": processed_content,
-		}
-
-		# Index title and content words
-		title_words = re.findall(r"\w+", title.lower())
-		content_words = re.findall(r"\w+", processed_content.lower())
-
-		# Store title words
-		self.title_words = getattr(self, "title_words", {})
-		self.title_words[doc_id] = title_words
-
-		# Process word frequencies and positions
-		word_freq = defaultdict(lambda: {"title": 0, "content": 0})
-		word_positions = defaultdict(lambda: {"title": [], "content": []})
-
-		# Update trigrams, word frequencies and positions
-		title_pos = 0
-		for word in title_words:
-			word_freq[word]["title"] += 1
-			word_positions[word]["title"].append(title_pos)
-			title_pos += 1
-			for trigram in self._generate_trigrams(word):
-				self.trigram_index[trigram].add(word)
-
-		content_pos = 0
-		for word in content_words:
-			word_freq[word]["content"] += 1
-			word_positions[word]["content"].append(content_pos)
-			content_pos += 1
-			for trigram in self._generate_trigrams(word):
-				self.trigram_index[trigram].add(word)
-
-		# Calculate document length
-		total_words = len(title_words) * 3 + len(content_words)
-		self.doc_lengths[doc_id] = total_words
-
-		return word_freq, word_positions, total_words
-
-	def _save_index_to_redis(self):
-		"""Serialize and save the index to Redis with consistent key naming"""
-		data = {
-			"inverted_index": json.dumps(self.inverted_index),
-			"trigram_index": json.dumps({k: list(v) for k, v in self.trigram_index.items()}),
-			"doc_lengths": self.doc_lengths,
-			"avg_doc_length": self.avg_doc_length,
-			"document_count": self.document_count,
-			"doc_timestamps": self.doc_timestamps,
-			"title_words": {k: list(v) for k, v in self.title_words.items()},
-			"doc_contents": self.doc_contents,
-			"word_positions": json.dumps(self.word_positions),
+	def _get_raw_redis_key(self, key):
+		return self.redis.make_key(self._get_redis_key(key))
+
+	def _lock(self):
+		"""Serialize manifest updates across processes."""
+		return self.redis.lock(self._get_raw_redis_key("lock"), timeout=60, blocking_timeout=30)
+
+	def _empty_manifest(self):
+		return {"seq": 0, "segments": [], "tombstones": {}}
+
+	def _read_manifest(self):
+		"""
+		Read the list of live segments and tombstones, along with the manifest version.
+
+		Read straight from Redis so that a request never works on a manifest cached
+		earlier in the same process.
+		"""
+		data = self.redis.get(self._get_raw_redis_key("manifest"))
+		if not data:
+			return None
+		if data[: len(MANIFEST_MAGIC)] != MANIFEST_MAGIC:
+			# Written before manifests were versioned, the next write converts it
+			return {**json.loads(data), "version": 0}
+
+		_magic, version = MANIFEST_HEADER.unpack_from(data)
+		manifest = json.loads(zlib.decompress(data[MANIFEST_HEADER.size :]))
+		manifest["version"] = version
+		return manifest
+
+	def _read_manifest_version(self):
+		"""Read only the version stamp of the manifest."""
+		version = self.redis.get(self._get_raw_redis_key("manifest_version"))
+		return int(version) if version else None
+
+	def _write_manifest(self, manifest):
+		"""Write the manifest under a new version stamp. Callers must hold the lock."""
+		version = self.redis.incr(self._get_raw_redis_key("manifest_version"))
+		body = {
+			"seq": manifest["seq"],
+			"segments": manifest["segments"],
+			"tombstones": manifest["tombstones"],
 		}
+		data = MANIFEST_HEADER.pack(MANIFEST_MAGIC, version) + zlib.compress(
+			json.dumps(body, separators=(",", ":")).encode()
+		)
+		self.redis.set(self._get_raw_redis_key("manifest"), data)
+
+	def _write_segment_file(self, writer):
+		segment_name = f"segment-{time.time_ns()}-{os.getpid()}.seg"
+		writer.write(os.path.join(self.index_dir, segment_name))
+		return segment_name
+
+	def _remove_segment_files(self, segments):
+		# Open mappings keep the old file's pages alive after it is unlinked
+		for _seq, segment_name in segments:
+			try:
+				os.remove(os.path.join(self.index_dir, segment_name))
+			except FileNotFoundError:
+				pass
+
+	def _open_segment_set(self, manifest, open_segments=None):
+		"""Open the segments of a manifest, reusing those in `open_segments` by file name."""
+		open_segments = open_segments or {}
+		segments = [
+			(
+				seq,
+				open_segments[segment_name]
+				if segment_name in open_segments
+				else Segment.open(os.path.join(self.index_dir, segment_name)),
+			)
+			for seq, segment_name in manifest["segments"]
+		]
+		return SegmentSet(segments, manifest["tombstones"])
+
+	def _tokenize(self, text):
+		return re.findall(r"\w+", text.lower())
+
+	def _parse_query(self, query):
+		"""
+		Split a query into its words and the positional constraints in it, as
+		(kind, words, distance) with kind "phrase" or "near".
+		"""
+		constraints = []
+		for match in QUERY_OPERATORS.finditer(query):
+			phrase, left, distance, right = match.groups()
+			if phrase is None:
+				constraints.append(("near", [left.lower(), right.lower()], int(distance)))
+			elif len(words := self._tokenize(phrase)) > 1:
+				constraints.append(("phrase", words, 0))
+
+		text = QUERY_OPERATORS.sub(lambda m: " ".join(filter(None, (m[1], m[2], m[4]))), query)
+		return self._tokenize(text), constraints
+
+	def _matches_constraints(self, doc_id, title_only=False):
+		"""Check the phrase and NEAR operators of the query against the positions in a document."""
+		for kind, words, distance in self.constraints:
+			position_lists = []
+			for word in words:
+				posting = self._find_posting(word, doc_id)
+				if posting < 0:
+					return False
+				positions = self.segments.positions(doc_id, posting)
+				if title_only:
+					positions = [p for p in positions if position_field(p) == TITLE_FIELD]
+				if not positions:
+					return False
+				position_lists.append(positions)
+
+			if kind == "phrase":
+				if not _contains_phrase(position_lists):
+					return False
+			else:
+				windows = _minimum_windows(position_lists)
+				if not windows or min(windows.values()) - (len(words) - 1) > distance:
+					return False
+		return True
 
-		for key, value in data.items():
-			self.redis.set_value(self._get_redis_key(key), value)
+	def _add_to_segment(self, writer, doc, content):
+		"""Tokenize an already processed document and add it to a segment writer."""
+		writer.add_document(
+			doc["id"],
+			doc["title"],
+			content,
+			doc["timestamp"],
+			self._tokenize(doc["title"]),
+			self._tokenize(content),
+			doc.get("project"),
+		)
 
-	def _build_indexes(self, documents):
-		"""Build inverted index for BM25 and trigram index for fuzzy matching."""
-		self.documents = documents
+	def _build_segment(self, documents):
+		"""Tokenize documents into a segment writer."""
+		writer = SegmentWriter()
 		total_docs = len(documents)
-		self.document_count = total_docs
-		self.inverted_index = defaultdict(list)
-		self.trigram_index = defaultdict(set)
-		self.doc_lengths = {}
-		self.word_positions = defaultdict(lambda: defaultdict(dict))
-		total_length = 0
-
-		for i, doc in enumerate(self.documents):
-			doc_id = doc["id"]
-			word_freq, positions, doc_length = self._process_document_content(
-				doc_id, doc["title"], doc["content"], doc["timestamp"]
-			)
-			total_length += doc_length
 
-			for word, freqs in word_freq.items():
-				total_freq = freqs["title"] * 3 + freqs["content"]
-				self.inverted_index[word].append((doc_id, total_freq))
-				self.word_positions[word][doc_id] = positions[word]
+		for i, doc in enumerate(documents):
+			content = self._process_content(doc["content"])
+			self._add_to_segment(writer, doc, content)
 
 			if not hasattr(frappe.local, "request"):
 				update_progress_bar("Indexing documents", i + 1, total_docs, absolute=True)
@@ -217,7 +405,7 @@ class FullTextSearch:
 		if not hasattr(frappe.local, "request"):
 			print()
 
-		self.avg_doc_length = total_length / len(self.documents)
+		return writer
 
 	def _process_content(self, content):
 		soup = BeautifulSoup(content, "html.parser")
@@ -226,252 +414,430 @@ class FullTextSearch:
 		text = re.sub(r"\s+", " ", text).strip()  # normalize whitespace
 		return text
 
-	def _load_index_from_redis(self):
-		"""Load and deserialize the index from Redis with consistent key naming"""
+	def _load_index(self):
+		"""
+		Memory-map the live index segments.
+
+		The index stays open in the process between requests. Its manifest version is
+		checked at most every `gameplan_search_index_poll_interval` seconds, and when
+		only deltas were written since, just the new segments are mapped and only the
+		new tombstones are resolved.
+		"""
 		if self._index_loaded:
 			return
 
-		data = {
-			key: self.redis.get_value(self._get_redis_key(key))
-			for key in [
-				"inverted_index",
-				"trigram_index",
-				"doc_lengths",
-				"avg_doc_length",
-				"document_count",
-				"doc_timestamps",
-				"title_words",
-				"doc_contents",
-				"word_positions",
-			]
-		}
-
-		if data["inverted_index"]:
-			self.inverted_index = defaultdict(list, json.loads(data["inverted_index"]))
-		if data["trigram_index"]:
-			trigram_dict = json.loads(data["trigram_index"])
-			self.trigram_index = defaultdict(set, {k: set(v) for k, v in trigram_dict.items()})
-		if data["doc_lengths"]:
-			self.doc_lengths = data["doc_lengths"]
-		if data["avg_doc_length"]:
-			self.avg_doc_length = data["avg_doc_length"]
-		if data["document_count"]:
-			self.document_count = data["document_count"]
-		if data["doc_timestamps"]:
-			self.doc_timestamps = data["doc_timestamps"]
-		if data["title_words"]:
-			self.title_words = {k: set(v) for k, v in data["title_words"].items()}
-		if data["doc_contents"]:
-			self.doc_contents = data["doc_contents"]
-		if data["word_positions"]:
-			self.word_positions = defaultdict(lambda: defaultdict(dict), json.loads(data["word_positions"]))
+		self.segments = None
+		cached = _open_indexes.get(self.index_dir)
+		now = time.monotonic()
+		poll_interval = flt(frappe.conf.get("gameplan_search_index_poll_interval", DEFAULT_POLL_INTERVAL))
+		if cached and now - cached[4] >= poll_interval and cached[0] == self._read_manifest_version():
+			cached = _open_indexes[self.index_dir] = (*cached[:4], now)
+		if cached and now - cached[4] < poll_interval:
+			_version, self.segments, self.index_seq, _names, _checked_at = cached
+
+		for _attempt in range(0 if self.segments else 2):
+			manifest = self._read_manifest()
+			if not manifest:
+				_open_indexes.pop(self.index_dir, None)
+				break
+			try:
+				self.segments = self._apply_manifest(manifest, cached)
+				self.index_seq = manifest["seq"]
+				names = [segment_name for _seq, segment_name in manifest["segments"]]
+				version = manifest["version"]
+				_open_indexes[self.index_dir] = (version, self.segments, self.index_seq, names, now)
+				break
+			except FileNotFoundError:
+				# A compaction replaced the segments between reading the manifest and opening them
+				self._debug("Index segments changed while loading, retrying")
+			except SegmentFormatError as e:
+				self._debug(f"Index needs to be rebuilt: {e}")
+				break
+
+		if self.segments:
+			self.document_count = self.segments.n_docs
+			self.avg_doc_length = (
+				self.segments.total_length / self.segments.n_docs if self.segments.n_docs else 0
+			)
 
 		self._index_loaded = True
 
-	def _generate_trigrams(self, word):
-		"""Generate trigrams for a given word."""
-		word = f"  {word}  "
-		return [word[i : i + 3] for i in range(len(word) - 2)]
-
-	def _find_fuzzy_matches(self, query_word, threshold=0.4):
-		"""Find words with similar trigrams to the query word."""
-		query_trigrams = set(self._generate_trigrams(query_word))
-		candidate_words = defaultdict(int)
+	def _apply_manifest(self, manifest, cached):
+		"""Bring the segment set opened earlier, if any, up to date with the manifest."""
+		if not cached:
+			return self._open_segment_set(manifest)
+
+		_version, segments, seq, names, _checked_at = cached
+		manifest_names = [segment_name for _seq, segment_name in manifest["segments"]]
+		if manifest["seq"] >= seq and manifest_names[: len(names)] == names:
+			# Only deltas were written since, which never rewrite older tombstones
+			new_segments = [
+				(segment_seq, Segment.open(os.path.join(self.index_dir, segment_name)))
+				for segment_seq, segment_name in manifest["segments"][len(names) :]
+			]
+			return segments.extend(new_segments, manifest["tombstones"], seq)
 
-		for trigram in query_trigrams:
-			if trigram in self.trigram_index:
-				for word in self.trigram_index[trigram]:
-					candidate_words[word] += 1
+		# Rebuilt or compacted, segments that are still live are reused as they are immutable
+		return self._open_segment_set(manifest, dict(zip(names, segments.segments, strict=True)))
 
-		results = []
-		for word, overlap in candidate_words.items():
-			jaccard_similarity = overlap / (
-				len(query_trigrams) + len(self._generate_trigrams(word)) - overlap
-			)
-			if jaccard_similarity >= threshold:
-				results.append((word, jaccard_similarity))
+	def _expire_open_index(self):
+		"""Check the manifest version on the next load, so that this process sees its own writes."""
+		self._index_loaded = False
+		cached = _open_indexes.get(self.index_dir)
+		if cached:
+			_open_indexes[self.index_dir] = (*cached[:4], float("-inf"))
+
+	def _find_fuzzy_matches(self, query_word):
+		"""
+		Find indexed words within a few edits of the query word, closest and most frequent first.
+
+		Words that are in the index are returned as they are. Otherwise the deletes of the
+		word's prefix are looked up in the SymSpell dictionary of every segment, so a
+		correction is a handful of lookups rather than a scan of the vocabulary.
+		"""
+		if self.segments.doc_frequency(query_word):
+			return [(query_word, 1.0)]
+
+		max_distance = min(MAX_EDIT_DISTANCE, _max_edit_distance(query_word))
+		if not max_distance:
+			return []
+
+		cache_key = (self.index_dir, self.index_seq, query_word)
+		if cache_key in _corrections:
+			_corrections.move_to_end(cache_key)
+			return _corrections[cache_key]
+
+		candidates = set()
+		deletes = generate_deletes(query_word, max_distance)
+		for segment, _base, _dead, _df_adjust in self.segments:
+			for delete in deletes:
+				candidates.update(segment.term(term_id) for term_id in segment.delete_term_ids_for(delete))
 
-		results = sorted(results, key=lambda x: x[1], reverse=True)
+		matches = []
+		for word in candidates:
+			distance = _edit_distance(query_word, word, max_distance)
+			# Skip words that only occur in removed documents
+			if distance <= max_distance and (frequency := self.segments.doc_frequency(word)):
+				matches.append((distance, -frequency, word))
+
+		results = [
+			(word, 1 - distance / max(len(word), len(query_word))) for distance, _, word in sorted(matches)
+		]
 		self._debug(f"Fuzzy matches for '{query_word}': {results[:3]}")
+
+		_corrections[cache_key] = results
+		if len(_corrections) > MAX_CACHED_CORRECTIONS:
+			_corrections.popitem(last=False)
 		return results
 
+	def _find_posting(self, word, doc_id):
+		"""Return the posting of `word` in `doc_id`, or -1 if the word does not occur in it."""
+		posting = self.matched_positions.get(doc_id, {}).get(word)
+		if posting is not None:
+			return posting
+		return self.segments.find_posting(word, doc_id)
+
 	def _calculate_proximity_score(self, doc_id, query_words):
-		"""Calculate proximity score based on the closeness of query terms in the document."""
+		"""Calculate proximity score from the smallest window of the document containing all query terms."""
 		if len(query_words) < 2:
 			return 1.0  # No proximity boost for single word queries
 
+		start = time.perf_counter()
 		# Filter to words that actually appear in the document
-		filtered_words = [
-			w for w in query_words if w in self.word_positions and doc_id in self.word_positions[w]
-		]
+		postings = {w: self._find_posting(w, doc_id) for w in query_words}
+		filtered_words = [w for w in query_words if postings[w] >= 0]
 		if len(filtered_words) < 2:
+			self._add_stage_time("proximity", start)
 			return 1.0  # Need at least 2 words to calculate proximity
 
-		# Get all positions for each word
-		all_positions = []
-		for word in filtered_words:
-			word_pos = []
-			if "title" in self.word_positions[word][doc_id]:
-				# Title positions get a bonus by multiplying by 0.5
-				word_pos.extend([p * 0.5 for p in self.word_positions[word][doc_id]["title"]])
-			if "content" in self.word_positions[word][doc_id]:
-				word_pos.extend(self.word_positions[word][doc_id]["content"])
-			all_positions.append(word_pos)
-
-		# Calculate minimum span covering all query terms
-		min_span = float("inf")
-
-		# Only calculate spans if we have positions for all words
-		if all(pos for pos in all_positions):
-			# For each position of the first word
-			for pos1 in all_positions[0]:
-				# Find closest positions of other words
-				max_distance = 0
-				for positions in all_positions[1:]:
-					# Find the closest position
-					closest = min(positions, key=lambda x: abs(x - pos1))
-					distance = abs(closest - pos1)
-					max_distance = max(max_distance, distance)
-
-				# Update minimum span
-				min_span = min(min_span, max_distance)
-
-		# Convert span to score (smaller spans get higher scores)
-		if min_span == float("inf"):
+		windows = _minimum_windows([self.segments.positions(doc_id, postings[w]) for w in filtered_words])
+		self._add_stage_time("proximity", start)
+		if not windows:
 			return 1.0
 
+		# Title matches get a bonus by halving their span
+		min_span = min(windows.get(TITLE_FIELD, math.inf) * 0.5, windows.get(CONTENT_FIELD, math.inf))
+
 		# Logarithmic scaling to prevent excessive influence
 		proximity_score = 1.0 + 0.25 * math.log(1.0 + 10.0 / max(1, min_span))
 		return proximity_score
 
-	def _bm25_score(self, query_words, title_only=False):
-		"""Calculate BM25 scores for documents given the query words."""
-		# Filter out stop words but keep track of original words
+	def _filter_stop_words(self, query_words):
+		"""Return (word, original) pairs for the query words that are not stop words."""
 		filtered_map = [(w, orig) for orig in query_words if (w := orig.lower()) not in self.stop_words]
 
 		if not filtered_map:
 			# If all words are stop words, use original query
 			filtered_map = [(w.lower(), w) for w in query_words]
 
+		return filtered_map
+
+	def _bm25_term_score(self, idf, tf, doc_len):
+		return idf * ((tf * (K1 + 1)) / (tf + K1 * (1 - B + B * (doc_len / self.avg_doc_length))))
+
+	def _top_documents(self, query_words, title_query_words, title_only=False, allowed=None):
+		"""
+		Return the best `max_results` documents as (score, doc key) pairs, best first, and
+		the number of documents matching the query. `allowed` restricts the documents per
+		segment, see `SegmentSet.allowed_documents`.
+		"""
+		filtered_map = self._filter_stop_words(query_words)
 		self._debug(f"\nCalculating BM25 scores for words: {[w for w, _ in filtered_map]}")
-		doc_scores = defaultdict(float)
 		self.matched_words.clear()  # Reset matched words for new search
 		self.matched_word_variations.clear()  # Reset variations
 		self.matched_positions.clear()  # Reset positions
-		num_docs = self.document_count
-		k1, b = 1.2, 0.75  # BM25 parameters
+		self.matched_title_words.clear()
 		self.score_components = defaultdict(lambda: {"bm25": 0})
+		num_docs = self.document_count
 
+		terms = []
 		for filtered, original in filtered_map:
-			if filtered not in self.inverted_index:
-				self._debug(f"Word '{filtered}' not found in index")
-				continue
-
-			# For title_only search, only consider documents where the word appears in title
-			docs_with_word = []
-			if title_only:
-				docs_with_word = [
-					(doc_id, freq)
-					for doc_id, freq in self.inverted_index[filtered]
-					if doc_id in self.title_words
-					and filtered in set(w.lower() for w in self.title_words[doc_id])
-				]
-			else:
-				docs_with_word = self.inverted_index[filtered]
-
-			num_docs_with_word = len(docs_with_word)
+			num_docs_with_word = self.segments.doc_frequency(filtered, title_only)
 			if num_docs_with_word == 0:
+				self._debug(f"Word '{filtered}' not found in index")
 				continue
 
 			idf = math.log((num_docs - num_docs_with_word + 0.5) / (num_docs_with_word + 0.5) + 1)
 			self._debug(f"\nWord: '{filtered}'")
 			self._debug(f"Found in {num_docs_with_word} documents")
 			self._debug(f"IDF score: {idf:.4f}")
+			terms.append((filtered, original, idf))
 
-			for doc_id, freq in docs_with_word:
-				doc_len = self.doc_lengths[doc_id]
-				tf = freq
-				score = idf * ((tf * (k1 + 1)) / (tf + k1 * (1 - b + b * (doc_len / self.avg_doc_length))))
-				doc_scores[doc_id] += score
-				self.matched_words[doc_id].add(filtered)
-				self.matched_word_variations[doc_id].update([filtered, original])
-
-				# Store positions for proximity scoring
-				if doc_id in self.word_positions.get(filtered, {}):
-					self.matched_positions[doc_id][filtered] = self.word_positions[filtered][doc_id]
-
-				self.score_components[doc_id]["bm25"] += score
-
-		return doc_scores
-
-	def _boost_proximity(self, doc_scores, query_words):
-		"""Apply boost based on proximity of query terms in documents."""
-		self._debug("\nApplying proximity boost:")
-		# Filter out stop words but keep track of original words
-		filtered_words = [w.lower() for w in query_words if w.lower() not in self.stop_words]
-
-		if not filtered_words:
-			filtered_words = [w.lower() for w in query_words]
-
-		if len(filtered_words) < 2:
-			self._debug("Skipping proximity boost for single-word query")
-			return doc_scores
+		# Use non-stop words for title matching
+		title_words = [w for w in title_query_words if w not in self.stop_words] or title_query_words
+		proximity_words = [w for w, _ in filtered_map]
+		self.click_boosts = get_click_boosts()
+		self.click_words = proximity_words
+
+		for _kind, words, _distance in self.constraints:
+			if not all(self.segments.doc_frequency(word, title_only) for word in words):
+				return [], 0
+
+		if self.scoring == "numpy":
+			from gameplan.utils.fts_numpy import top_documents
+
+			return top_documents(self, terms, title_words, proximity_words, title_only, allowed)
+		return self._wand_top_documents(terms, title_words, proximity_words, title_only, allowed)
+
+	def _wand_top_documents(self, terms, title_words, proximity_words, title_only=False, allowed=None):
+		"""
+		Pure python top-k scoring. Documents are evaluated one at a time with WAND: every
+		query term has an upper bound on what it can add to a document's score, derived
+		from its idf and the highest frequency and shortest document in its postings
+		(stored per term in each segment) times the largest title, proximity and click boosts.
+		Segments number documents newest first, so the timestamp of the first document
+		left in any posting list bounds the recency boost of everything after it.
+		Postings are skipped up to the first document whose terms' bounds can beat the
+		current k-th best score, a segment is left as soon as no remaining document can,
+		and proximity is skipped when even its best case would not get a document into
+		the top k.
+
+		With `allowed` (sorted ordinals per segment, see `SegmentSet.allowed_documents`)
+		cursors leapfrog between their postings and the allowed documents, so documents
+		a user cannot see are never scored.
+		"""
+		proximity_bound = MAX_PROXIMITY_BOOST if len(proximity_words) > 1 else 1.0
+		boost_bound = proximity_bound * MAX_TITLE_BOOST * (MAX_CLICK_BOOST if self.click_boosts else 1.0)
+
+		k = self.max_results
+		top = []  # min-heap of (score, doc key)
+
+		for segment_index, (segment, base, dead, _df_adjust) in enumerate(self.segments):
+			posting_docs = segment.posting_docs
+			doc_timestamps = segment.doc_timestamps
+			title_freqs = segment.posting_title_freqs
+			allowed_docs = allowed[segment_index] if allowed else None
+			if allowed_docs is not None and not allowed_docs:
+				continue
 
-		boosted_scores = {}
-		for doc_id, score in doc_scores.items():
-			proximity_score = self._calculate_proximity_score(doc_id, filtered_words)
-			boosted_scores[doc_id] = score * proximity_score
+			def advance(
+				cursor, target, posting_docs=posting_docs, title_freqs=title_freqs, allowed_docs=allowed_docs
+			):
+				"""Move a cursor to its first usable posting for a document >= target."""
+				pos, end = cursor[1], cursor[2]
+				while (pos := bisect_left(posting_docs, target, pos, end)) < end:
+					doc = posting_docs[pos]
+					if allowed_docs is not None:
+						next_allowed = bisect_left(allowed_docs, doc)
+						if next_allowed == len(allowed_docs):
+							pos = end
+							break
+						if allowed_docs[next_allowed] != doc:
+							target = allowed_docs[next_allowed]
+							continue
+					if title_only and not title_freqs[pos]:
+						target = doc + 1
+						continue
+					break
+				cursor[1] = pos
+				cursor[0] = posting_docs[pos] if pos < end else None
+
+			# cursor: [current doc, posting, end, score bound, term index]
+			cursors = []
+			for term_index, (filtered, _original, idf) in enumerate(terms):
+				term_id = segment.term_id(filtered)
+				if term_id < 0:
+					continue
+				start, end = segment.posting_range(term_id)
+				bound = self._bm25_term_score(
+					idf, segment.term_max_freqs[term_id], segment.term_min_lengths[term_id]
+				)
+				cursor = [None, start, end, bound * boost_bound * (1 + 1e-9), term_index]
+				advance(cursor, 0)
+				if cursor[0] is not None:
+					cursors.append(cursor)
+
+			while cursors:
+				cursors.sort(key=lambda c: c[0])
+				threshold = top[0][0] if len(top) >= k else 0
+				recency_bound = self._recency_boost_bound(doc_timestamps[cursors[0][0]])
+
+				# Find the first document whose terms could beat the threshold
+				pivot, upper_bound = None, 0
+				for i, cursor in enumerate(cursors):
+					upper_bound += cursor[3]
+					if upper_bound * recency_bound > threshold:
+						pivot = i
+						break
+				if pivot is None:
+					break
+
+				pivot_doc = cursors[pivot][0]
+				if cursors[0][0] != pivot_doc:
+					for cursor in cursors[:pivot]:
+						advance(cursor, pivot_doc)
+				else:
+					matching = [c for c in cursors if c[0] == pivot_doc]
+					if pivot_doc not in dead and (
+						not self.constraints or self._matches_constraints(base + pivot_doc, title_only)
+					):
+						matching.sort(key=lambda c: c[4])
+						score = self._score_document(
+							segment,
+							base,
+							pivot_doc,
+							[(terms[c[4]], c[1]) for c in matching],
+							title_words,
+							proximity_words,
+							top[0][0] if len(top) >= k else None,
+						)
+						if score is not None:
+							if len(top) < k:
+								heapq.heappush(top, (score, base + pivot_doc))
+							elif score > top[0][0]:
+								heapq.heapreplace(top, (score, base + pivot_doc))
+					for cursor in matching:
+						advance(cursor, pivot_doc + 1)
+
+				cursors = [c for c in cursors if c[0] is not None]
+
+		return sorted(top, reverse=True), self._count_matches(terms, title_only, allowed)
+
+	def _count_matches(self, terms, title_only=False, allowed=None):
+		"""
+		Number of documents matching any of `terms` and the phrase and NEAR operators,
+		including the ones WAND skipped without scoring them.
+		"""
+		required_words = {word for _kind, words, _distance in self.constraints for word in words}
+		total = 0
+		for segment_index, (segment, base, dead, _df_adjust) in enumerate(self.segments):
+			allowed_docs = allowed[segment_index] if allowed else None
+			if allowed_docs is not None and not allowed_docs:
+				continue
+			docs = set()
+			for filtered, _original, _idf in terms:
+				docs.update(_documents_with(segment, filtered, title_only))
+			for word in required_words:
+				docs.intersection_update(_documents_with(segment, word, title_only))
+			docs.difference_update(dead)
+			if allowed_docs is not None:
+				docs.intersection_update(allowed_docs)
+			if self.constraints:
+				docs = [doc for doc in docs if self._matches_constraints(base + doc, title_only)]
+			total += len(docs)
+		return total
+
+	def _score_document(self, segment, base, ordinal, matches, title_words, proximity_words, threshold):
+		"""
+		Score one document from its matching postings, given as ((word, original, idf), posting)
+		in query order. Returns None if the document cannot beat `threshold`.
+		"""
+		doc_id = base + ordinal
+		doc_len = segment.doc_lengths[ordinal]
+		score = 0.0
+		for (filtered, original, idf), posting in matches:
+			term_score = self._bm25_term_score(idf, segment.posting_freqs[posting], doc_len)
+			score += term_score
+			self.matched_words[doc_id].add(filtered)
+			self.matched_word_variations[doc_id].update([filtered, original])
+
+			# Store postings for proximity scoring
+			self.matched_positions[doc_id][filtered] = posting
+			if segment.posting_title_freqs[posting]:
+				self.matched_title_words[doc_id].add(filtered)
+
+			self.score_components[doc_id]["bm25"] += term_score
+
+		start = time.perf_counter()
+		title_boost = self._title_boost(doc_id, title_words)
+		recency_boost = self._recency_boost(doc_id)
+		click_boost = self._click_boost(segment, doc_id, ordinal)
+		self._add_stage_time("boosts", start)
+
+		proximity_score = 1.0
+		if len(proximity_words) > 1:
+			best_case = score * title_boost * recency_boost * click_boost * MAX_PROXIMITY_BOOST
+			if threshold is not None and best_case <= threshold:
+				return None
+			proximity_score = self._calculate_proximity_score(doc_id, proximity_words)
 			self.score_components[doc_id]["proximity"] = proximity_score
+
+		final_score = score * proximity_score * title_boost * recency_boost * click_boost
+		if self.verbose:
 			self._debug(
-				f"Doc {doc_id}: Proximity boost {proximity_score:.3f}x ({score:.4f} ->"
-				" {boosted_scores[doc_id]:.4f})"
+				f"Doc {doc_id}: bm25={score:.4f} proximity={proximity_score:.3f}x "
+				f"title={title_boost:.2f}x recency={recency_boost:.3f}x click={click_boost:.3f}x "
+				f"-> {final_score:.4f}"
 			)
-		return boosted_scores
-
-	def _boost_recency(self, doc_scores, alpha=0.001):
-		"""Boost scores based on recency (documents with newer timestamps get a slight boost)."""
-		self._debug("\nApplying recency boost:")
-		alpha = 0.005
-		boosted_scores = {}
-		for doc_id, score in doc_scores.items():
-			age = self.current_time - self.doc_timestamps.get(doc_id, 0)
-			recency_boost = 1 / (1 + alpha * age)  # The more recent, the higher the boost
-			boosted_scores[doc_id] = score * recency_boost
-			self.score_components[doc_id]["recency_boost"] = recency_boost
-			self._debug(f"Doc {doc_id}: age={age / 86400:.1f} days")
-			self._debug(f"  Score: {score:.4f} -> {boosted_scores[doc_id]:.4f} (boost={recency_boost:.3f}x)")
-		return boosted_scores
-
-	def _boost_title_matches(self, query_words, doc_scores):
-		"""Apply additional boost for documents with exact or partial title matches"""
-		self._debug("\nApplying title boost:")
-		# Use non-stop words for title matching
-		filtered_words = [w for w in query_words if w not in self.stop_words]
-		if not filtered_words:
-			filtered_words = query_words
-
-		for doc_id in doc_scores:
-			if doc_id in self.title_words:
-				title_words = self.title_words[doc_id]
-
-				# Calculate what portion of query matches the title
-				matching_words = sum(1 for qw in filtered_words if qw in title_words)
-				if matching_words > 0:
-					match_ratio = matching_words / len(filtered_words)
-					# Apply exponential boost for better title matches
-					title_boost = 1 + (match_ratio**2) * 2
-					old_score = doc_scores[doc_id]
-					doc_scores[doc_id] *= title_boost
-					self.score_components[doc_id]["title_boost"] = title_boost
-					self._debug(
-						f"""Doc {doc_id} ({title_words}): """
-						"""{matching_words}/{len(filtered_words)} words match title"""
-					)
-					self._debug(
-						f"  Score: {old_score:.4f} -> {doc_scores[doc_id]:.4f} (boost={title_boost:.2f}x)"
-					)
-
-		return doc_scores
+		return final_score
+
+	def _recency_boost(self, doc_id):
+		"""Boost based on recency (documents with newer timestamps get a slight boost)."""
+		age = self.current_time - self.segments.timestamp(doc_id)
+		recency_boost = 1 / (1 + RECENCY_ALPHA * age)  # The more recent, the higher the boost
+		self.score_components[doc_id]["recency_boost"] = recency_boost
+		return recency_boost
+
+	def _click_boost(self, segment, doc_id, ordinal):
+		"""Boost learned from clicks on this document, for these query words and in general."""
+		if not self.click_boosts:
+			return 1.0
+		click_boost = self.click_boosts.get_for_segment(segment, ordinal, self.click_words)
+		if click_boost != 1.0:
+			self.score_components[doc_id]["click_boost"] = click_boost
+		return click_boost
+
+	def _recency_boost_bound(self, timestamp):
+		"""Largest recency boost a document not newer than `timestamp` can get."""
+		denominator = 1 + RECENCY_ALPHA * (self.current_time - timestamp)
+		return 1 / denominator if denominator > 0 else math.inf
+
+	def _title_boost(self, doc_id, title_words):
+		"""Additional boost for documents with exact or partial title matches"""
+		matched_title_words = self.matched_title_words.get(doc_id)
+		if not matched_title_words or not title_words:
+			return 1.0
+
+		# Calculate what portion of query matches the title
+		matching_words = sum(1 for qw in title_words if qw in matched_title_words)
+		if not matching_words:
+			return 1.0
+
+		match_ratio = matching_words / len(title_words)
+		# Apply exponential boost for better title matches
+		title_boost = 1 + (match_ratio**2) * 2
+		self.score_components[doc_id]["title_boost"] = title_boost
+		return title_boost
 
 	def _highlight_text(self, text, doc_id):
 		"""Wrap matching words in <mark> tags, but only those that contributed to scoring"""
@@ -540,75 +906,84 @@ class FullTextSearch:
 
 		return "..." + "...".join(preview) + "..."
 
-	def search(self, query, title_only=False):
-		"""Main search function with improved title matching and content highlighting."""
+	def search(self, query, title_only=False, projects=None):
+		"""
+		Main search function with improved title matching and content highlighting.
+
+		With `projects`, only documents of those projects are considered, before scoring,
+		so the results are the best ones among the documents a user can see.
+		"""
 		start_time = time.time()
+		timer = self.timer = SearchTimer("fts", query)
 		self._debug(f"\n=== Search Query: '{query}' (title_only: {title_only}) ===")
-		self._load_index_from_redis()
-
-		query_words = re.findall(r"\w+", query.lower())
-		self._debug(f"Query words: {query_words}")
+		with timer.stage("load_index"):
+			self._load_index()
+
+		with timer.stage("tokenize"):
+			query_words, self.constraints = self._parse_query(query)
+		self._debug(f"Query words: {query_words}, constraints: {self.constraints}")
+		if not self.segments or not query_words:
+			timer.finish(title_only=title_only, total_matches=0)
+			return {
+				"results": [],
+				"summary": {
+					"duration": round(time.time() - start_time, 3),
+					"total_matches": 0,
+					"returned_matches": 0,
+					"corrected_words": None,
+					"title_only": title_only,
+				},
+			}
 
 		corrected_query_words = []
 		self._debug("\nFuzzy matching:")
-		for word in query_words:
-			matches = self._find_fuzzy_matches(word)
-			corrected = matches[0][0] if matches else word
-			corrected_query_words.append(corrected)
-			if corrected != word:
-				self._debug(f"Corrected '{word}' to '{corrected}'")
-
-		# Calculate base BM25 scores
-		doc_scores = self._bm25_score(corrected_query_words, title_only)
-		self._debug("\nInitial BM25 scores:")
-		for doc_id, score in sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)[:3]:
-			title = self.doc_contents[doc_id]["title"]
-			content = self.doc_contents[doc_id]["content"]
-			self._debug(f"Doc {doc_id}: {score:.4f}")
-			self._debug(f"  Title: {title[:50]}")
-			self._debug(f"  Content: {content[:100]}")
-
-		# Apply proximity boost as a separate step
-		doc_scores = self._boost_proximity(doc_scores, corrected_query_words)
-		self._debug("\nScores after proximity boost:")
-		for doc_id, score in sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)[:3]:
-			title = self.doc_contents[doc_id]["title"]
-			content = self.doc_contents[doc_id]["content"]
-			self._debug(f"Doc {doc_id}: {score:.4f}")
-			self._debug(f"  Title: {title[:50]}")
-			self._debug(f"  Content: {content[:100]}")
-
-		doc_scores = self._boost_title_matches(query_words, doc_scores)
-		final_scores = self._boost_recency(doc_scores)
-		total_matches = len(final_scores)
+		exact_words = {word for _kind, words, _distance in self.constraints for word in words}
+		with timer.stage("fuzzy"):
+			for word in query_words:
+				matches = self._find_fuzzy_matches(word) if word not in exact_words else None
+				corrected = matches[0][0] if matches else word
+				corrected_query_words.append(corrected)
+				if corrected != word:
+					self._debug(f"Corrected '{word}' to '{corrected}'")
+
+		with timer.stage("permission_filter"):
+			allowed = self.segments.allowed_documents(projects) if projects is not None else None
+		# Includes the proximity and boosts stages
+		with timer.stage("score"):
+			top_documents, total_matches = self._top_documents(
+				corrected_query_words, query_words, title_only, allowed
+			)
 
 		self._debug("\nSearch results summary:")
+		hydration_start = time.perf_counter()
 		results = []
-		for doc_id, score in sorted(final_scores.items(), key=lambda x: x[1], reverse=True)[
-			: self.max_results
-		]:
-			if doc_id in self.doc_contents:
-				doc_content = self.doc_contents[doc_id]
+		for score, doc_id in top_documents:
+			title = self.segments.title(doc_id)
+			content = self.segments.content(doc_id)
+			if self.verbose:
 				components = self.score_components[doc_id]
 				self._debug(
-					f"Doc {doc_id}: {doc_content['title'][:50]}\n"
+					f"Doc {doc_id}: {title[:50]}\n"
 					f"  Final score: {score:.4f}\n"
 					f"  BM25 score: {components['bm25']:.4f}\n"
 					f"  Proximity boost: {components.get('proximity', 1.0):.2f}x\n"
 					f"  Title boost: {components.get('title_boost', 1.0):.2f}x\n"
 					f"  Recency boost: {components.get('recency_boost', 1.0):.3f}x\n"
+					f"  Click boost: {components.get('click_boost', 1.0):.3f}x\n"
 					f"  Matched words: {sorted(self.matched_words[doc_id])}\n"
 					f"  Word variations: {sorted(self.matched_word_variations[doc_id])}\n"
 				)
-				result = {
-					"id": doc_id,
-					"title": self._highlight_text(doc_content["title"], doc_id),
-					"score": score,
-					"timestamp": self.doc_timestamps[doc_id],
-				}
-				if not title_only:
-					result["content"] = self._create_preview(doc_content["content"], doc_id)
-				results.append(result)
+			result = {
+				"id": self.segments.doc_id(doc_id),
+				"title": self._highlight_text(title, doc_id),
+				"score": score,
+				"timestamp": self.segments.timestamp(doc_id),
+				"project": self.segments.project(doc_id),
+			}
+			if not title_only:
+				result["content"] = self._create_preview(content, doc_id)
+			results.append(result)
+		timer.add("hydration", time.perf_counter() - hydration_start)
 
 		duration = time.time() - start_time
 		corrected_words = (
@@ -624,70 +999,89 @@ class FullTextSearch:
 			"title_only": title_only,
 		}
 
-		self._debug(f"\nReturning top {len(results)} results out of {len(final_scores)} matches")
+		self._debug(f"\nReturning top {len(results)} results out of {total_matches} matching documents")
+		timer.finish(
+			title_only=title_only,
+			scoring=self.scoring,
+			total_matches=total_matches,
+			returned_matches=len(results),
+		)
 		return {"results": results, "summary": summary}
 
 	def index_document(self, document):
-		"""Add a single document to the index."""
-		self._load_index_from_redis()
-		doc_id = document["id"]
-
-		# Use helper method to process document content
-		word_freq, word_positions, total_words = self._process_document_content(
-			doc_id, document["title"], document["content"], document["timestamp"]
-		)
-
-		# Update inverted index
-		for word, freqs in word_freq.items():
-			total_freq = freqs["title"] * 3 + freqs["content"]
-			if word in self.inverted_index:
-				self.inverted_index[word] = [(d, f) for d, f in self.inverted_index[word] if d != doc_id]
-			self.inverted_index[word].append((doc_id, total_freq))
-			# Update word positions
-			self.word_positions[word][doc_id] = word_positions[word]
-
-		# Update document count and average length
-		self.document_count = len(self.doc_lengths)
-		self.avg_doc_length = sum(self.doc_lengths.values()) / self.document_count
-
-		self._save_index_to_redis()
+		"""Add or replace a single document in the index."""
+		self.update_documents(documents=[document])
 
 	def remove_document(self, doc_id):
 		"""Remove a document from the index."""
-		self._load_index_from_redis()
-
-		if doc_id not in self.doc_lengths:
-			return
-
-		# Remove from doc_timestamps and doc_contents
-		self.doc_timestamps.pop(doc_id, None)
-		self.doc_contents.pop(doc_id, None)
-
-		# Remove from title_words
-		self.title_words.pop(doc_id, None)
-
-		# Remove document from inverted index
-		for word in list(self.inverted_index.keys()):
-			self.inverted_index[word] = [(d, f) for d, f in self.inverted_index[word] if d != doc_id]
-			if not self.inverted_index[word]:
-				del self.inverted_index[word]
-
-		# Remove from word_positions
-		for word in list(self.word_positions.keys()):
-			if doc_id in self.word_positions[word]:
-				del self.word_positions[word][doc_id]
-			if not self.word_positions[word]:
-				del self.word_positions[word]
-
-		# Remove from doc_lengths
-		self.doc_lengths.pop(doc_id, None)
-
-		# Update document count and average length
-		self.document_count = len(self.doc_lengths)
-		if self.document_count > 0:
-			total_length = sum(self.doc_lengths.values())
-			self.avg_doc_length = total_length / self.document_count
-		else:
-			self.avg_doc_length = 0
-
-		self._save_index_to_redis()
+		self.update_documents(removed=[doc_id])
+
+
+def _max_edit_distance(word):
+	"""Short words get fewer edits, otherwise almost anything is a correction for them."""
+	if len(word) <= 3:
+		return 0
+	return 1 if len(word) <= 5 else 2
+
+
+def _edit_distance(a, b, max_distance):
+	"""Optimal string alignment distance between `a` and `b`, or `max_distance + 1` if it is larger."""
+	if abs(len(a) - len(b)) > max_distance:
+		return max_distance + 1
+
+	before_previous = None
+	previous = list(range(len(b) + 1))
+	for i in range(1, len(a) + 1):
+		current = [i] + [0] * len(b)
+		for j in range(1, len(b) + 1):
+			current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+			if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+				current[j] = min(current[j], before_previous[j - 2] + 1)
+		if min(current) > max_distance:
+			return max_distance + 1
+		before_previous, previous = previous, current
+	return previous[-1]
+
+
+def _minimum_windows(position_lists):
+	"""
+	Return the smallest span covering one position of every list, per field.
+
+	A k-way merge over the sorted lists: the window reaches from the smallest current
+	position to the largest one seen so far and only the smallest is ever advanced, so
+	this is linear in the total number of positions.
+	"""
+	heap = [(positions[0], i, 0) for i, positions in enumerate(position_lists)]
+	heapq.heapify(heap)
+	high = max(position for position, _i, _j in heap)
+	windows = {}
+	while True:
+		low, i, j = heap[0]
+		field = position_field(low)
+		if position_field(high) == field and high - low < windows.get(field, math.inf):
+			windows[field] = high - low
+		if j + 1 == len(position_lists[i]):
+			return windows
+		position = position_lists[i][j + 1]
+		heapq.heapreplace(heap, (position, i, j + 1))
+		high = max(high, position)
+
+
+def _contains_phrase(position_lists):
+	"""Whether the words of the position lists occur one right after the other."""
+	first, *rest = position_lists
+	rest = [set(positions) for positions in rest]
+	return any(all(p + i in positions for i, positions in enumerate(rest, 1)) for p in first)
+
+
+def _documents_with(segment, word, title_only=False):
+	"""Ordinals of the documents of a segment containing `word`."""
+	term_id = segment.term_id(word)
+	if term_id < 0:
+		return ()
+	start, end = segment.posting_range(term_id)
+	docs = segment.posting_docs[start:end]
+	if title_only:
+		title_freqs = segment.posting_title_freqs[start:end]
+		return [doc for doc, in_title in zip(docs, title_freqs, strict=True) if in_title]
+	return docs
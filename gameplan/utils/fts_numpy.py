@@ -0,0 +1,251 @@
+"""
+Vectorized scoring backend for FullTextSearch.
+
+Enabled per site with `"gameplan_search_scoring": "numpy"` in site_config.json when
+NumPy is installed. Posting lists and document metadata are read straight from the
+memory-mapped segments as NumPy arrays, BM25 and the title, recency and click boosts
+are computed for every matching document at once and `argpartition` picks the top k.
+
+Every value is computed with the same float64 operations in the same order as the
+python backend, so scores are bit-identical. Proximity is only computed, in python,
+for documents that can still make the top k with the largest proximity boost.
+"""
+
+import statistics
+import time
+import weakref
+
+import numpy as np
+
+from gameplan.utils.fts import K1, MAX_PROXIMITY_BOOST, RECENCY_ALPHA, B, FullTextSearch
+
+# Per document click boosts of each open segment: (ClickBoosts they were taken from, array)
+_segment_click_boosts = weakref.WeakKeyDictionary()
+
+
+def top_documents(fts, terms, title_words, proximity_words, title_only=False, allowed=None):
+	"""Same contract as `FullTextSearch._wand_top_documents`."""
+	use_proximity = len(proximity_words) > 1
+	# Words of phrase and NEAR operators, which every result must contain
+	required_words = {word for _kind, words, _distance in fts.constraints for word in words}
+	keys, bm25_scores, title_boosts, recency_boosts, click_boosts = [], [], [], [], []
+
+	for segment_index, (segment, base, dead, _df_adjust) in enumerate(fts.segments):
+		allowed_docs = allowed[segment_index] if allowed else None
+		if allowed_docs is not None and not allowed_docs:
+			continue
+		doc_lengths = np.asarray(segment.doc_lengths)
+		norms = K1 * (1 - B + B * (doc_lengths / fts.avg_doc_length))
+		scores = np.zeros(segment.n_docs)
+		matched = np.zeros(segment.n_docs, dtype=bool)
+		title_matches = {}
+
+		for filtered, _original, idf in terms:
+			term_id = segment.term_id(filtered)
+			if term_id < 0:
+				continue
+			start, end = segment.posting_range(term_id)
+			docs = np.asarray(segment.posting_docs[start:end])
+			tf = np.asarray(segment.posting_freqs[start:end]).astype(np.float64)
+			in_title = np.asarray(segment.posting_title_freqs[start:end]) > 0
+			if title_only:
+				docs, tf, in_title = docs[in_title], tf[in_title], in_title[in_title]
+
+			scores[docs] += idf * ((tf * (K1 + 1)) / (tf + norms[docs]))
+			matched[docs] = True
+			if filtered not in title_matches:
+				title_matches[filtered] = np.zeros(segment.n_docs, dtype=bool)
+			title_matches[filtered][docs[in_title]] = True
+
+		if dead:
+			matched[list(dead)] = False
+		if allowed_docs is not None:
+			visible = np.zeros(segment.n_docs, dtype=bool)
+			visible[allowed_docs] = True
+			matched &= visible
+		for word in required_words:
+			matched &= _documents_with(segment, word, title_only)
+		ordinals = np.flatnonzero(matched)
+		if fts.constraints:
+			ordinals = ordinals[[fts._matches_constraints(base + o, title_only) for o in ordinals.tolist()]]
+		if not len(ordinals):
+			continue
+
+		matching_words = np.zeros(len(ordinals), dtype=np.int64)
+		for word in title_words:
+			if word in title_matches:
+				matching_words += title_matches[word][ordinals]
+		match_ratio = matching_words / len(title_words)
+		title_boost = np.where(matching_words > 0, 1 + (match_ratio**2) * 2, 1.0)
+
+		ages = fts.current_time - np.asarray(segment.doc_timestamps)[ordinals]
+		keys.append(ordinals + base)
+		bm25_scores.append(scores[ordinals])
+		title_boosts.append(title_boost)
+		recency_boosts.append(1 / (1 + RECENCY_ALPHA * ages))
+		click_boosts.append(_click_boosts(fts, segment, ordinals))
+
+	if not keys:
+		return [], 0
+
+	keys = np.concatenate(keys)
+	bm25_scores = np.concatenate(bm25_scores)
+	title_boosts = np.concatenate(title_boosts)
+	recency_boosts = np.concatenate(recency_boosts)
+	click_boosts = np.concatenate(click_boosts)
+	total_matches = len(keys)
+	k = fts.max_results
+
+	# Without proximity this is the final score, with it a lower bound of it
+	scores = bm25_scores * title_boosts * recency_boosts * click_boosts
+	if use_proximity:
+		candidates = np.arange(total_matches)
+		if total_matches > k:
+			threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+			candidates = np.flatnonzero(scores * (MAX_PROXIMITY_BOOST * (1 + 1e-9)) >= threshold)
+
+		proximity_scores = {}
+		for i in candidates.tolist():
+			key = int(keys[i])
+			proximity_scores[i] = fts._calculate_proximity_score(key, proximity_words)
+			scores[i] = (
+				bm25_scores[i] * proximity_scores[i] * title_boosts[i] * recency_boosts[i] * click_boosts[i]
+			)
+		scores = scores[candidates]
+		indexes = candidates
+	else:
+		proximity_scores = {}
+		indexes = np.arange(total_matches)
+
+	if len(scores) > k:
+		best = np.argpartition(-scores, k - 1)[:k]
+		scores, indexes = scores[best], indexes[best]
+
+	top = sorted(zip(scores.tolist(), keys[indexes].tolist(), indexes.tolist(), strict=True), reverse=True)
+	for _score, key, i in top:
+		components = fts.score_components[key]
+		components["bm25"] = float(bm25_scores[i])
+		components["recency_boost"] = float(recency_boosts[i])
+		if title_boosts[i] != 1.0:
+			components["title_boost"] = float(title_boosts[i])
+		if click_boosts[i] != 1.0:
+			components["click_boost"] = float(click_boosts[i])
+		if i in proximity_scores:
+			components["proximity"] = proximity_scores[i]
+		_record_matches(fts, key, terms, title_only)
+
+	return [(score, key) for score, key, _i in top], total_matches
+
+
+def _documents_with(segment, word, title_only=False):
+	"""Mask of the documents of a segment containing `word`."""
+	mask = np.zeros(segment.n_docs, dtype=bool)
+	term_id = segment.term_id(word)
+	if term_id >= 0:
+		start, end = segment.posting_range(term_id)
+		docs = np.asarray(segment.posting_docs[start:end])
+		if title_only:
+			docs = docs[np.asarray(segment.posting_title_freqs[start:end]) > 0]
+		mask[docs] = True
+	return mask
+
+
+def _click_boosts(fts, segment, ordinals):
+	"""Click boosts of the matching documents of a segment, computed like `ClickBoosts.get_for_segment`."""
+	if not fts.click_boosts:
+		return np.ones(len(ordinals))
+	_documents, terms = fts.click_boosts.for_segment(segment)
+	term_boosts = np.ones(len(ordinals))
+	for word in fts.click_words:
+		# Documents clicked for a word are few, look them up among the matches one by one
+		for ordinal, boost in terms.get(word, {}).items():
+			i = np.searchsorted(ordinals, ordinal)
+			if i < len(ordinals) and ordinals[i] == ordinal:
+				term_boosts[i] = max(term_boosts[i], boost)
+	return _document_click_boosts(fts.click_boosts, segment)[ordinals] * term_boosts
+
+
+def _document_click_boosts(click_boosts, segment):
+	"""Dense array of the per document click boosts of a segment, kept until the table changes."""
+	cached = _segment_click_boosts.get(segment)
+	if cached is None or cached[0] is not click_boosts:
+		boosts = np.ones(segment.n_docs)
+		documents, _terms = click_boosts.for_segment(segment)
+		if documents:
+			boosts[list(documents)] = list(documents.values())
+		cached = _segment_click_boosts[segment] = (click_boosts, boosts)
+	return cached[1]
+
+
+def _record_matches(fts, key, terms, title_only):
+	"""Fill in the matched words of a returned document, used for highlighting."""
+	for filtered, original, _idf in terms:
+		posting = fts.segments.find_posting(filtered, key)
+		if posting < 0:
+			continue
+		segment, _ordinal = fts.segments.locate(key)
+		in_title = bool(segment.posting_title_freqs[posting])
+		if title_only and not in_title:
+			continue
+		fts.matched_words[key].add(filtered)
+		fts.matched_word_variations[key].update([filtered, original])
+		fts.matched_positions[key][filtered] = posting
+		if in_title:
+			fts.matched_title_words[key].add(filtered)
+
+
+def benchmark(queries=None, repeat=5, title_only=False):
+	"""
+	Compare both scoring backends on the site's index.
+
+	Without `queries`, the terms with the longest posting lists are used since that is
+	where vectorizing pays off.
+
+	bench --site <site> execute gameplan.utils.fts_numpy.benchmark
+	"""
+	backends = {scoring: FullTextSearch(scoring=scoring) for scoring in ("python", "numpy")}
+	fts = backends["python"]
+	fts._load_index()
+	if not fts.segments:
+		print("Search index does not exist")
+		return
+
+	if not queries:
+		posting_counts = {}
+		for segment in fts.segments.segments:
+			for term_id in range(segment.n_terms):
+				term = segment.term(term_id)
+				if term not in fts.stop_words:
+					start, end = segment.posting_range(term_id)
+					posting_counts[term] = posting_counts.get(term, 0) + end - start
+		terms = sorted(posting_counts, key=posting_counts.get, reverse=True)[:4]
+		queries = [*terms, " ".join(terms[:2]), " ".join(terms)]
+
+	report = []
+	for query in queries:
+		timings, rankings = {}, {}
+		for scoring, backend in backends.items():
+			durations = []
+			for _ in range(repeat):
+				backend.current_time = fts.current_time
+				start = time.perf_counter()
+				response = backend.search(query, title_only=title_only)
+				durations.append(time.perf_counter() - start)
+			timings[scoring] = statistics.median(durations) * 1000
+			rankings[scoring] = [(r["id"], r["score"]) for r in response["results"]]
+
+		row = {
+			"query": query,
+			"matches": response["summary"]["total_matches"],
+			"python_ms": round(timings["python"], 2),
+			"numpy_ms": round(timings["numpy"], 2),
+			"speedup": round(timings["python"] / timings["numpy"], 2),
+			"identical": rankings["python"] == rankings["numpy"],
+		}
+		report.append(row)
+		print(
+			f"{query!r:40} {row['matches']:>8} matches  python {row['python_ms']:>9.2f} ms  "
+			f"numpy {row['numpy_ms']:>9.2f} ms  {row['speedup']:>6.2f}x  identical={row['identical']}"
+		)
+
+	return report
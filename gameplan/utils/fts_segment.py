@@ -0,0 +1,711 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+"""
+Compact, memory-mappable segment format for :class:`gameplan.utils.fts.FullTextSearch`.
+
+A segment is a single immutable file made of a fixed header, a section directory
+and a number of sections. Every section is either a native `array` buffer that
+is read in place through a `memoryview` or a blob addressed by such a buffer, so
+opening a segment is an `mmap` call and no Python objects are built up front.
+
+Layout:
+	header
+		magic, format version, byte order, section count,
+		document count, term count, sum of document lengths
+	section directory
+		(offset, length) for every entry in `SECTIONS`
+	doc metadata
+		columnar: ids, lengths, timestamps, titles, contents, projects
+	projects
+		sorted project dictionary with the sorted doc ordinals of every
+		project, used to restrict a search to the projects a user can see
+	term dictionary
+		sorted utf-8 terms with per-term posting ranges and the
+		statistics used to bound a term's BM25 contribution
+	postings
+		doc ordinals and frequencies as flat uint32 arrays,
+		one contiguous run per term
+	positions
+		delta + varint encoded, field tagged word positions per posting
+	forward index
+		delta + varint encoded term ordinals of every document
+	deletes
+		SymSpell dictionary: every string reachable by deleting up to
+		`MAX_EDIT_DISTANCE` characters from a term's prefix, sorted,
+		pointing at term ordinals
+
+An index is an ordered list of segments: one large base segment and small delta
+segments appended by incremental updates. Each segment carries a sequence number
+and a document is live in a segment only if it was not removed or replaced by a
+later write (see `SegmentSet`).
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+
+MAGIC = b"GPFTSSEG"
+SEGMENT_VERSION = 6
+
+BYTE_ORDER = 1 if sys.byteorder == "little" else 2
+
+# magic, version, byte order, section count, n_docs, n_terms, total_length
+HEADER = struct.Struct("<8sHHIIIQ")
+SECTION_ENTRY = struct.Struct("<QQ")
+
+# Title words count three times towards a document's term frequency and length
+TITLE_WEIGHT = 3
+
+# Positions are tagged with their field in the high bits, so that all title positions
+# sort before content positions and a span can never be mistaken for one across fields
+TITLE_FIELD, CONTENT_FIELD = 0, 1
+FIELD_SHIFT = 32
+
+# Spelling corrections reach terms up to this many edits away, indexed by the deletes
+# of their first PREFIX_LENGTH characters
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+
+SECTIONS = (
+	# doc metadata
+	("doc_id_offsets", "Q"),
+	("doc_id_blob", "B"),
+	("doc_id_order", "I"),
+	("doc_lengths", "I"),
+	("doc_timestamps", "d"),
+	("title_offsets", "Q"),
+	("title_blob", "B"),
+	("content_offsets", "Q"),
+	("content_blob", "B"),
+	("doc_projects", "I"),
+	# projects
+	("project_offsets", "Q"),
+	("project_blob", "B"),
+	("project_docs", "Q"),
+	("project_doc_ordinals", "I"),
+	# term dictionary
+	("term_offsets", "Q"),
+	("term_blob", "B"),
+	("term_postings", "Q"),
+	("term_title_dfs", "I"),
+	("term_max_freqs", "I"),
+	("term_min_lengths", "I"),
+	# postings
+	("posting_docs", "I"),
+	("posting_freqs", "I"),
+	("posting_title_freqs", "I"),
+	("posting_positions", "Q"),
+	("positions_blob", "B"),
+	# forward index
+	("forward_offsets", "Q"),
+	("forward_blob", "B"),
+	# fuzzy matching
+	("delete_offsets", "Q"),
+	("delete_blob", "B"),
+	("delete_terms", "Q"),
+	("delete_term_ids", "I"),
+)
+
+
+class SegmentFormatError(Exception):
+	pass
+
+
+def encode_varint(value, out):
+	"""Append `value` to the bytearray `out` as an unsigned LEB128 varint."""
+	while value >= 0x80:
+		out.append((value & 0x7F) | 0x80)
+		value >>= 7
+	out.append(value)
+
+
+def decode_varints(buffer, start, end):
+	"""Decode every varint in `buffer[start:end]`."""
+	values = []
+	value = shift = 0
+	for byte in buffer[start:end]:
+		value |= (byte & 0x7F) << shift
+		if byte & 0x80:
+			shift += 7
+		else:
+			values.append(value)
+			value = shift = 0
+	return values
+
+
+def encode_deltas(values, out):
+	"""Append a sorted list of integers to `out` as varint encoded gaps."""
+	previous = 0
+	for value in values:
+		encode_varint(value - previous, out)
+		previous = value
+
+
+def decode_deltas(values):
+	"""Turn a list of gaps back into absolute values."""
+	total = 0
+	out = []
+	for gap in values:
+		total += gap
+		out.append(total)
+	return out
+
+
+def tag_position(field, position):
+	return (field << FIELD_SHIFT) | position
+
+
+def position_field(tagged):
+	return tagged >> FIELD_SHIFT
+
+
+def generate_deletes(word, max_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH):
+	"""Return every string obtained by deleting up to `max_distance` characters from the prefix of `word`."""
+	deletes = {word[:prefix_length]}
+	frontier = deletes
+	for _distance in range(max_distance):
+		frontier = {w[:i] + w[i + 1 :] for w in frontier for i in range(len(w))} - deletes
+		deletes |= frontier
+	return deletes
+
+
+class _StringTable:
+	"""Builds the (offsets, blob) pair used for every string column."""
+
+	def __init__(self):
+		self.offsets = array("Q", [0])
+		self.blob = bytearray()
+
+	def append(self, value):
+		self.blob += value.encode() if isinstance(value, str) else value
+		self.offsets.append(len(self.blob))
+
+
+class SegmentWriter:
+	"""
+	Accumulate tokenized documents and serialize them as a segment.
+
+	Documents get ordinals in insertion order. The writer keeps everything in
+	memory until `to_bytes` is called, so it is meant for building a full index
+	or a small batch, not for streaming an unbounded corpus.
+	"""
+
+	def __init__(self):
+		self.doc_ids = []
+		self.doc_lengths = array("I")
+		self.doc_timestamps = array("d")
+		self.titles = []
+		self.contents = []
+		self.projects = []
+		# term -> list of (doc ordinal, title frequency, sorted tagged positions)
+		self.postings = defaultdict(list)
+
+	def __len__(self):
+		return len(self.doc_ids)
+
+	def _add_metadata(self, doc_id, title, content, timestamp, length, project):
+		ordinal = len(self.doc_ids)
+		self.doc_ids.append(doc_id)
+		self.titles.append(title or "")
+		self.contents.append(content or "")
+		self.projects.append(project or "")
+		self.doc_timestamps.append(float(timestamp or 0))
+		self.doc_lengths.append(length)
+		return ordinal
+
+	def add_document(self, doc_id, title, content, timestamp, title_words, content_words, project=None):
+		"""Add a document whose title and content are already tokenized."""
+		ordinal = self._add_metadata(
+			doc_id, title, content, timestamp, len(title_words) * TITLE_WEIGHT + len(content_words), project
+		)
+
+		positions = defaultdict(list)
+		title_freqs = defaultdict(int)
+		for pos, word in enumerate(title_words):
+			positions[word].append(tag_position(TITLE_FIELD, pos))
+			title_freqs[word] += 1
+		for pos, word in enumerate(content_words):
+			positions[word].append(tag_position(CONTENT_FIELD, pos))
+
+		for word, tagged_positions in positions.items():
+			self.postings[word].append((ordinal, title_freqs[word], tagged_positions))
+
+	def add_segment(self, segment, dead=()):
+		"""Copy the documents of `segment` whose ordinals are not in `dead`, without re-tokenizing."""
+		ordinals = {}
+		for ordinal in range(segment.n_docs):
+			if ordinal not in dead:
+				ordinals[ordinal] = self._add_metadata(
+					segment.doc_id(ordinal),
+					segment.title(ordinal),
+					segment.content(ordinal),
+					segment.doc_timestamps[ordinal],
+					segment.doc_lengths[ordinal],
+					segment.project(ordinal),
+				)
+
+		for term_id in range(segment.n_terms):
+			postings = None
+			start, end = segment.posting_range(term_id)
+			for posting in range(start, end):
+				ordinal = ordinals.get(segment.posting_docs[posting])
+				if ordinal is None:
+					continue
+				if postings is None:
+					postings = self.postings[segment.term(term_id)]
+				postings.append((ordinal, segment.posting_title_freqs[posting], segment.positions(posting)))
+
+	def to_bytes(self):
+		# Number documents newest first, so that posting lists start with recent documents
+		# and the timestamp of a document bounds the timestamps of all documents after it
+		order = sorted(range(len(self.doc_ids)), key=self.doc_timestamps.__getitem__, reverse=True)
+		renumbered = array("I", bytes(4 * len(order)))
+		for ordinal, previous in enumerate(order):
+			renumbered[previous] = ordinal
+
+		doc_ids = _StringTable()
+		titles = _StringTable()
+		contents = _StringTable()
+		doc_lengths = array("I", (self.doc_lengths[i] for i in order))
+		doc_timestamps = array("d", (self.doc_timestamps[i] for i in order))
+		for i in order:
+			doc_ids.append(self.doc_ids[i])
+			titles.append(self.titles[i])
+			contents.append(self.contents[i])
+
+		project_names = sorted(set(self.projects), key=str.encode)
+		project_table = _StringTable()
+		project_docs = array("Q", [0])
+		project_doc_ordinals = array("I")
+		project_ids = {project: i for i, project in enumerate(project_names)}
+		doc_projects = array("I", (project_ids[self.projects[i]] for i in order))
+		ordinals_by_project = defaultdict(list)
+		for ordinal, project_id in enumerate(doc_projects):
+			ordinals_by_project[project_id].append(ordinal)
+		for project_id, project in enumerate(project_names):
+			project_table.append(project)
+			project_doc_ordinals.extend(ordinals_by_project[project_id])
+			project_docs.append(len(project_doc_ordinals))
+
+		encoded_ids = [self.doc_ids[i].encode() for i in order]
+		doc_id_order = array("I", sorted(range(len(encoded_ids)), key=encoded_ids.__getitem__))
+
+		terms = sorted(self.postings, key=str.encode)
+		term_table = _StringTable()
+		term_postings = array("Q", [0])
+		posting_docs = array("I")
+		posting_freqs = array("I")
+		posting_title_freqs = array("I")
+		posting_positions = array("Q", [0])
+		positions_blob = bytearray()
+		term_title_dfs = array("I")
+		term_max_freqs = array("I")
+		term_min_lengths = array("I")
+		forward = [[] for _ in self.doc_ids]
+
+		for term_id, term in enumerate(terms):
+			term_table.append(term)
+			title_df = max_freq = 0
+			min_length = 2**32 - 1
+			postings = sorted(self.postings[term], key=lambda posting: renumbered[posting[0]])
+			for previous, title_freq, positions in postings:
+				ordinal = renumbered[previous]
+				freq = title_freq * TITLE_WEIGHT + len(positions) - title_freq
+				forward[ordinal].append(term_id)
+				posting_docs.append(ordinal)
+				posting_freqs.append(freq)
+				posting_title_freqs.append(title_freq)
+				encode_deltas(positions, positions_blob)
+				posting_positions.append(len(positions_blob))
+				title_df += bool(title_freq)
+				max_freq = max(max_freq, freq)
+				min_length = min(min_length, doc_lengths[ordinal])
+			term_postings.append(len(posting_docs))
+			term_title_dfs.append(title_df)
+			term_max_freqs.append(max_freq)
+			term_min_lengths.append(min_length)
+
+		forward_offsets = array("Q", [0])
+		forward_blob = bytearray()
+		for term_ids in forward:
+			encode_deltas(term_ids, forward_blob)
+			forward_offsets.append(len(forward_blob))
+
+		deletes = defaultdict(list)
+		for term_id, term in enumerate(terms):
+			for delete in generate_deletes(term):
+				deletes[delete].append(term_id)
+
+		delete_table = _StringTable()
+		delete_terms = array("Q", [0])
+		delete_term_ids = array("I")
+		for delete in sorted(deletes, key=str.encode):
+			delete_table.append(delete)
+			delete_term_ids.extend(deletes[delete])
+			delete_terms.append(len(delete_term_ids))
+
+		sections = {
+			"doc_id_offsets": doc_ids.offsets,
+			"doc_id_blob": doc_ids.blob,
+			"doc_id_order": doc_id_order,
+			"doc_lengths": doc_lengths,
+			"doc_timestamps": doc_timestamps,
+			"title_offsets": titles.offsets,
+			"title_blob": titles.blob,
+			"content_offsets": contents.offsets,
+			"content_blob": contents.blob,
+			"doc_projects": doc_projects,
+			"project_offsets": project_table.offsets,
+			"project_blob": project_table.blob,
+			"project_docs": project_docs,
+			"project_doc_ordinals": project_doc_ordinals,
+			"term_offsets": term_table.offsets,
+			"term_blob": term_table.blob,
+			"term_postings": term_postings,
+			"term_title_dfs": term_title_dfs,
+			"term_max_freqs": term_max_freqs,
+			"term_min_lengths": term_min_lengths,
+			"posting_docs": posting_docs,
+			"posting_freqs": posting_freqs,
+			"posting_title_freqs": posting_title_freqs,
+			"posting_positions": posting_positions,
+			"positions_blob": positions_blob,
+			"forward_offsets": forward_offsets,
+			"forward_blob": forward_blob,
+			"delete_offsets": delete_table.offsets,
+			"delete_blob": delete_table.blob,
+			"delete_terms": delete_terms,
+			"delete_term_ids": delete_term_ids,
+		}
+		return _pack(sections, len(self.doc_ids), len(terms), sum(self.doc_lengths))
+
+	def write(self, path):
+		"""Write the segment to `path` atomically."""
+		write_atomic(path, self.to_bytes())
+
+
+def _pack(sections, n_docs, n_terms, total_length):
+	directory_size = SECTION_ENTRY.size * len(SECTIONS)
+	offset = _align(HEADER.size + directory_size)
+	entries = []
+	payloads = []
+	for name, _typecode in SECTIONS:
+		data = bytes(sections[name])
+		entries.append((offset, len(data)))
+		payloads.append((offset, data))
+		offset = _align(offset + len(data))
+
+	out = bytearray(offset)
+	HEADER.pack_into(out, 0, MAGIC, SEGMENT_VERSION, BYTE_ORDER, len(SECTIONS), n_docs, n_terms, total_length)
+	for i, entry in enumerate(entries):
+		SECTION_ENTRY.pack_into(out, HEADER.size + i * SECTION_ENTRY.size, *entry)
+	for start, data in payloads:
+		out[start : start + len(data)] = data
+	return bytes(out)
+
+
+def _align(offset, alignment=8):
+	return (offset + alignment - 1) & ~(alignment - 1)
+
+
+def write_atomic(path, data):
+	"""Write `data` next to `path` and rename it into place."""
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	tmp_path = f"{path}.{os.getpid()}.tmp"
+	with open(tmp_path, "wb") as f:
+		f.write(data)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(tmp_path, path)
+
+
+class Segment:
+	"""
+	Read-only view over a serialized segment.
+
+	All columns are `memoryview`s into the underlying buffer, which is either an
+	`mmap` of the segment file (shared between processes through the page cache)
+	or an in-memory `bytes` object.
+	"""
+
+	def __init__(self, buffer, path=None):
+		self.path = path
+		self._buffer = memoryview(buffer)
+		if len(self._buffer) < HEADER.size:
+			raise SegmentFormatError("Segment is truncated")
+
+		magic, version, byte_order, n_sections, n_docs, n_terms, total_length = HEADER.unpack_from(
+			self._buffer, 0
+		)
+		if magic != MAGIC:
+			raise SegmentFormatError("Not a search index segment")
+		if version != SEGMENT_VERSION or n_sections != len(SECTIONS):
+			raise SegmentFormatError(f"Unsupported segment version {version}")
+		if byte_order != BYTE_ORDER:
+			raise SegmentFormatError("Segment was written on a machine with a different byte order")
+
+		self.n_docs = n_docs
+		self.n_terms = n_terms
+		self.total_length = total_length
+
+		for i, (name, typecode) in enumerate(SECTIONS):
+			offset, length = SECTION_ENTRY.unpack_from(self._buffer, HEADER.size + i * SECTION_ENTRY.size)
+			view = self._buffer[offset : offset + length]
+			setattr(self, name, view if typecode == "B" else view.cast(typecode))
+
+	@classmethod
+	def open(cls, path):
+		"""Memory-map the segment at `path`."""
+		with open(path, "rb") as f:
+			mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		return cls(mm, path=path)
+
+	@classmethod
+	def from_bytes(cls, data):
+		return cls(data)
+
+	def _string(self, offsets, blob, i):
+		return bytes(blob[offsets[i] : offsets[i + 1]]).decode()
+
+	def _find(self, offsets, blob, count, key, order=None):
+		"""Binary search a sorted string table, returning the ordinal or -1."""
+		key = key.encode()
+		lo, hi = 0, count
+		while lo < hi:
+			mid = (lo + hi) // 2
+			i = order[mid] if order is not None else mid
+			value = bytes(blob[offsets[i] : offsets[i + 1]])
+			if value < key:
+				lo = mid + 1
+			elif value > key:
+				hi = mid
+			else:
+				return i
+		return -1
+
+	# doc metadata
+
+	def doc_id(self, ordinal):
+		return self._string(self.doc_id_offsets, self.doc_id_blob, ordinal)
+
+	def doc_ordinal(self, doc_id):
+		return self._find(self.doc_id_offsets, self.doc_id_blob, self.n_docs, doc_id, self.doc_id_order)
+
+	def title(self, ordinal):
+		return self._string(self.title_offsets, self.title_blob, ordinal)
+
+	def content(self, ordinal):
+		return self._string(self.content_offsets, self.content_blob, ordinal)
+
+	def project(self, ordinal):
+		return self._string(self.project_offsets, self.project_blob, self.doc_projects[ordinal])
+
+	def project_ordinals(self, project):
+		"""Return the sorted ordinals of the documents of `project`."""
+		i = self._find(self.project_offsets, self.project_blob, len(self.project_docs) - 1, project)
+		if i < 0:
+			return ()
+		return self.project_doc_ordinals[self.project_docs[i] : self.project_docs[i + 1]]
+
+	def iter_documents(self):
+		"""Yield the stored (doc_id, title, content, timestamp, project) of every document."""
+		for ordinal in range(self.n_docs):
+			yield (
+				self.doc_id(ordinal),
+				self.title(ordinal),
+				self.content(ordinal),
+				self.doc_timestamps[ordinal],
+				self.project(ordinal),
+			)
+
+	# terms and postings
+
+	def term(self, term_id):
+		return self._string(self.term_offsets, self.term_blob, term_id)
+
+	def term_id(self, term):
+		return self._find(self.term_offsets, self.term_blob, self.n_terms, term)
+
+	def posting_range(self, term_id):
+		"""Return the [start, end) range of `term_id` in the posting arrays."""
+		return self.term_postings[term_id], self.term_postings[term_id + 1]
+
+	def find_posting(self, term_id, ordinal):
+		"""Return the posting index of document `ordinal` for `term_id`, or -1."""
+		start, end = self.posting_range(term_id)
+		i = bisect_left(self.posting_docs, ordinal, start, end)
+		if i < end and self.posting_docs[i] == ordinal:
+			return i
+		return -1
+
+	def positions(self, posting):
+		"""Decode the sorted, field tagged positions stored for a posting index."""
+		start, end = self.posting_positions[posting], self.posting_positions[posting + 1]
+		return decode_deltas(decode_varints(self.positions_blob, start, end))
+
+	def doc_term_ids(self, ordinal):
+		"""Return the term ordinals of a document from the forward index."""
+		start, end = self.forward_offsets[ordinal], self.forward_offsets[ordinal + 1]
+		return decode_deltas(decode_varints(self.forward_blob, start, end))
+
+	def delete_term_ids_for(self, delete):
+		"""Return the ordinals of the terms whose prefix deletes include `delete`."""
+		i = self._find(self.delete_offsets, self.delete_blob, len(self.delete_terms) - 1, delete)
+		if i < 0:
+			return ()
+		return self.delete_term_ids[self.delete_terms[i] : self.delete_terms[i + 1]]
+
+
+class SegmentSet:
+	"""
+	Live view over an ordered list of segments, oldest first.
+
+	`tombstones` maps a doc id to the sequence number of the write that removed
+	or replaced it: a copy of the document in a segment with a lower sequence
+	number is dead. Dead documents are resolved once per snapshot through the
+	doc id dictionaries, and the forward index is used to take them out of the
+	per-term document frequencies, so a delete costs O(terms in the document)
+	and never touches the postings themselves.
+
+	Documents are addressed by a key that is unique across the set: the
+	ordinal within its segment plus the number of documents in earlier segments.
+	"""
+
+	def __init__(self, segments, tombstones=None):
+		self.segments = []
+		self.sequences = []
+		self.bases = []
+		self.dead = []
+		self.df_adjust = []
+		self.title_df_adjust = []
+		self._add_segments(segments)
+		self._add_tombstones(tombstones or {})
+
+	def extend(self, segments, tombstones, since_seq):
+		"""
+		Return a new set with `segments` appended, for a manifest that only added delta
+		segments and tombstones since this set was opened at `since_seq`.
+
+		The dead documents already resolved are copied, so only the newer tombstones
+		are looked up. This set is left untouched for searches still using it.
+		"""
+		extended = SegmentSet([])
+		extended.segments = list(self.segments)
+		extended.sequences = list(self.sequences)
+		extended.bases = list(self.bases)
+		extended.dead = [set(dead) for dead in self.dead]
+		extended.df_adjust = [defaultdict(int, adjust) for adjust in self.df_adjust]
+		extended.title_df_adjust = [defaultdict(int, adjust) for adjust in self.title_df_adjust]
+		extended._add_segments(segments)
+		extended._add_tombstones({doc_id: seq for doc_id, seq in tombstones.items() if seq > since_seq})
+		return extended
+
+	def _add_segments(self, segments):
+		# list of (sequence number, Segment)
+		base = self.bases[-1] + self.segments[-1].n_docs if self.segments else 0
+		for seq, segment in segments:
+			self.segments.append(segment)
+			self.sequences.append(seq)
+			self.bases.append(base)
+			self.dead.append(set())
+			self.df_adjust.append(defaultdict(int))
+			self.title_df_adjust.append(defaultdict(int))
+			base += segment.n_docs
+
+	def _add_tombstones(self, tombstones):
+		for doc_id, seq in tombstones.items():
+			for i, segment in enumerate(self.segments):
+				if self.sequences[i] >= seq:
+					break
+				ordinal = segment.doc_ordinal(doc_id)
+				if ordinal >= 0 and ordinal not in self.dead[i]:
+					self.dead[i].add(ordinal)
+					for term_id in segment.doc_term_ids(ordinal):
+						self.df_adjust[i][term_id] += 1
+						if segment.posting_title_freqs[segment.find_posting(term_id, ordinal)]:
+							self.title_df_adjust[i][term_id] += 1
+
+		self.n_docs = 0
+		self.total_length = 0
+		for i, segment in enumerate(self.segments):
+			self.n_docs += segment.n_docs - len(self.dead[i])
+			self.total_length += segment.total_length - sum(
+				segment.doc_lengths[ordinal] for ordinal in self.dead[i]
+			)
+
+	def __iter__(self):
+		"""Yield (segment, doc key base, dead ordinals, df adjustments) for every segment."""
+		return zip(self.segments, self.bases, self.dead, self.df_adjust, strict=True)
+
+	def locate(self, key):
+		"""Return the (segment, ordinal) of a document key."""
+		i = bisect_left(self.bases, key + 1) - 1
+		return self.segments[i], key - self.bases[i]
+
+	def doc_id(self, key):
+		segment, ordinal = self.locate(key)
+		return segment.doc_id(ordinal)
+
+	def title(self, key):
+		segment, ordinal = self.locate(key)
+		return segment.title(ordinal)
+
+	def content(self, key):
+		segment, ordinal = self.locate(key)
+		return segment.content(ordinal)
+
+	def timestamp(self, key):
+		segment, ordinal = self.locate(key)
+		return segment.doc_timestamps[ordinal]
+
+	def project(self, key):
+		segment, ordinal = self.locate(key)
+		return segment.project(ordinal)
+
+	def allowed_documents(self, projects):
+		"""
+		Return, per segment, the sorted ordinals of the documents in `projects`, or None
+		for segments whose documents all belong to them.
+		"""
+		projects = set(projects)
+		allowed = []
+		for segment in self.segments:
+			segment_projects = {
+				segment._string(segment.project_offsets, segment.project_blob, i)
+				for i in range(len(segment.project_docs) - 1)
+			}
+			if segment_projects <= projects:
+				allowed.append(None)
+			else:
+				ordinals = (segment.project_ordinals(project) for project in segment_projects & projects)
+				allowed.append(sorted(o for project_ordinals in ordinals for o in project_ordinals))
+		return allowed
+
+	def doc_frequency(self, term, title_only=False):
+		"""Number of live documents containing `term`, optionally only in their title."""
+		df = 0
+		for i, segment in enumerate(self.segments):
+			term_id = segment.term_id(term)
+			if term_id < 0:
+				continue
+			if title_only:
+				df += segment.term_title_dfs[term_id] - self.title_df_adjust[i].get(term_id, 0)
+			else:
+				start, end = segment.posting_range(term_id)
+				df += end - start - self.df_adjust[i].get(term_id, 0)
+		return df
+
+	def find_posting(self, term, key):
+		"""Return the posting index of `term` in the document `key`, or -1."""
+		segment, ordinal = self.locate(key)
+		term_id = segment.term_id(term)
+		return segment.find_posting(term_id, ordinal) if term_id >= 0 else -1
+
+	def positions(self, key, posting):
+		segment, _ordinal = self.locate(key)
+		return segment.positions(posting)
@@ -0,0 +1,72 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+"""
+Users who can read a project, cached in Redis.
+
+A private project is read by its members, a public one by every enabled user who is not
+a guest, and both by the guests given access to them. The users of public projects are
+cached once for all of them, the members and guests of each project on their own, and
+the cache is cleared by the changes that affect it: saving or deleting a project, guest
+access being given or taken away, and users being enabled, disabled or given other roles.
+"""
+
+import frappe
+
+PROJECT_KEY = "gameplan_project_audience"
+PUBLIC_USERS_KEY = "gameplan_project_audience_public_users"
+
+
+def get_project_audience(project):
+	"""Users who can read the project."""
+	audience = frappe.cache().get_value(f"{PROJECT_KEY}:{project}", lambda: _get_project_audience(project))
+	if audience is None:
+		return set()
+	users = set(audience["members"]) | set(audience["guests"])
+	if not audience["is_private"]:
+		users.update(frappe.cache().get_value(PUBLIC_USERS_KEY, _get_public_users))
+	return users
+
+
+def _get_project_audience(project):
+	is_private = frappe.db.get_value("GP Project", project, "is_private")
+	if is_private is None:
+		return None
+	members = []
+	if is_private:
+		members = frappe.get_all(
+			"GP Member", filters={"parenttype": "GP Project", "parent": project}, pluck="user"
+		)
+	guests = frappe.get_all("GP Guest Access", filters={"project": project}, pluck="user")
+	return {"is_private": is_private, "members": [user for user in members if user], "guests": guests}
+
+
+def _get_public_users():
+	"""Enabled users who are not guests, see `gameplan.is_guest`."""
+	return frappe.db.sql_list(
+		"""
+		SELECT p.user FROM `tabGP User Profile` p
+		WHERE p.enabled = 1 AND (
+			p.user = 'Administrator'
+			OR EXISTS (
+				SELECT 1 FROM `tabHas Role` r
+				WHERE r.parenttype = 'User' AND r.parent = p.user
+					AND r.role IN ('Gameplan Member', 'Gameplan Admin')
+			)
+			OR NOT EXISTS (
+				SELECT 1 FROM `tabHas Role` r
+				WHERE r.parenttype = 'User' AND r.parent = p.user AND r.role = 'Gameplan Guest'
+			)
+		)
+		"""
+	)
+
+
+def clear_project_audience(doc, method=None):
+	"""Clear the cached audience of a project when it, or guest access to it, changes."""
+	project = doc.name if doc.doctype == "GP Project" else doc.project
+	frappe.cache().delete_value(f"{PROJECT_KEY}:{project}")
+
+
+def clear_public_users(doc, method=None):
+	"""Clear the cached users of public projects when a user or their roles change."""
+	frappe.cache().delete_value(PUBLIC_USERS_KEY)
@@ -11,8 +11,22 @@ from redis.commands.search.indexDefinition import IndexDefinition
 from redis.commands.search.query import Query
 from redis.exceptions import ResponseError
 
+# A rebuild that has not finished by then is considered dead and another one may start
+REBUILD_TIMEOUT = 60 * 60  # seconds
+# Documents written per pipelined round trip by add_documents
+BATCH_SIZE = 500
+
 
 class Search:
+	"""
+	RediSearch index queried through an alias.
+
+	Rebuilds create a new generation of the index, with its own name and key prefix,
+	next to the live one. Writes made while a rebuild runs go to the live index and to a
+	journal that is replayed into the new generation before the alias is switched over
+	to it, so queries are served by the old index until the new one is complete.
+	"""
+
 	def __init__(self, index_name, prefix, schema) -> None:
 		self.redis = frappe.cache()
 		self.index_name = index_name
@@ -21,9 +35,10 @@ class Search:
 		for field in schema:
 			self.schema.append(frappe._dict(field))
 
-	def create_index(self):
+	def create_index(self, generation=None):
+		index_name, prefix = self._get_generation_names(generation)
 		index_def = IndexDefinition(
-			prefix=[f"{self.redis.make_key(self.prefix).decode()}:"],
+			prefix=[f"{self.redis.make_key(prefix).decode()}:"],
 		)
 		schema = []
 		for field in self.schema:
@@ -33,25 +48,65 @@ class Search:
 			else:
 				schema.append(TextField(field.name, **kwargs))
 
-		self.redis.ft(self.index_name).create_index(schema, definition=index_def)
-		self._index_exists = True
+		self.redis.ft(index_name).create_index(schema, definition=index_def)
+		if generation is None:
+			self._index_exists = True
+
+	def add_document(self, id, doc, payload=None, generation=None):
+		mapping = self._get_mapping(doc)
+		if generation is not None:
+			self._write_document(generation, id, mapping, payload)
+			return
+		if self.index_exists():
+			self._write_document(self.get_generation(), id, mapping, payload)
+		self._journal(["add", id, mapping, payload])
+
+	def add_documents(self, documents, generation=None, batch_size=BATCH_SIZE):
+		"""
+		Add or replace many documents, sending the writes in pipelined batches of `batch_size`.
+		`documents` is an iterable of (id, doc, payload) tuples.
+		"""
+		journal = generation is None and self.rebuild_in_progress()
+		write = generation is not None or self.index_exists()
+		if generation is None:
+			generation = self.get_generation()
 
-	def add_document(self, id, doc, payload=None):
+		index_name, prefix = self._get_generation_names(generation)
+		indexer = self.redis.ft(index_name).batch_indexer(chunk_size=batch_size)
+		journal_entries = []
+		for id, doc, payload in documents:
+			mapping = self._get_mapping(doc)
+			if write:
+				doc_id = self.redis.make_key(f"{prefix}:{id}").decode()
+				indexer.add_document(doc_id, payload=json.dumps(payload), replace=True, **mapping)
+			if journal:
+				journal_entries.append(json.dumps(["add", id, mapping, payload]))
+		indexer.commit()
+
+		if journal_entries:
+			self.redis.execute_command("RPUSH", self._get_redis_key("journal"), *journal_entries)
+
+	def _get_mapping(self, doc):
 		doc = frappe._dict(doc)
-		doc_id = self.redis.make_key(f"{self.prefix}:{id}").decode()
 		mapping = {}
 		for field in self.schema:
 			if field.name in doc:
 				mapping[field.name] = cstr(doc[field.name])
-		if self.index_exists():
-			self.redis.ft(self.index_name).add_document(
-				doc_id, payload=json.dumps(payload), replace=True, **mapping
-			)
+		return mapping
 
 	def remove_document(self, id):
-		key = self.redis.make_key(f"{self.prefix}:{id}").decode()
 		if self.index_exists():
-			self.redis.ft(self.index_name).delete_document(key)
+			self._delete_document(self.get_generation(), id)
+		self._journal(["remove", id])
+
+	def _write_document(self, generation, id, mapping, payload):
+		index_name, prefix = self._get_generation_names(generation)
+		doc_id = self.redis.make_key(f"{prefix}:{id}").decode()
+		self.redis.ft(index_name).add_document(doc_id, payload=json.dumps(payload), replace=True, **mapping)
+
+	def _delete_document(self, generation, id):
+		index_name, prefix = self._get_generation_names(generation)
+		self.redis.ft(index_name).delete_document(self.redis.make_key(f"{prefix}:{id}").decode())
 
 	def search(self, query, start=0, page_length=50, sort_by=None, highlight=False, with_payloads=False):
 		query = Query(query).paging(start, page_length)
@@ -85,7 +140,88 @@ class Search:
 
 	def drop_index(self):
 		if self.index_exists():
-			self.redis.ft(self.index_name).dropindex(delete_documents=True)
+			generation = self.get_generation()
+			if generation:
+				self.redis.ft(self.index_name).aliasdel(self.index_name)
+			self._drop_generation(generation)
+			self.redis.delete(self._get_redis_key("generation"))
+			self._index_exists = False
+
+	def start_rebuild(self):
+		"""
+		Create the next generation of the index and start journaling writes to the live one.
+		Returns the new generation, or None if another rebuild is already running.
+		"""
+		generation = self.redis.incr(self._get_redis_key("generations"))
+		if not self.redis.set(self._get_redis_key("rebuild"), generation, nx=True, ex=REBUILD_TIMEOUT):
+			return None
+		self.redis.delete(self._get_redis_key("journal"))
+		self.create_index(generation)
+		return generation
+
+	def finish_rebuild(self, generation):
+		"""Catch the new generation up with the journal and point the alias at it."""
+		self._replay_journal(generation)
+
+		previous = self.get_generation()
+		index_name, _prefix = self._get_generation_names(generation)
+		if not previous and self.index_exists():
+			# Index created before rebuilds were generational, its name is the alias to take over
+			self._drop_generation(None)
+		self.redis.ft(index_name).aliasupdate(self.index_name)
+
+		pipeline = self.redis.pipeline()
+		pipeline.set(self._get_redis_key("generation"), generation)
+		pipeline.delete(self._get_redis_key("rebuild"))
+		pipeline.execute()
+		self._index_exists = True
+
+		# Writes that raced with the switch were journaled but not yet seen
+		self._replay_journal(generation)
+		self.redis.delete(self._get_redis_key("journal"))
+		if previous:
+			self._drop_generation(previous)
+
+	def abort_rebuild(self, generation):
+		self._drop_generation(generation)
+		self.redis.delete(self._get_redis_key("rebuild"), self._get_redis_key("journal"))
+
+	def rebuild_in_progress(self):
+		return self.redis.get(self._get_redis_key("rebuild")) is not None
+
+	def get_generation(self):
+		"""Generation of the live index, None for an index created before rebuilds were generational."""
+		generation = self.redis.get(self._get_redis_key("generation"))
+		return int(generation) if generation else None
+
+	def _journal(self, entry):
+		if self.rebuild_in_progress():
+			# List commands of the cache wrapper build the full key themselves
+			self.redis.rpush(f"{self.index_name}:journal", json.dumps(entry))
+
+	def _replay_journal(self, generation):
+		while entry := self.redis.lpop(f"{self.index_name}:journal"):
+			op, id, *args = json.loads(entry)
+			if op == "add":
+				self._write_document(generation, id, *args)
+			else:
+				self._delete_document(generation, id)
+
+	def _drop_generation(self, generation):
+		index_name, _prefix = self._get_generation_names(generation)
+		try:
+			self.redis.ft(index_name).dropindex(delete_documents=True)
+		except ResponseError:
+			pass
+
+	def _get_generation_names(self, generation):
+		"""Index name and key prefix of a generation of the index."""
+		if not generation:
+			return self.index_name, self.prefix
+		return f"{self.index_name}_{generation}", f"{self.prefix}_{generation}"
+
+	def _get_redis_key(self, name):
+		return self.redis.make_key(f"{self.index_name}:{name}")
 
 	def index_exists(self):
 		self._index_exists = getattr(self, "_index_exists", None)
@@ -0,0 +1,217 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+"""
+Ranking boosts learned from how search results are used.
+
+Clicks on search results are logged in Redis as they happen. Once a day they are
+aggregated, weighed by how recent they are, how far down the results they were and
+the GP Search Feedback given for the same search, into a small table of boosts per
+document and per (query word, document). The table is written next to the search
+indexes and looked up by the engines in constant time per candidate.
+"""
+
+import json
+import math
+import os
+import re
+import time
+import weakref
+from collections import defaultdict
+
+import frappe
+from frappe.utils import add_days, cint, now_datetime
+
+CLICK_LOG_KEY = "gameplan_search_clicks"
+CLICK_LOG_SIZE = 100000
+BOOSTS_FILE = "search_boosts.json"
+
+WINDOW_DAYS = 90
+HALF_LIFE_DAYS = 30
+# Clicks from searches marked as helpful count more, from unhelpful ones less
+FEEDBACK_WEIGHTS = {"Yes": 1.5, "No": 0.5}
+# Clicks further down the results are weighed as if they were at this position
+MAX_CLICK_POSITION = 19
+MAX_DOCUMENT_BOOST = 1.25
+MAX_TERM_BOOST = 1.2
+MAX_CLICK_BOOST = MAX_DOCUMENT_BOOST * MAX_TERM_BOOST
+# Weighted clicks at which a document gets half of the largest boost
+SATURATION = 5.0
+MIN_BOOST = 1.01
+MAX_DOCUMENTS = 10000
+MAX_TERM_ENTRIES = 50000
+
+# Boost table loaded by this process, keyed by file path: (file mtime, ClickBoosts)
+_loaded = {}
+
+
+class ClickBoosts:
+	"""Boosts per doc id, and per query word and doc id."""
+
+	def __init__(self, documents=None, terms=None):
+		self.documents = documents or {}
+		self.terms = terms or {}
+		self._segments = weakref.WeakKeyDictionary()
+
+	def __bool__(self):
+		return bool(self.documents or self.terms)
+
+	def get(self, doc_id, words):
+		"""Boost of a document for a query made of `words`."""
+		term_boost = max((self.terms[w].get(doc_id, 1.0) for w in words if w in self.terms), default=1.0)
+		return self.documents.get(doc_id, 1.0) * term_boost
+
+	def get_for_segment(self, segment, ordinal, words):
+		"""Same as `get`, for a document of a full text search segment, without decoding its id."""
+		documents, terms = self.for_segment(segment)
+		term_boost = max((terms[w].get(ordinal, 1.0) for w in words if w in terms), default=1.0)
+		return documents.get(ordinal, 1.0) * term_boost
+
+	def for_segment(self, segment):
+		"""The boosts of the documents of a segment keyed by ordinal, resolved once per segment."""
+		resolved = self._segments.get(segment)
+		if resolved is None:
+			doc_ids = set(self.documents)
+			for boosts in self.terms.values():
+				doc_ids.update(boosts)
+			if segment.n_docs < len(doc_ids):
+				ordinals = {
+					doc_id: ordinal
+					for ordinal in range(segment.n_docs)
+					if (doc_id := segment.doc_id(ordinal)) in doc_ids
+				}
+			else:
+				ordinals = {
+					doc_id: ordinal for doc_id in doc_ids if (ordinal := segment.doc_ordinal(doc_id)) >= 0
+				}
+
+			resolved = self._segments[segment] = (
+				{ordinals[d]: boost for d, boost in self.documents.items() if d in ordinals},
+				{
+					word: {ordinals[d]: boost for d, boost in boosts.items() if d in ordinals}
+					for word, boosts in self.terms.items()
+				},
+			)
+		return resolved
+
+
+def get_click_boosts():
+	"""The boost table of the site, reloaded when the nightly job replaces it."""
+	path = get_boosts_path()
+	try:
+		mtime = os.stat(path).st_mtime_ns
+	except FileNotFoundError:
+		return ClickBoosts()
+
+	loaded = _loaded.get(path)
+	if loaded and loaded[0] == mtime:
+		return loaded[1]
+
+	with open(path) as f:
+		data = json.load(f)
+	boosts = ClickBoosts(data["documents"], data["terms"])
+	_loaded[path] = (mtime, boosts)
+	return boosts
+
+
+def get_boosts_path():
+	return frappe.get_site_path("indexes", BOOSTS_FILE)
+
+
+def record_click(query, doc_id, position):
+	"""Log a click on the result at `position` (0 based) of a search, ignored for unknown results."""
+	from gameplan.search_sqlite import GameplanSearch
+
+	if not _get_words(query) or not GameplanSearch().is_search_result(doc_id):
+		return
+
+	entry = {
+		"query": query,
+		"doc_id": doc_id,
+		"position": min(max(cint(position), 0), MAX_CLICK_POSITION),
+		"user": frappe.session.user,
+		"timestamp": time.time(),
+	}
+	cache = frappe.cache()
+	pipeline = cache.pipeline(transaction=False)
+	pipeline.lpush(cache.make_key(CLICK_LOG_KEY), json.dumps(entry))
+	pipeline.ltrim(cache.make_key(CLICK_LOG_KEY), 0, CLICK_LOG_SIZE - 1)
+	pipeline.execute()
+
+
+def build_click_boosts():
+	"""
+	Aggregate the click log into the boost table, scheduled daily.
+
+	bench --site <site> execute gameplan.utils.search_boosts.build_click_boosts
+	"""
+	from gameplan.search_sqlite import bump_index_version
+
+	now = time.time()
+	feedback = _get_feedback()
+	document_clicks = defaultdict(float)
+	term_clicks = defaultdict(lambda: defaultdict(float))
+	counted = set()
+
+	for entry in frappe.cache().lrange(CLICK_LOG_KEY, 0, -1):
+		click = json.loads(entry)
+		age_days = (now - click["timestamp"]) / 86400
+		if age_days > WINDOW_DAYS:
+			continue
+		words = _get_words(click["query"])
+		# A user clicking the same result for the same query counts once a day
+		key = (click["user"], " ".join(words), click["doc_id"], int(click["timestamp"] // 86400))
+		if key in counted:
+			continue
+		counted.add(key)
+		# A click far down the results is stronger evidence than one on the first result
+		position = min(max(cint(click["position"]), 0), MAX_CLICK_POSITION)
+		weight = 0.5 ** (age_days / HALF_LIFE_DAYS) * math.log2(position + 2)
+		weight *= FEEDBACK_WEIGHTS.get(feedback.get((click["user"], " ".join(words))), 1.0)
+		document_clicks[click["doc_id"]] += weight
+		for word in words:
+			term_clicks[word][click["doc_id"]] += weight
+
+	documents = _get_boosts(document_clicks, MAX_DOCUMENT_BOOST, MAX_DOCUMENTS)
+	entries = sorted(
+		((clicks, word, doc_id) for word, docs in term_clicks.items() for doc_id, clicks in docs.items()),
+		reverse=True,
+	)
+	terms = defaultdict(dict)
+	for clicks, word, doc_id in entries[:MAX_TERM_ENTRIES]:
+		boost = _get_boost(clicks, MAX_TERM_BOOST)
+		if boost >= MIN_BOOST:
+			terms[word][doc_id] = boost
+
+	path = get_boosts_path()
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(f"{path}.tmp", "w") as f:
+		json.dump({"documents": documents, "terms": terms}, f, separators=(",", ":"))
+	os.replace(f"{path}.tmp", path)
+	# Cached search results were ranked without the new boosts
+	bump_index_version()
+
+
+def _get_feedback():
+	"""Latest feedback per (user, normalized query) within the window."""
+	rows = frappe.get_all(
+		"GP Search Feedback",
+		filters={"creation": (">=", add_days(now_datetime(), -WINDOW_DAYS))},
+		fields=["user", "query", "helpful"],
+		order_by="creation asc",
+	)
+	return {(row.user, " ".join(_get_words(row.query))): row.helpful for row in rows}
+
+
+def _get_boosts(clicks, max_boost, limit):
+	best = sorted(clicks.items(), key=lambda item: item[1], reverse=True)[:limit]
+	boosts = {doc_id: _get_boost(weight, max_boost) for doc_id, weight in best}
+	return {doc_id: boost for doc_id, boost in boosts.items() if boost >= MIN_BOOST}
+
+
+def _get_boost(clicks, max_boost):
+	# Saturates, so that a handful of popular documents cannot take over every search
+	return 1 + (max_boost - 1) * clicks / (clicks + SATURATION)
+
+
+def _get_words(query):
+	return re.findall(r"\w+", (query or "").lower())
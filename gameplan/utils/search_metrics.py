@@ -0,0 +1,166 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+"""
+Always-on latency instrumentation shared by the search engines.
+
+Each search records its total duration in a per-engine latency histogram and the
+time spent in each of its stages, with a single pipelined Redis round trip. Searches
+slower than `gameplan_search_slow_query_ms` (default 500) are sampled, at
+`gameplan_search_slow_query_sample_rate` (default 1), into a ring buffer of the most
+recent slow queries with their stage timings.
+"""
+
+import json
+import math
+import random
+import time
+
+import frappe
+from frappe.utils import cint, flt
+
+METRICS_KEY = "gameplan_search_metrics"
+SLOW_QUERY_LOG_SIZE = 200
+DEFAULT_SLOW_QUERY_MS = 500
+
+# Latency histogram buckets grow by 25%, which bounds the error of the percentiles
+BUCKET_BASE_MS = 0.1
+BUCKET_GROWTH = 1.25
+
+# A Redis outage fails every search's recording, only the first failure per interval is logged
+ERROR_LOG_INTERVAL = 60 * 60  # seconds
+_error_logged_at = None
+
+
+class SearchTimer:
+	"""Collects the stage timings of one search."""
+
+	def __init__(self, engine, query):
+		self.engine = engine
+		self.query = query
+		self.stages = {}
+		self.start = time.perf_counter()
+
+	def add(self, stage, seconds):
+		self.stages[stage] = self.stages.get(stage, 0) + seconds
+
+	def stage(self, stage):
+		return _Stage(self, stage)
+
+	def finish(self, **info):
+		"""Record the search, `info` is kept with it in the slow query log."""
+		duration_ms = (time.perf_counter() - self.start) * 1000
+		if frappe.flags.skip_search_metrics:
+			# Set by the search benchmark, which measures on its own
+			return duration_ms
+		stages_ms = {stage: seconds * 1000 for stage, seconds in self.stages.items()}
+		try:
+			record_search(self.engine, self.query, duration_ms, stages_ms, info)
+		except Exception:
+			# Instrumentation must never fail a search
+			_log_recording_error()
+		return duration_ms
+
+
+def _log_recording_error():
+	global _error_logged_at
+	now = time.monotonic()
+	if _error_logged_at is None or now - _error_logged_at >= ERROR_LOG_INTERVAL:
+		_error_logged_at = now
+		frappe.log_error(title="Could not record search metrics")
+
+
+class _Stage:
+	__slots__ = ("timer", "name", "start")
+
+	def __init__(self, timer, name):
+		self.timer = timer
+		self.name = name
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+
+	def __exit__(self, *exc_info):
+		self.timer.add(self.name, time.perf_counter() - self.start)
+
+
+def record_search(engine, query, duration_ms, stages_ms, info=None):
+	cache = frappe.cache()
+	pipeline = cache.pipeline(transaction=False)
+	pipeline.hincrby(cache.make_key(f"{METRICS_KEY}:{engine}:latency"), _get_bucket(duration_ms), 1)
+	stages_key = cache.make_key(f"{METRICS_KEY}:{engine}:stages")
+	pipeline.hincrby(stages_key, "count", 1)
+	for stage, stage_ms in stages_ms.items():
+		pipeline.hincrbyfloat(stages_key, stage, stage_ms)
+
+	slow_query_ms = flt(frappe.conf.get("gameplan_search_slow_query_ms", DEFAULT_SLOW_QUERY_MS))
+	sample_rate = flt(frappe.conf.get("gameplan_search_slow_query_sample_rate", 1))
+	if duration_ms >= slow_query_ms and random.random() < sample_rate:
+		entry = {
+			"engine": engine,
+			"query": query,
+			"duration_ms": round(duration_ms, 2),
+			"stages_ms": {stage: round(stage_ms, 2) for stage, stage_ms in stages_ms.items()},
+			"user": frappe.session.user if getattr(frappe.local, "session", None) else None,
+			"timestamp": time.time(),
+			**(info or {}),
+		}
+		slow_queries_key = cache.make_key(f"{METRICS_KEY}:slow_queries")
+		pipeline.lpush(slow_queries_key, json.dumps(entry, default=str))
+		pipeline.ltrim(slow_queries_key, 0, SLOW_QUERY_LOG_SIZE - 1)
+
+	pipeline.execute()
+
+
+def get_search_metrics(engines=("fts", "sqlite", "redisearch")):
+	"""Latency percentiles and mean stage timings per engine, and the slow query log."""
+	cache = frappe.cache()
+	# The cache wrapper unpickles hash values and prefixes list keys itself, a pipeline does neither
+	pipeline = cache.pipeline(transaction=False)
+	for engine in engines:
+		pipeline.hgetall(cache.make_key(f"{METRICS_KEY}:{engine}:latency"))
+		pipeline.hgetall(cache.make_key(f"{METRICS_KEY}:{engine}:stages"))
+	pipeline.lrange(cache.make_key(f"{METRICS_KEY}:slow_queries"), 0, -1)
+	*hashes, slow_queries = pipeline.execute()
+
+	metrics = {}
+	for i, engine in enumerate(engines):
+		buckets, stages = _decode_hash(hashes[2 * i]), _decode_hash(hashes[2 * i + 1])
+		histogram = sorted((cint(bucket), cint(count)) for bucket, count in buckets.items())
+		count = cint(stages.pop("count", 0))
+		metrics[engine] = {
+			"count": count,
+			"p50_ms": _get_percentile(histogram, 0.5),
+			"p95_ms": _get_percentile(histogram, 0.95),
+			"p99_ms": _get_percentile(histogram, 0.99),
+			"mean_stage_ms": {stage: flt(total) / count for stage, total in stages.items()} if count else {},
+		}
+
+	return {"engines": metrics, "slow_queries": [json.loads(entry) for entry in slow_queries]}
+
+
+def reset_search_metrics(engines=("fts", "sqlite", "redisearch")):
+	cache = frappe.cache()
+	keys = [f"{METRICS_KEY}:{engine}:{name}" for engine in engines for name in ("latency", "stages")]
+	cache.delete(*(cache.make_key(key) for key in [*keys, f"{METRICS_KEY}:slow_queries"]))
+
+
+def _get_bucket(duration_ms):
+	if duration_ms <= BUCKET_BASE_MS:
+		return 0
+	return math.ceil(math.log(duration_ms / BUCKET_BASE_MS, BUCKET_GROWTH))
+
+
+def _get_percentile(histogram, percentile):
+	"""Upper bound of the bucket holding the given percentile of a sorted (bucket, count) histogram."""
+	total = sum(count for _bucket, count in histogram)
+	if not total:
+		return None
+	seen = 0
+	for bucket, count in histogram:
+		seen += count
+		if seen >= percentile * total:
+			return round(BUCKET_BASE_MS * BUCKET_GROWTH**bucket, 2)
+
+
+def _decode_hash(values):
+	return {key.decode(): value.decode() for key, value in values.items()}
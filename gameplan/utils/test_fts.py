@@ -0,0 +1,125 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+
+import importlib.util
+import random
+import shutil
+import tempfile
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from gameplan.utils.fts import FullTextSearch
+
+WORDS = (
+	"project plan design review budget meeting release deploy server client api search index query "
+	"comment discussion task page team roadmap feature bug fix test quality artwork sales customer "
+	"procurement approve reject draft final status update weekly report metrics latency cache redis"
+).split()
+QUERIES = [
+	"project plan",
+	"budget",
+	"release deploy server",
+	"artwork sales customer",
+	"fix the bug",
+	"serch indx",
+	'"weekly report"',
+	"cache NEAR/3 redis",
+]
+CURRENT_TIME = 1_710_000_000
+
+
+def make_documents(count, seed=1):
+	rng = random.Random(seed)
+	return [
+		{
+			"id": f"GP Discussion:{i}",
+			"title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).title(),
+			"content": "<p>"
+			+ " ".join(rng.choice([*WORDS, "the", "and"]) for _ in range(rng.randint(5, 80)))
+			+ "</p>",
+			"timestamp": CURRENT_TIME - rng.randint(0, 10_000_000),
+			"project": str(rng.randint(1, 10)),
+		}
+		for i in range(count)
+	]
+
+
+class TestFullTextSearch(UnitTestCase):
+	def setUp(self):
+		self.indexes = {}
+
+	def tearDown(self):
+		for prefix, index_dir in self.indexes.values():
+			frappe.cache().delete_value([f"{prefix}manifest", f"{prefix}manifest_version"])
+			shutil.rmtree(index_dir, ignore_errors=True)
+
+	def get_search(self, name="index", **kwargs):
+		"""A search on its own index directory and redis keys, so tests never touch the site's index."""
+		if name not in self.indexes:
+			self.indexes[name] = (f"test_fts_{name}:", tempfile.mkdtemp(prefix="test_fts_"))
+		fts = FullTextSearch(**kwargs)
+		fts.redis_prefix, fts.index_dir = self.indexes[name]
+		fts.current_time = CURRENT_TIME
+		return fts
+
+	def get_results(self, fts, query, title_only=False, projects=None):
+		response = fts.search(query, title_only=title_only, projects=projects)
+		return [(r["id"], r["score"]) for r in response["results"]], response["summary"]["total_matches"]
+
+	def test_top_k_matches_exhaustive_scoring(self):
+		self.get_search().index_documents(make_documents(300))
+		for title_only in (False, True):
+			for query in QUERIES:
+				# With room for every document WAND can never skip one
+				exhaustive, exhaustive_total = self.get_results(
+					self.get_search(max_results=1000), query, title_only
+				)
+				top, total = self.get_results(self.get_search(max_results=5), query, title_only)
+				self.assertEqual(top, exhaustive[:5], query)
+				self.assertEqual(total, exhaustive_total, query)
+
+	def test_incremental_updates_match_rebuild(self):
+		documents = make_documents(300)
+		self.get_search().index_documents(documents[:200])
+		changed = {**documents[10], "title": "Completely New Release Title"}
+		removed = [doc["id"] for doc in documents[:250:7]]
+		self.get_search().update_documents(documents[200:250])
+		self.get_search().update_documents([*documents[250:], changed], removed=removed)
+
+		expected = [
+			changed if doc["id"] == changed["id"] else doc for doc in documents if doc["id"] not in removed
+		]
+		self.get_search("rebuild").index_documents(expected)
+
+		def assert_same_results():
+			for title_only in (False, True):
+				for query in [*QUERIES, "completely new"]:
+					self.assertEqual(
+						self.get_results(self.get_search(), query, title_only),
+						self.get_results(self.get_search("rebuild"), query, title_only),
+						query,
+					)
+
+		assert_same_results()
+		self.get_search().compact()
+		self.assertEqual(len(self.get_search()._read_manifest()["segments"]), 1)
+		assert_same_results()
+
+	def test_scoring_backends_match(self):
+		if importlib.util.find_spec("numpy") is None:
+			self.skipTest("NumPy is not installed")
+
+		documents = make_documents(300)
+		self.get_search().index_documents(documents[:250])
+		self.get_search().update_documents(documents[250:], removed=[doc["id"] for doc in documents[:250:9]])
+		for title_only in (False, True):
+			for projects in (None, ["1", "2", "3"]):
+				for query in QUERIES:
+					self.assertEqual(
+						self.get_results(self.get_search(max_results=10), query, title_only, projects),
+						self.get_results(
+							self.get_search(max_results=10, scoring="numpy"), query, title_only, projects
+						),
+						query,
+					)
@@ -0,0 +1,158 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# MIT License. See license.txt
+"""
+Number of discussions with unread posts per project, kept in Redis for each user.
+
+A user's counts are loaded from the database the first time they are asked for, into a
+hash of project → count and a set of the unread discussions behind it. From then on
+they are maintained as posts are made and read: a new post adds its discussion to the
+set of every reader and bumps the project's count if it was not there yet, reading a
+discussion takes it out again and marking a project as read empties the project. An
+hourly job recounts a share of the cached users from the database to repair any drift,
+so that each of them is recounted once a day.
+"""
+
+import math
+
+import frappe
+from frappe.utils import cint
+
+COUNTS_KEY = "gameplan_unread_counts"
+DISCUSSIONS_KEY = "gameplan_unread_discussions"
+USERS_KEY = "gameplan_unread_count_users"
+RECONCILE_CURSOR_KEY = "gameplan_unread_count_reconcile_cursor"
+# Hourly runs it takes to recount every cached user
+RECONCILE_RUNS = 24
+# Tells a loaded hash from a missing one, a user with nothing unread has no other field
+LOADED = "_loaded"
+# Counts of users who stop coming back are dropped, and loaded again if they return
+EXPIRY = 7 * 24 * 60 * 60  # seconds
+
+# Only cached counts are maintained, the others are loaded complete on the next read
+_ADD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 and redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+	redis.call('HINCRBY', KEYS[1], ARGV[2], 1)
+end
+"""
+_REMOVE_SCRIPT = """
+if redis.call('SREM', KEYS[2], ARGV[1]) == 1 then
+	redis.call('HINCRBY', KEYS[1], ARGV[2], -1)
+end
+"""
+_CLEAR_SCRIPT = """
+for i = 2, #ARGV do
+	redis.call('SREM', KEYS[2], ARGV[i])
+end
+if redis.call('EXISTS', KEYS[1]) == 1 then
+	redis.call('HSET', KEYS[1], ARGV[1], 0)
+end
+"""
+
+
+def get_unread_counts(user, projects=None):
+	"""Discussions with unread posts per project, all projects with any when `projects` is not given."""
+	cache = frappe.cache()
+	# The cache wrapper unpickles hash values, a pipeline does not
+	pipeline = cache.pipeline(transaction=False)
+	pipeline.hgetall(_get_key(COUNTS_KEY, user))
+	(counts,) = pipeline.execute()
+	counts = {key.decode(): cint(value) for key, value in counts.items()}
+	if LOADED not in counts:
+		counts = load_unread_counts(user)
+	counts.pop(LOADED, None)
+
+	if projects:
+		return {str(project): counts.get(str(project), 0) for project in projects}
+	return {project: count for project, count in counts.items() if count}
+
+
+def load_unread_counts(user):
+	"""Count the user's unread discussions from the database and cache them."""
+	from gameplan.gameplan.doctype.gp_project_access.gp_project_access import get_accessible_projects
+	from gameplan.gameplan.doctype.gp_unread_record.gp_unread_record import GPUnreadRecord
+
+	counts, discussions = {LOADED: 1}, []
+	projects = list(get_accessible_projects(user))
+	for discussion, row in GPUnreadRecord.get_unread_counts(user, projects=projects).items():
+		counts[str(row.project)] = counts.get(str(row.project), 0) + 1
+		discussions.append(_get_member(row.project, discussion))
+
+	cache = frappe.cache()
+	counts_key, discussions_key = _get_key(COUNTS_KEY, user), _get_key(DISCUSSIONS_KEY, user)
+	pipeline = cache.pipeline()
+	pipeline.delete(counts_key, discussions_key)
+	pipeline.hset(counts_key, mapping=counts)
+	if discussions:
+		pipeline.sadd(discussions_key, *discussions)
+	pipeline.expire(counts_key, EXPIRY)
+	pipeline.expire(discussions_key, EXPIRY)
+	pipeline.sadd(cache.make_key(USERS_KEY), user)
+	pipeline.execute()
+	return counts
+
+
+def add_unread_discussion(users, project, discussion):
+	"""A new post made the discussion unread for `users`."""
+	cache = frappe.cache()
+	add = cache.register_script(_ADD_SCRIPT)
+	pipeline = cache.pipeline(transaction=False)
+	for user in users:
+		add(
+			keys=[_get_key(COUNTS_KEY, user), _get_key(DISCUSSIONS_KEY, user)],
+			args=[_get_member(project, discussion), str(project)],
+			client=pipeline,
+		)
+	pipeline.execute()
+
+
+def remove_unread_discussion(user, project, discussion):
+	"""The user read the discussion."""
+	cache = frappe.cache()
+	cache.register_script(_REMOVE_SCRIPT)(
+		keys=[_get_key(COUNTS_KEY, user), _get_key(DISCUSSIONS_KEY, user)],
+		args=[_get_member(project, discussion), str(project)],
+	)
+
+
+def clear_unread_discussions(user, project):
+	"""The user marked every discussion of the project as read."""
+	cache = frappe.cache()
+	discussions_key = _get_key(DISCUSSIONS_KEY, user)
+	read = list(cache.sscan_iter(discussions_key, match=f"{_get_member(project, '')}*"))
+	cache.register_script(_CLEAR_SCRIPT)(
+		keys=[_get_key(COUNTS_KEY, user), discussions_key], args=[str(project), *read]
+	)
+
+
+def reconcile_unread_counts():
+	"""
+	Recount the next share of the cached users from the database, scheduled hourly.
+
+	The users are walked with a set cursor kept between runs, which starts over once
+	every user was seen.
+	"""
+	cache = frappe.cache()
+	# Keys are prefixed here, the cache wrapper's set methods would prefix them again
+	users_key, cursor_key = cache.make_key(USERS_KEY), cache.make_key(RECONCILE_CURSOR_KEY)
+	batch_size = math.ceil(cache.execute_command("SCARD", users_key) / RECONCILE_RUNS)
+	cursor, users = cint(cache.execute_command("GET", cursor_key)), set()
+	while len(users) < batch_size:
+		cursor, members = cache.execute_command("SSCAN", users_key, cursor, "COUNT", batch_size)
+		users.update(members)
+		if not cint(cursor):
+			break
+	cache.execute_command("SET", cursor_key, cint(cursor))
+
+	for user in map(frappe.safe_decode, users):
+		if cache.execute_command("EXISTS", _get_key(COUNTS_KEY, user)):
+			load_unread_counts(user)
+		else:
+			cache.execute_command("SREM", users_key, user)
+
+
+def _get_key(key, user):
+	return frappe.cache().make_key(f"{key}:{user}")
+
+
+def _get_member(project, discussion):
+	return f"{project}:{discussion}"